@@ -0,0 +1,292 @@
+"""
+A stand-in UserGrid server for benchmarks
+
+FakeUserGrid answers UG requests from memory. serve() puts it behind a
+stdlib HTTP server on localhost so benchmarks pay for real sockets, HTTP
+parsing and connection pooling.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+NOT_FOUND = {
+    'error': 'service_resource_not_found',
+    'error_description': 'Service resource not found',
+    'exception': 'org.apache.usergrid.services.exceptions.ServiceResourceNotFoundException'
+}
+
+
+class _Collection(object):
+    """
+    Seeded entities are built on demand from their index so large
+    collections take no memory until they are changed
+    """
+    __slots__ = (
+        'name',
+        'seeded',
+        'changed',
+        'deleted',
+        'created'
+    )
+
+    def __init__(self, name, seeded=0):
+        self.name = name
+        self.seeded = seeded
+        self.changed = {}
+        self.deleted = set()
+        self.created = []
+
+
+class FakeUserGrid(object):
+    """
+    In memory UG app answering token, collection, entity and connection
+    requests
+
+    ql is ignored, a query returns the whole collection page by page.
+    """
+    __slots__ = (
+        'org',
+        'app',
+        'latency',
+        'payload_size',
+        'requests',
+        '_collections',
+        '_lock'
+    )
+
+    def __init__(self, org='org', app='app', latency=0.0, payload_size=256):
+        """
+        :param str org:
+        :param str app:
+        :param float latency: seconds to wait before answering each request
+        :param int payload_size: bytes of filler added to seeded entities
+        """
+        self.org = org
+        self.app = app
+        self.latency = latency
+        self.payload_size = payload_size
+        self.requests = 0
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def seed(self, collection, count):
+        """
+        Fills a collection with count generated entities
+
+        :param str collection:
+        :param int count:
+        :return:
+        """
+        with self._lock:
+            self._collections[collection] = _Collection(collection, count)
+
+    def _collection(self, name):
+        if name not in self._collections:
+            self._collections[name] = _Collection(name)
+
+        return self._collections[name]
+
+    def _seeded_entity(self, collection, index):
+        entity_uuid = str(uuid.UUID(int=index + 1))
+        path = '/%s/%s' % (collection.name, entity_uuid)
+        return {
+            'uuid': entity_uuid,
+            'type': collection.name,
+            'name': '%s-%d' % (collection.name, index),
+            'created': 1500000000000 + index,
+            'modified': 1500000000000 + index,
+            'payload': 'x' * self.payload_size,
+            'metadata': {
+                'path': path,
+                'connections': {'likes': path + '/likes'}
+            }
+        }
+
+    def _find(self, collection, entity_id):
+        """
+        Looks up an entity by uuid or name
+
+        :rtype (object, dict):
+        :return: the key the entity is stored under and the entity
+        """
+        if entity_id in collection.changed:
+            return entity_id, collection.changed[entity_id]
+
+        index = None
+        prefix = collection.name + '-'
+        if entity_id.startswith(prefix) and entity_id[len(prefix):].isdigit():
+            index = int(entity_id[len(prefix):])
+        else:
+            try:
+                index = uuid.UUID(entity_id).int - 1
+            except ValueError:
+                pass
+
+        if index is not None and 0 <= index < collection.seeded:
+            if index in collection.deleted:
+                return None, None
+            return index, collection.changed.get(index) or self._seeded_entity(collection, index)
+
+        for key, entity in collection.changed.items():
+            if entity.get('name') == entity_id:
+                return key, entity
+
+        return None, None
+
+    def _page(self, collection, query):
+        limit = min(int(query.get('limit', ['10'])[0]), 1000)
+        offset = int(query.get('cursor', ['0'])[0])
+        entities = []
+        position = offset
+
+        total = collection.seeded + len(collection.created)
+        while len(entities) < limit and position < total:
+            if position < collection.seeded:
+                if position not in collection.deleted:
+                    entities.append(
+                        collection.changed.get(position) or
+                        self._seeded_entity(collection, position)
+                    )
+            else:
+                key = collection.created[position - collection.seeded]
+                if key in collection.changed:
+                    entities.append(collection.changed[key])
+            position += 1
+
+        page = {'action': 'get', 'entities': entities, 'count': len(entities)}
+        if position < total:
+            page['cursor'] = str(position)
+
+        return page
+
+    def _create(self, collection, body):
+        entities = body if isinstance(body, list) else [body]
+        created = []
+        for entity in entities:
+            entity = dict(entity)
+            entity['uuid'] = str(uuid.uuid4())
+            entity['type'] = collection.name
+            entity['created'] = entity['modified'] = int(time.time() * 1000)
+            entity.setdefault('metadata', {})['path'] = '/%s/%s' % (collection.name, entity['uuid'])
+            collection.changed[entity['uuid']] = entity
+            collection.created.append(entity['uuid'])
+            created.append(entity)
+
+        return {'action': 'post', 'entities': created}
+
+    def handle(self, method, url, body=None):
+        """
+        Answers one request
+
+        :param str method:
+        :param str url: path and query string, or a full url
+        :param bytes body:
+        :rtype (int, bytes):
+        :return: status code and JSON body
+        """
+        if self.latency:
+            time.sleep(self.latency)
+
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        segments = [segment for segment in parts.path.split('/') if segment]
+        if segments[:2] == [self.org, self.app]:
+            segments = segments[2:]
+
+        data = json.loads(body.decode('utf-8')) if body and body[:1] in (b'{', b'[') else None
+
+        with self._lock:
+            self.requests += 1
+            status, response = self._route(method, segments, query, data)
+
+        return status, json.dumps(response).encode('utf-8')
+
+    # pylint: disable=too-many-return-statements
+    def _route(self, method, segments, query, data):
+        if segments == ['token']:
+            return 200, {'access_token': 'fake-token', 'expires_in': 3600, 'user': {}}
+
+        if not segments:
+            return 404, NOT_FOUND
+
+        collection = self._collection(segments[0])
+
+        if len(segments) == 1:
+            if method == 'GET':
+                return 200, self._page(collection, query)
+            if method == 'POST':
+                return 200, self._create(collection, data or {})
+            return 405, NOT_FOUND
+
+        key, entity = self._find(collection, segments[1])
+        if entity is None:
+            return 404, NOT_FOUND
+
+        if len(segments) > 2:
+            # connections are always empty
+            return 200, {'action': 'get', 'entities': [], 'count': 0}
+
+        if method == 'GET':
+            return 200, {'action': 'get', 'entities': [entity], 'count': 1}
+
+        if method == 'PUT':
+            entity = dict(entity, **(data or {}))
+            entity['modified'] = int(time.time() * 1000)
+            collection.changed[key] = entity
+            return 200, {'action': 'put', 'entities': [entity]}
+
+        if method == 'DELETE':
+            collection.changed.pop(key, None)
+            if isinstance(key, int):
+                collection.deleted.add(key)
+            return 200, {'action': 'delete', 'entities': [entity]}
+
+        return 405, NOT_FOUND
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Hands every request to the server's FakeUserGrid
+    """
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, Nagle would hold the body back
+    disable_nagle_algorithm = True
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        status, response = self.server.fake.handle(self.command, self.path, body)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+def serve(fake, host='127.0.0.1', port=0):
+    """
+    Serves fake over HTTP on a background thread
+
+    :param FakeUserGrid fake:
+    :param str host:
+    :param int port: 0 picks a free port
+    :rtype ThreadingHTTPServer:
+    :return: the server, call shutdown and server_close to stop it
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.fake = fake
+
+    thread = threading.Thread(target=server.serve_forever, name='fake-usergrid')
+    thread.daemon = True
+    thread.start()
+    return server
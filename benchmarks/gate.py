@@ -0,0 +1,426 @@
+"""
+Performance regression gate
+
+Runs a fixed set of micro and macro benchmarks against an in-process fake
+transport and compares them with the committed baseline:
+
+    python -m benchmarks.gate
+    python -m benchmarks.gate --update   # record a new baseline
+
+Exits with 1 when a metric is worse than the baseline by more than its
+tolerance. Operations per second depend on the machine, so they are only
+reported; throughput is gated relative to a calibration run on the same
+machine, and memory is measured with tracemalloc, which does not depend
+on the machine.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from benchmarks.fake_usergrid import FakeUserGrid
+from usergrid import UserGrid, __version__
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+COLLECTION = 'things'
+
+# metric name and whether higher values are better
+METRICS = (
+    ('ops_per_second', True),
+    ('relative_throughput', True),
+    ('peak_memory_bytes', False),
+    ('peak_bytes_per_entity', False),
+    ('retained_bytes', False),
+)
+
+# differ between machines, so they are reported but never a regression
+REPORTED_ONLY = ('ops_per_second',)
+
+DEFAULT_TOLERANCES = {
+    'relative_throughput': 0.3,
+    'peak_memory_bytes': 0.15,
+    'peak_bytes_per_entity': 0.15,
+    'retained_bytes': 0.15,
+}
+
+# memory changes smaller than this are noise whatever the tolerance
+MEMORY_SLACK_BYTES = 64 * 1024
+_BYTE_TOTALS = ('peak_memory_bytes', 'retained_bytes')
+
+
+class FakeTransport(BaseAdapter):
+    """
+    A requests adapter answering from a FakeUserGrid without a socket
+    """
+
+    def __init__(self, fake):
+        """
+        :param FakeUserGrid fake:
+        """
+        super(FakeTransport, self).__init__()
+        self.fake = fake
+
+    # pylint: disable=too-many-arguments,unused-argument
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        status, content = self.fake.handle(request.method, request.url, body)
+
+        response = Response()
+        response.status_code = status
+        response.reason = 'OK' if status < 400 else 'Error'
+        response.headers = CaseInsensitiveDict({
+            'Content-Type': 'application/json',
+            'Content-Length': str(len(content))
+        })
+        response.raw = io.BytesIO(content)
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def fake_client(fake):
+    """
+    A UserGrid whose requests are answered by fake
+
+    :param FakeUserGrid fake:
+    :rtype UserGrid:
+    :return:
+    """
+    user_grid = UserGrid(host='usergrid.fake', org=fake.org, app=fake.app)
+    user_grid.session.mount('http://', FakeTransport(fake))
+    user_grid.access_token = 'fake-token'
+    return user_grid
+
+
+def bench_make_request(user_grid, config):
+    """
+    _make_request on one entity
+
+    :rtype (int, int):
+    :return: operations and entities per operation
+    """
+    url = user_grid._get_full_endpoint(  # pylint: disable=protected-access
+        '/%s/%s-1' % (COLLECTION, COLLECTION)
+    )
+    for _ in range(config['requests']):
+        user_grid._make_request('GET', url)  # pylint: disable=protected-access
+
+    return config['requests'], 1
+
+
+def bench_get_entities(user_grid, config):
+    """
+    get_entities pages of ten entities
+
+    :rtype (int, int):
+    :return:
+    """
+    for _ in range(config['requests']):
+        user_grid.get_entities('/' + COLLECTION, limit=10)
+
+    return config['requests'], 10
+
+
+def _scan(user_grid, config, stream):
+    count = 0
+    for _ in user_grid.collect_entities('/' + COLLECTION, limit=config['page_size'], stream=stream):
+        count += 1
+
+    assert count == config['entities']
+    return count, config['page_size']
+
+
+def bench_collect_entities(user_grid, config):
+    """
+    collect_entities over the whole collection, one operation per entity
+
+    :rtype (int, int):
+    :return:
+    """
+    return _scan(user_grid, config, stream=False)
+
+
+def bench_collect_entities_stream(user_grid, config):
+    """
+    Streamed collect_entities over the whole collection
+
+    :rtype (int, int):
+    :return:
+    """
+    return _scan(user_grid, config, stream=True)
+
+
+BENCHMARKS = (
+    ('make_request', bench_make_request),
+    ('get_entities', bench_get_entities),
+    ('collect_entities', bench_collect_entities),
+    ('collect_entities_stream', bench_collect_entities_stream),
+)
+
+DEFAULT_CONFIG = {
+    'requests': 2000,
+    'entities': 20000,
+    'page_size': 1000,
+    'payload_size': 256,
+    'repeat': 3,
+    'calibration_pages': 20,
+}
+
+
+def calibrate(config):
+    """
+    How fast this machine decodes pages, to scale throughput by
+
+    Decodes pages of config['page_size'] entities as the fake transport
+    serves them, without the client, best of config['repeat'] runs. The
+    throughput of a benchmark divided by this compares across machines
+    where operations per second do not.
+
+    :param dict config:
+    :rtype float:
+    :return: pages per second
+    """
+    fake = FakeUserGrid(payload_size=config['payload_size'])
+    fake.seed(COLLECTION, config['page_size'])
+    url = 'http://usergrid.fake/%s/%s/%s?limit=%d' % (
+        fake.org, fake.app, COLLECTION, config['page_size']
+    )
+
+    pages = config.get('calibration_pages', DEFAULT_CONFIG['calibration_pages'])
+    best = None
+    for _ in range(config['repeat']):
+        started = time.perf_counter()
+        for _ in range(pages):
+            json.loads(fake.handle('GET', url)[1])
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return pages / best
+
+
+def measure(benchmark, config):
+    """
+    Runs a benchmark for throughput, then once more under tracemalloc
+
+    Throughput is the best of config['repeat'] runs. Peak memory includes
+    the fake transport's response bodies, which are the same in every
+    release. peak_bytes_per_entity divides it by the entities held at once,
+    a page for scans.
+
+    :param callable benchmark:
+    :param dict config:
+    :rtype dict:
+    :return:
+    """
+    def prepare():
+        fake = FakeUserGrid(payload_size=config['payload_size'])
+        fake.seed(COLLECTION, config['entities'])
+        return fake_client(fake)
+
+    best = None
+    for _ in range(config['repeat']):
+        user_grid = prepare()
+        started = time.perf_counter()
+        operations, _ = benchmark(user_grid, config)
+        elapsed = time.perf_counter() - started
+        user_grid.close()
+        best = elapsed if best is None else min(best, elapsed)
+
+    user_grid = prepare()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        _, entities_held = benchmark(user_grid, config)
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        user_grid.close()
+
+    return {
+        'ops_per_second': operations / best,
+        'peak_memory_bytes': peak - before,
+        'peak_bytes_per_entity': (peak - before) / float(entities_held),
+        'retained_bytes': max(0, after - before),
+    }
+
+
+def run(config, only=None):
+    """
+    Runs every benchmark
+
+    :param dict config:
+    :param list only: names of the benchmarks to run, all when not set
+    :rtype dict:
+    :return:
+    """
+    speed = calibrate(config)
+    results = {}
+    for name, benchmark in BENCHMARKS:
+        if not only or name in only:
+            results[name] = measure(benchmark, config)
+            results[name]['relative_throughput'] = results[name]['ops_per_second'] / speed
+
+    return results
+
+
+def compare(baseline, current, tolerances=None):
+    """
+    Compares results with the baseline
+
+    :param dict baseline: benchmark name to metrics
+    :param dict current: benchmark name to metrics
+    :param dict tolerances: allowed relative change per metric
+    :rtype list:
+    :return: (benchmark, metric, baseline, current, change, status) rows,
+             status is ok, improved, regression, new or info for metrics
+             that are only reported
+    """
+    tolerances = dict(DEFAULT_TOLERANCES, **(tolerances or {}))
+    rows = []
+
+    for name in sorted(current):
+        for metric, higher_is_better in METRICS:
+            value = current[name].get(metric)
+            if value is None:
+                continue
+
+            base = baseline.get(name, {}).get(metric)
+            if base is None:
+                rows.append((name, metric, None, value, None, 'new'))
+                continue
+
+            if base:
+                change = (value - base) / base
+            else:
+                change = float('inf') if value > base else 0.0
+            worse = -change if higher_is_better else change
+            slack = MEMORY_SLACK_BYTES if metric in _BYTE_TOTALS else 0
+
+            status = 'ok'
+            if metric in REPORTED_ONLY:
+                status = 'info'
+            elif abs(value - base) > slack:
+                if worse > tolerances[metric]:
+                    status = 'regression'
+                elif -worse > tolerances[metric]:
+                    status = 'improved'
+
+            rows.append((name, metric, base, value, change, status))
+
+    return rows
+
+
+def format_report(rows):
+    """
+    A table of the comparison
+
+    :param list rows: from compare
+    :rtype str:
+    :return:
+    """
+    def number(value):
+        if value is None:
+            return '-'
+        return '%.1f' % value
+
+    table = [('benchmark', 'metric', 'baseline', 'current', 'change', 'status')]
+    for name, metric, base, value, change, status in rows:
+        table.append((
+            name,
+            metric,
+            number(base),
+            number(value),
+            '-' if change is None else '%+.1f%%' % (change * 100),
+            status.upper() if status == 'regression' else status
+        ))
+
+    widths = [max(len(row[column]) for row in table) for column in range(len(table[0]))]
+    return '\n'.join(
+        '  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in table
+    )
+
+
+def parse_args(argv=None):
+    """
+    :param list argv:
+    :rtype argparse.Namespace:
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='Compare client performance with the baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON file')
+    parser.add_argument('--update', action='store_true',
+                        help='write the results as the new baseline instead of comparing')
+    parser.add_argument('--output', help='also write the current results to this file')
+    parser.add_argument('--only', action='append', choices=[name for name, _ in BENCHMARKS],
+                        help='run only this benchmark, may be repeated')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Command line entry point
+
+    :param list argv:
+    :rtype int:
+    :return: exit status
+    """
+    options = parse_args(argv)
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+
+    config = dict(DEFAULT_CONFIG, **baseline.get('config', {}))
+    results = run(config, only=options.only)
+    document = {
+        'version': __version__,
+        'config': config,
+        'tolerances': baseline.get('tolerances', DEFAULT_TOLERANCES),
+        'results': results
+    }
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as output:
+            json.dump(document, output, indent=2, sort_keys=True)
+
+    if options.update:
+        with open(options.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(document, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        sys.stdout.write('Baseline written to %s\n' % options.baseline)
+        return 0
+
+    rows = compare(baseline.get('results', {}), results, baseline.get('tolerances'))
+    sys.stdout.write(format_report(rows) + '\n')
+
+    regressions = [row for row in rows if row[5] == 'regression']
+    if regressions:
+        sys.stdout.write('%d metric(s) regressed against %s\n' % (
+            len(regressions),
+            baseline.get('version', 'the baseline')
+        ))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Runs the client benchmarks against a local FakeUserGrid server
+
+    python -m benchmarks.run --entities 100000 --output results.json
+
+Results are written as JSON so that runs of different releases can be
+compared.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from benchmarks.fake_usergrid import FakeUserGrid, serve
+from usergrid import UserGrid, RequestHooks, __version__
+
+COLLECTION = 'things'
+
+
+def percentile(samples, fraction):
+    """
+    Nearest rank percentile
+
+    :param list samples: sorted
+    :param float fraction: between 0 and 1
+    :rtype float:
+    :return:
+    """
+    if not samples:
+        return None
+
+    rank = max(0, min(len(samples) - 1, int(round(fraction * len(samples))) - 1))
+    return samples[rank]
+
+
+def summarize(operations, seconds, latencies):
+    """
+    Throughput and latency percentiles of a scenario
+
+    :param int operations:
+    :param float seconds:
+    :param list latencies: seconds per call
+    :rtype dict:
+    :return:
+    """
+    latencies = sorted(latencies)
+    return {
+        'operations': operations,
+        'seconds': seconds,
+        'throughput': operations / seconds if seconds else None,
+        'latency': {
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': percentile(latencies, 0.5),
+            'p90': percentile(latencies, 0.9),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else None
+        }
+    }
+
+
+def timed_calls(function, arguments):
+    """
+    Calls function with each argument and times every call
+
+    :param callable function:
+    :param list arguments:
+    :rtype dict:
+    :return:
+    """
+    latencies = []
+    started = time.time()
+    for argument in arguments:
+        call_started = time.time()
+        function(argument)
+        latencies.append(time.time() - call_started)
+
+    return summarize(len(arguments), time.time() - started, latencies)
+
+
+class _PageTimes(RequestHooks):
+    """
+    Keeps the latency of every page request of a scan
+    """
+    __slots__ = ('latencies',)
+
+    def __init__(self):
+        self.latencies = []
+
+    def after_response(self, info, response):
+        if info.page is not None:
+            self.latencies.append(info.elapsed)
+
+
+def bench_get_entity(user_grid, options):
+    """
+    Single entity reads by name
+
+    :rtype dict:
+    :return:
+    """
+    names = [
+        '/%s/%s-%d' % (COLLECTION, COLLECTION, index % options.entities)
+        for index in range(options.requests)
+    ]
+    return timed_calls(user_grid.get_entity, names)
+
+
+def bench_collect_entities(user_grid, options):
+    """
+    A full scan of the seeded collection, latencies are per page
+
+    :rtype dict:
+    :return:
+    """
+    pages = _PageTimes()
+    scanner = UserGrid(
+        host=options.host,
+        port=options.port,
+        org='org',
+        app='app',
+        hooks=pages
+    )
+    scanner.access_token = user_grid.access_token
+
+    started = time.time()
+    count = 0
+    for _ in scanner.collect_entities(
+            '/' + COLLECTION,
+            limit=options.page_size,
+            prefetch=options.prefetch,
+            stream=options.stream
+    ):
+        count += 1
+
+    result = summarize(count, time.time() - started, pages.latencies)
+    result['pages'] = len(pages.latencies)
+    scanner.close()
+    return result
+
+
+def bench_post_entity(user_grid, options):
+    """
+    Entity creation
+
+    :rtype dict:
+    :return:
+    """
+    entities = [
+        {'name': 'posted-%d' % index, 'payload': 'x' * options.payload_size}
+        for index in range(options.requests)
+    ]
+    return timed_calls(lambda entity: user_grid.post_entity('/posted', entity), entities)
+
+
+def bench_archive_entity(user_grid, options):
+    """
+    archive_entity: a read, a connection scan, a POST and a DELETE each
+
+    :rtype dict:
+    :return:
+    """
+    count = min(options.requests, options.entities)
+    ids = ['%s-%d' % (COLLECTION, index) for index in range(count)]
+    return timed_calls(lambda entity_id: user_grid.archive_entity(COLLECTION, entity_id), ids)
+
+
+BENCHMARKS = (
+    ('get_entity', bench_get_entity),
+    ('collect_entities', bench_collect_entities),
+    ('post_entity', bench_post_entity),
+    ('archive_entity', bench_archive_entity),
+)
+
+
+def run(options):
+    """
+    Starts the fake server and runs every selected benchmark
+
+    :param argparse.Namespace options:
+    :rtype dict:
+    :return: results ready to be dumped as JSON
+    """
+    fake = FakeUserGrid(latency=options.latency, payload_size=options.payload_size)
+    fake.seed(COLLECTION, options.entities)
+    server = serve(fake)
+    options.host, options.port = server.server_address[:2]
+
+    results = {}
+    try:
+        with UserGrid(host=options.host, port=options.port, org='org', app='app',
+                      client_id='id', client_secret='secret') as user_grid:
+            user_grid.login()
+            for name, benchmark in BENCHMARKS:
+                if options.only and name not in options.only:
+                    continue
+
+                results[name] = benchmark(user_grid, options)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'config': {
+            'entities': options.entities,
+            'requests': options.requests,
+            'page_size': options.page_size,
+            'payload_size': options.payload_size,
+            'latency': options.latency,
+            'prefetch': options.prefetch,
+            'stream': options.stream
+        },
+        'results': results
+    }
+
+
+def parse_args(argv=None):
+    """
+    :param list argv:
+    :rtype argparse.Namespace:
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the UserGrid client')
+    parser.add_argument('--entities', type=int, default=100000,
+                        help='entities in the scanned collection')
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='calls made by the single entity benchmarks')
+    parser.add_argument('--page-size', type=int, default=1000,
+                        help='limit used by collect_entities')
+    parser.add_argument('--payload-size', type=int, default=256,
+                        help='bytes of filler in each entity')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the server waits before each answer')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='pages collect_entities fetches ahead')
+    parser.add_argument('--stream', action='store_true',
+                        help='decode collect_entities pages as they are read')
+    parser.add_argument('--only', action='append',
+                        choices=[name for name, _ in BENCHMARKS],
+                        help='run only this benchmark, may be repeated')
+    parser.add_argument('--output', help='file to write the JSON results to, stdout when not set')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Command line entry point
+
+    :param list argv:
+    :return:
+    """
+    options = parse_args(argv)
+    results = run(options)
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    for name, result in sorted(results['results'].items()):
+        sys.stderr.write('%-18s %10.1f ops/s  p50 %.4fs  p99 %.4fs\n' % (
+            name,
+            result['throughput'] or 0,
+            result['latency']['p50'] or 0,
+            result['latency']['p99'] or 0
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,7 @@ setup(
     description='UserGrid 1.x Client',
     author='Christopher Smith',
     author_email='chris.s@bigmirrorlabs.com',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     package_dir={
         'usergrid': 'usergrid'
     },
@@ -22,5 +22,13 @@ setup(
         'six==1.11.0',
         'urllib3==1.22'
     ],
+    extras_require={
+        'async': ['aiohttp']
+    },
+    entry_points={
+        'console_scripts': [
+            'usergrid-export = usergrid.export:main'
+        ]
+    },
     include_package_data=True
 )
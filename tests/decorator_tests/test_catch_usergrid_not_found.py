@@ -1,5 +1,10 @@
+import gc
+import operator
+import weakref
+from usergrid.cache import NegativeCache
 from usergrid.decorators import catch_usergrid_not_found_exception
 from usergrid.exceptions import UserGridException
+import time
 from unittest import TestCase
 
 
@@ -46,3 +51,72 @@ class CatchUsergridNotFoundExceptionTest(TestCase):
         ug = UsergridTest()
 
         self.assertEqual(1, ug.get_entity("stories/foo", None))
+
+    def test_it_should_remember_not_found_calls(self):
+        """
+        Test the decorator to answer repeated misses from the instance's
+        negative cache until the ttl expires.
+        :return:
+        """
+        calls = []
+
+        class UsergridTest():
+            def __init__(self, ttl):
+                self.negative_cache = NegativeCache(ttl=ttl)
+
+            @catch_usergrid_not_found_exception(
+                return_value_on_exception=None,
+                negative_cache=operator.attrgetter('negative_cache')
+            )
+            def get_entity(self, endpoint, ql=None):
+                calls.append(endpoint)
+                raise UserGridException(title='Service resource not found',
+                                        detail="Service resource not found")
+
+        ug = UsergridTest(0.1)
+
+        self.assertEqual(None, ug.get_entity("stories/foo"))
+        self.assertEqual(None, ug.get_entity("stories/foo"))
+        self.assertEqual(None, ug.get_entity("stories/bar"))
+        self.assertEqual(["stories/foo", "stories/bar"], calls)
+
+        time.sleep(0.15)
+        ug.get_entity("stories/foo")
+        self.assertEqual(3, len(calls))
+
+    def test_it_should_forget_not_found_calls_on_invalidate(self):
+        """
+        Test a write to the path drops the remembered miss and instances do
+        not share misses or hold references to each other.
+        :return:
+        """
+        calls = []
+
+        class UsergridTest():
+            def __init__(self):
+                self.negative_cache = NegativeCache(ttl=60)
+
+            @catch_usergrid_not_found_exception(
+                return_value_on_exception=None,
+                negative_cache=operator.attrgetter('negative_cache')
+            )
+            def get_entity(self, endpoint, ql=None):
+                calls.append(endpoint)
+                raise UserGridException(title='Service resource not found',
+                                        detail="Service resource not found")
+
+        ug = UsergridTest()
+        other = UsergridTest()
+
+        ug.get_entity("/stories/foo")
+        other.get_entity("/stories/foo")
+        ug.negative_cache.invalidate("stories")
+        ug.get_entity("/stories/foo")
+        other.get_entity("/stories/foo")
+
+        self.assertEqual(3, len(calls))
+
+        reference = weakref.ref(other)
+        del other
+        gc.collect()
+        self.assertIsNone(reference())
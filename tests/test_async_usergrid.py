@@ -0,0 +1,155 @@
+"""
+AsyncUserGrid tests
+"""
+import asyncio
+import logging
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+from tests import read_json_file
+from usergrid import AsyncUserGrid
+from usergrid.exceptions import UserGridException
+
+
+class FakeTransport(object):
+    """
+    Replaces AsyncUserGrid._send with canned responses keyed by method and url
+    """
+
+    def __init__(self):
+        self.responses = {}
+        self.calls = []
+
+    def register(self, method, url, response, status_code=200):
+        self.responses[(method, url)] = (status_code, response)
+
+    async def __call__(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        # give other tasks a chance to run like a real socket would
+        await asyncio.sleep(0)
+        return self.responses[(method, url)]
+
+    def count(self, method, url):
+        return len([call for call in self.calls if call[:2] == (method, url)])
+
+
+class TestAsyncUserGrid(IsolatedAsyncioTestCase):
+    """
+    Ensures the asyncio client mirrors UserGrid
+    """
+
+    def setUp(self):
+        """
+
+        :return:
+        """
+        self.transport = FakeTransport()
+        patcher = patch.object(AsyncUserGrid, '_send', self.transport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user_grid = AsyncUserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            client_id='manchuck',
+            client_secret='manbearpig',
+            autoreconnect=True
+        )
+        logging.getLogger(AsyncUserGrid.__name__).disabled = True
+
+    async def test_it_should_get_entity(self):
+        """
+        Ensures one entity is returned
+
+        :return:
+        """
+        self.transport.register(
+            'GET',
+            'http://usergrid.com/man/chuck/users/foo',
+            read_json_file('get_entity_response.json')
+        )
+
+        entity = await self.user_grid.get_entity('/users/foo')
+
+        self.assertEqual('5dc2e4ba-2f33-11e6-9880-47e38a0eed23', entity['uuid'])
+
+    async def test_it_should_return_none_for_not_found_entity(self):
+        """
+        Ensures not found errors are turned into None
+
+        :return:
+        """
+        self.transport.register(
+            'GET',
+            'http://usergrid.com/man/chuck/users/foo',
+            read_json_file('get_entity_not_found_response.json'),
+            status_code=404
+        )
+
+        self.assertIsNone(await self.user_grid.get_entity('/users/foo'))
+
+    async def test_it_should_collect_entities(self):
+        """
+        Ensures collect_entities is an async generator over a page
+
+        :return:
+        """
+        page = read_json_file('get_entities_response.json')
+        self.transport.register(
+            'GET',
+            'http://usergrid.com/man/chuck/users',
+            page
+        )
+
+        uuids = [entity['uuid'] async for entity in self.user_grid.collect_entities('/users')]
+
+        self.assertEqual(
+            [entity['uuid'] for entity in page['entities']],
+            uuids
+        )
+
+    async def test_it_should_login_once_for_concurrent_expired_calls(self):
+        """
+        Ensures concurrent requests share a single login when the token expires
+
+        :return:
+        """
+        login_response = read_json_file('grant_auth_response.json')
+        self.transport.register(
+            'POST',
+            'http://usergrid.com/man/chuck/token',
+            login_response
+        )
+        self.transport.register(
+            'GET',
+            'http://usergrid.com/man/chuck/users/foo',
+            read_json_file('get_entity_response.json')
+        )
+
+        await self.user_grid.login()
+        self.user_grid._token_expires = 0
+
+        entities = await asyncio.gather(*[
+            self.user_grid.get_entity('/users/foo') for _ in range(20)
+        ])
+
+        self.assertEqual(20, len(entities))
+        self.assertEqual(
+            2,
+            self.transport.count('POST', 'http://usergrid.com/man/chuck/token')
+        )
+        self.assertEqual(login_response['access_token'], self.user_grid.access_token)
+
+    async def test_it_should_raise_when_token_expires_without_reconnect(self):
+        """
+        Ensures an expired token raises when autoreconnect is off
+
+        :return:
+        """
+        user_grid = AsyncUserGrid(host='usergrid.com', org='man', app='chuck')
+        user_grid._token_expires = 0
+
+        with self.assertRaises(UserGridException) as expired:
+            await user_grid.get_entity('/users/foo')
+
+        self.assertEqual(UserGridException.ERROR_EXPIRED_TOKEN, expired.exception.title)
@@ -0,0 +1,59 @@
+"""
+Benchmark suite tests
+"""
+import json
+from unittest import TestCase
+from benchmarks import run
+from benchmarks.fake_usergrid import FakeUserGrid
+
+
+class TestBenchmarks(TestCase):
+    """
+    Ensures the stand-in server behaves like UG and the runner reports
+    """
+
+    def test_it_should_page_through_seeded_entities(self):
+        """
+        Ensures cursors walk the collection and entities can be changed
+
+        :return:
+        """
+        fake = FakeUserGrid()
+        fake.seed('things', 3)
+
+        status, body = fake.handle('GET', '/org/app/things?limit=2')
+        page = json.loads(body.decode('utf-8'))
+        self.assertEqual(200, status)
+        self.assertEqual(['things-0', 'things-1'], [entity['name'] for entity in page['entities']])
+        self.assertEqual('2', page['cursor'])
+
+        fake.handle('PUT', '/org/app/things/things-2', b'{"color": "red"}')
+        fake.handle('DELETE', '/org/app/things/things-0')
+
+        page = json.loads(fake.handle('GET', '/org/app/things?limit=10')[1].decode('utf-8'))
+        self.assertEqual(['things-1', 'things-2'], [entity['name'] for entity in page['entities']])
+        self.assertEqual('red', page['entities'][1]['color'])
+        self.assertNotIn('cursor', page)
+        self.assertEqual(404, fake.handle('GET', '/org/app/things/things-0')[0])
+
+    def test_it_should_run_every_benchmark(self):
+        """
+        Ensures a small run produces results for every benchmark
+
+        :return:
+        """
+        results = run.run(run.parse_args([
+            '--entities', '50',
+            '--requests', '5',
+            '--page-size', '20',
+            '--payload-size', '16'
+        ]))
+
+        self.assertEqual(
+            ['archive_entity', 'collect_entities', 'get_entity', 'post_entity'],
+            sorted(results['results'])
+        )
+        self.assertEqual(50, results['results']['collect_entities']['operations'])
+        self.assertEqual(3, results['results']['collect_entities']['pages'])
+        self.assertEqual(5, results['results']['get_entity']['operations'])
+        self.assertIsNotNone(results['results']['post_entity']['latency']['p99'])
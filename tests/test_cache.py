@@ -0,0 +1,131 @@
+"""
+EntityCache and NegativeCache tests
+"""
+import time
+from unittest import TestCase
+from usergrid.cache import EntityCache, NegativeCache
+
+
+class TestEntityCache(TestCase):
+    """
+    Ensures the entity cache evicts, expires and invalidates entries
+    """
+
+    def test_it_should_count_hits_and_misses(self):
+        """
+        Ensures lookups are counted and keys are normalized
+
+        :return:
+        """
+        cache = EntityCache()
+        cache.set('/roles/admin/', None, {'name': 'admin'})
+
+        self.assertEqual((True, {'name': 'admin'}), cache.get('roles/admin'))
+        self.assertEqual((False, None), cache.get('roles/admin', ql='select *'))
+        self.assertEqual(
+            {'size': 1, 'max_size': 1024, 'hits': 1, 'misses': 1},
+            cache.stats()
+        )
+
+    def test_it_should_evict_least_recently_used(self):
+        """
+        Ensures the oldest unused entry is dropped when full
+
+        :return:
+        """
+        cache = EntityCache(max_size=2)
+        cache.set('roles/a', None, {})
+        cache.set('roles/b', None, {})
+        cache.get('roles/a')
+        cache.set('roles/c', None, {})
+
+        self.assertTrue(cache.get('roles/a')[0])
+        self.assertFalse(cache.get('roles/b')[0])
+        self.assertTrue(cache.get('roles/c')[0])
+
+    def test_it_should_expire_entries(self):
+        """
+        Ensures entries are not served after their ttl
+
+        :return:
+        """
+        cache = EntityCache(ttl=0.05)
+        cache.set('roles/a', None, {})
+        time.sleep(0.1)
+
+        self.assertFalse(cache.get('roles/a')[0])
+        self.assertEqual(0, len(cache))
+
+    def test_it_should_copy_entities(self):
+        """
+        Ensures callers can not change cached entities
+
+        :return:
+        """
+        cache = EntityCache()
+        entity = {'name': 'admin'}
+        cache.set('roles/admin', None, entity)
+        entity['name'] = 'changed'
+        cache.get('roles/admin')[1]['name'] = 'changed'
+
+        self.assertEqual({'name': 'admin'}, cache.get('roles/admin')[1])
+
+    def test_it_should_invalidate_overlapping_paths(self):
+        """
+        Ensures writes drop the entity, its queries and its aliases
+
+        :return:
+        """
+        cache = EntityCache()
+        entity = {
+            'uuid': '1234',
+            'name': 'admin',
+            'metadata': {'path': '/roles/1234'}
+        }
+        cache.set('roles/admin', None, entity)
+        cache.set('roles', "select * where name='admin'", entity)
+        cache.set('roles/guest', None, {'name': 'guest'})
+        cache.invalidate('/roles/1234')
+
+        self.assertFalse(cache.get('roles/admin')[0])
+        self.assertFalse(cache.get('roles', "select * where name='admin'")[0])
+        self.assertTrue(cache.get('roles/guest')[0])
+
+
+class TestNegativeCache(TestCase):
+    """
+    Ensures remembered misses expire, are swept and are invalidated
+    """
+
+    def test_it_should_sweep_expired_misses(self):
+        """
+        Ensures expired misses are dropped when new ones are added, without
+        being looked up
+
+        :return:
+        """
+        cache = NegativeCache(ttl=0.05)
+        for endpoint in ('/users/a', '/users/b'):
+            cache.add(NegativeCache.key((endpoint,), {}))
+        self.assertEqual(2, len(cache))
+
+        time.sleep(0.1)
+        cache.add(NegativeCache.key(('/users/c',), {}))
+
+        self.assertEqual(1, len(cache))
+        self.assertTrue(cache.contains(NegativeCache.key(('/users/c',), {})))
+
+    def test_it_should_invalidate_and_evict_misses(self):
+        """
+        Ensures writes drop overlapping misses and the oldest are evicted
+
+        :return:
+        """
+        cache = NegativeCache(ttl=60, max_size=2)
+        for endpoint in ('/users/a', '/users/b', '/groups/c'):
+            cache.add(NegativeCache.key((), {'endpoint': endpoint}))
+
+        self.assertFalse(cache.contains(NegativeCache.key((), {'endpoint': '/users/a'})))
+        cache.invalidate('/users')
+        self.assertFalse(cache.contains(NegativeCache.key((), {'endpoint': '/users/b'})))
+        self.assertTrue(cache.contains(NegativeCache.key((), {'endpoint': '/groups/c'})))
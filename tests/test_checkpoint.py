@@ -0,0 +1,83 @@
+"""
+Checkpoint store tests
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from usergrid.checkpoint import FileCheckpointStore, MemoryCheckpointStore
+from usergrid.checkpoint import new_checkpoint, same_scan
+
+
+class TestCheckpointStores(TestCase):
+    """
+    Ensures checkpoints are saved, read back and deleted
+    """
+
+    def setUp(self):
+        """
+
+        :return:
+        """
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_it_should_save_and_delete_checkpoints(self):
+        """
+        Ensures both stores round trip a checkpoint and forget it
+
+        :return:
+        """
+        checkpoint = new_checkpoint('/users', "select * where age > 3", 100, 'next', 200)
+
+        for store in (FileCheckpointStore(self.directory), MemoryCheckpointStore()):
+            self.assertIsNone(store.get('nightly'))
+
+            store.set('nightly', checkpoint)
+            self.assertEqual(checkpoint, store.get('nightly'))
+            self.assertIsNone(store.get('weekly'))
+
+            store.delete('nightly')
+            store.delete('nightly')
+            self.assertIsNone(store.get('nightly'))
+
+    def test_it_should_share_checkpoints_between_stores(self):
+        """
+        Ensures a new store on the same directory sees saved checkpoints and
+        leaves no temporary files
+
+        :return:
+        """
+        FileCheckpointStore(self.directory).set(
+            'nightly',
+            new_checkpoint('/users', None, None, 'next')
+        )
+
+        self.assertEqual('next', FileCheckpointStore(self.directory).get('nightly')['cursor'])
+        self.assertEqual(1, len(os.listdir(self.directory)))
+
+    def test_it_should_refuse_shared_directories(self):
+        """
+        Ensures a checkpoint directory other users can write to is not used
+
+        :return:
+        """
+        shared = os.path.join(self.directory, 'shared')
+        os.mkdir(shared)
+        os.chmod(shared, 0o777)
+
+        with self.assertRaises(PermissionError):
+            FileCheckpointStore(shared)
+
+    def test_it_should_match_scans(self):
+        """
+        Ensures checkpoints only match the scan that saved them
+
+        :return:
+        """
+        checkpoint = new_checkpoint('/users', None, 100)
+
+        self.assertTrue(same_scan(checkpoint, '/users', None, 100))
+        self.assertFalse(same_scan(checkpoint, '/users', None, 10))
+        self.assertFalse(same_scan(checkpoint, '/groups', None, 100))
+        self.assertFalse(same_scan(checkpoint, '/users', "select *", 100))
@@ -0,0 +1,94 @@
+"""
+Circuit breaker tests
+"""
+import time
+from unittest import TestCase
+from usergrid.circuit_breaker import CircuitBreaker, CircuitBreakers
+
+
+class TestCircuitBreaker(TestCase):
+    """
+    Ensures the breaker opens, probes and closes
+    """
+
+    def test_it_should_open_on_failure_rate(self):
+        """
+        Ensures the breaker opens once enough calls failed
+
+        :return:
+        """
+        changes = []
+        breaker = CircuitBreaker(
+            failure_rate=0.5,
+            min_calls=4,
+            on_state_change=lambda breaker, old, new: changes.append((old, new))
+        )
+
+        for success in (True, False, True):
+            self.assertTrue(breaker.allow())
+            breaker.record(success)
+
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+        breaker.record(False)
+
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        self.assertFalse(breaker.allow())
+        self.assertEqual([('closed', 'open')], changes)
+
+    def test_it_should_count_slow_calls_as_failures(self):
+        """
+        Ensures calls over slow_call_duration open the breaker
+
+        :return:
+        """
+        breaker = CircuitBreaker(min_calls=2, slow_call_duration=1.0)
+        breaker.record(True, 0.1)
+        breaker.record(True, 5.0)
+
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+
+    def test_it_should_probe_when_half_open(self):
+        """
+        Ensures one probe is let through after the timeout and closes on success
+
+        :return:
+        """
+        breaker = CircuitBreaker(min_calls=1, open_timeout=0.05)
+        breaker.record(False)
+        time.sleep(0.1)
+
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.record(True)
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+    def test_it_should_reopen_when_probe_fails(self):
+        """
+        Ensures a failed probe opens the breaker again
+
+        :return:
+        """
+        breaker = CircuitBreaker(min_calls=1, open_timeout=0.05)
+        breaker.record(False)
+        time.sleep(0.1)
+
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+
+    def test_it_should_keep_a_breaker_per_host(self):
+        """
+        Ensures hosts do not share state
+
+        :return:
+        """
+        breakers = CircuitBreakers(min_calls=1)
+        breakers.for_host('one.com').record(False)
+
+        self.assertIs(breakers.for_host('one.com'), breakers.for_host('one.com'))
+        self.assertEqual(
+            {'one.com': 'open', 'two.com': 'closed'},
+            dict(breakers.states(), **{'two.com': breakers.for_host('two.com').state})
+        )
@@ -0,0 +1,78 @@
+"""
+Download helper tests
+"""
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from usergrid.download import split_ranges, DownloadState, FileChanged, FileWriter, Progress
+
+
+class TestDownload(TestCase):
+    """
+    Ensures ranges are split and written in place
+    """
+
+    def test_it_should_split_ranges(self):
+        """
+        Ensures parts cover the bytes left with the last one shorter
+
+        :return:
+        """
+        self.assertEqual([(10, 40), (40, 70), (70, 80)], split_ranges(10, 80, 30))
+        self.assertEqual([], split_ranges(80, 80, 30))
+
+    def test_it_should_write_parts_in_place(self):
+        """
+        Ensures parts written out of order land at their offsets
+
+        :return:
+        """
+        buffer = io.BytesIO()
+        writer = FileWriter(buffer)
+        writer.truncate(6)
+        writer.write_at(3, b'def')
+        writer.write_at(0, b'abc')
+
+        self.assertEqual(b'abcdef', buffer.getvalue())
+
+    def test_it_should_report_progress(self):
+        """
+        Ensures progress counts from the bytes already there
+
+        :return:
+        """
+        calls = []
+        progress = Progress(lambda received, total: calls.append((received, total)), 10, 4)
+        progress.add(3)
+        progress.add(3)
+
+        self.assertEqual([(7, 10), (10, 10)], calls)
+
+    def test_it_should_track_missing_ranges(self):
+        """
+        Ensures finished ranges are merged, saved and only the gaps remain
+
+        :return:
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'foo.partial.json')
+
+        state = DownloadState(path, 100, version='1')
+        state.check_validator('"a"')
+        state.finish(30, 50)
+        state.finish(0, 10)
+        state.finish(10, 20)
+
+        loaded = DownloadState.load(path, 100, version='1')
+        self.assertEqual([(0, 20), (30, 50)], loaded.done)
+        self.assertEqual('"a"', loaded.validator)
+        self.assertEqual(40, loaded.received())
+        self.assertEqual([(20, 30), (50, 80), (80, 100)], loaded.remaining(30))
+        self.assertIsNone(DownloadState.load(path, 100, version='2'))
+        self.assertIsNone(DownloadState.load(path, 101, version='1'))
+
+        with self.assertRaises(FileChanged):
+            loaded.check_validator('"b"')
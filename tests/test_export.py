@@ -0,0 +1,288 @@
+"""
+Collection export tests
+"""
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import patch
+from urllib.parse import parse_qs
+import requests_mock
+from usergrid import UserGrid
+from usergrid.checkpoint import MemoryCheckpointStore, new_checkpoint
+from usergrid.export import export_entities, project, PartWriter, main, parse_args
+
+
+def read_parts(paths):
+    """
+    Entities of gzipped NDJSON parts, in order
+
+    :param list paths:
+    :rtype list:
+    :return:
+    """
+    entities = []
+    for path in paths:
+        with gzip.open(path, 'rt') as part:
+            entities.extend(json.loads(line) for line in part)
+
+    return entities
+
+
+@requests_mock.Mocker()
+class TestExport(TestCase):
+    """
+    Ensures collections are written to split, resumable gzip NDJSON parts
+    """
+
+    def setUp(self):
+        """
+
+        :return:
+        """
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.user_grid = UserGrid(host='usergrid.com', org='man', app='chuck', port=80)
+
+    @staticmethod
+    def register_pages(mock, base='http://usergrid.com:80'):
+        """
+        Serves /users as three pages of two, two and one users
+
+        :param mock:
+        :param str base: scheme, host and port
+        :return:
+        """
+        for query, names, cursor in (
+                ('', ['foo', 'bar'], 'second'),
+                ('?cursor=second', ['baz', 'qux'], 'third'),
+                ('?cursor=third', ['quux'], None)
+        ):
+            page = {'entities': [
+                {'name': name, 'type': 'user', 'address': {'city': name.upper(), 'zip': '1'}}
+                for name in names
+            ]}
+            if cursor:
+                page['cursor'] = cursor
+            mock.register_uri("GET", base + "/man/chuck/users" + query, json=page)
+
+    def test_it_should_project_fields(self, _):
+        """
+        Ensures top level and nested fields are kept and missing ones skipped
+
+        :return:
+        """
+        entity = {'name': 'foo', 'type': 'user', 'address': {'city': 'Paris', 'zip': '75001'}}
+
+        self.assertIs(entity, project(entity, None))
+        self.assertEqual(
+            {'name': 'foo', 'address': {'city': 'Paris'}},
+            project(entity, ['name', 'address.city', 'address.street', 'age'])
+        )
+
+    def test_it_should_export_to_one_part(self, mock):
+        """
+        Ensures every entity is written with the projected fields
+
+        :param mock:
+        :return:
+        """
+        self.register_pages(mock)
+
+        summary = export_entities(
+            self.user_grid, '/users', self.directory, limit=2, fields=['name', 'address.city'])
+
+        self.assertEqual(5, summary.entities)
+        self.assertEqual([os.path.join(self.directory, 'export-00000.ndjson.gz')], summary.parts)
+        self.assertEqual(
+            [{'name': name, 'address': {'city': name.upper()}}
+             for name in ('foo', 'bar', 'baz', 'qux', 'quux')],
+            read_parts(summary.parts)
+        )
+        self.assertEqual(['export-00000.ndjson.gz'], os.listdir(self.directory))
+
+    def test_it_should_split_parts_at_page_boundaries(self, mock):
+        """
+        Ensures a full part is closed at the end of the page that filled it
+
+        :param mock:
+        :return:
+        """
+        self.register_pages(mock)
+
+        summary = export_entities(
+            self.user_grid, '/users', self.directory, limit=2, max_bytes=1, prefix='users')
+
+        self.assertEqual(3, len(summary.parts))
+        self.assertEqual(
+            [['foo', 'bar'], ['baz', 'qux'], ['quux']],
+            [[entity['name'] for entity in read_parts([path])] for path in summary.parts]
+        )
+
+    def test_it_should_resume_from_the_last_part(self, mock):
+        """
+        Ensures a resumed export rewrites the unfinished part and nothing else
+
+        :param mock:
+        :return:
+        """
+        self.register_pages(mock)
+        store = MemoryCheckpointStore()
+        saved = new_checkpoint('/users', None, 2, 'second', 2)
+        saved['part'] = 1
+        store.set('users', saved)
+        writer = PartWriter(self.directory)
+        with open(writer.path(1) + '.partial', 'wb') as partial:
+            partial.write(b'cut short')
+
+        summary = export_entities(
+            self.user_grid, '/users', self.directory, limit=2, checkpoint='users',
+            checkpoint_store=store)
+
+        self.assertEqual([writer.path(1)], summary.parts)
+        self.assertEqual(
+            ['baz', 'qux', 'quux'],
+            [entity['name'] for entity in read_parts(summary.parts)]
+        )
+        self.assertIsNone(store.get('users'))
+        self.assertFalse(os.path.exists(writer.path(1) + '.partial'))
+
+    def test_it_should_export_from_the_command_line(self, mock):
+        """
+        Ensures the entry point logs in and writes the parts
+
+        :param mock:
+        :return:
+        """
+        self.register_pages(mock)
+        mock.register_uri(
+            "POST",
+            "http://usergrid.com:80/man/chuck/token",
+            json={'access_token': 'token', 'expires_in': 3600}
+        )
+
+        status = main([
+            '/users', '--host', 'usergrid.com', '--org', 'man', '--app', 'chuck',
+            '--client-id', 'id', '--client-secret', 'secret', '--limit', '2',
+            '--fields', 'name', '--output-dir', self.directory, '--prefix', 'users',
+            '--checkpoint', 'users', '--checkpoint-dir', os.path.join(self.directory, 'checkpoints')
+        ])
+
+        self.assertEqual(0, status)
+        self.assertEqual(
+            [{'name': name} for name in ('foo', 'bar', 'baz', 'qux', 'quux')],
+            read_parts([os.path.join(self.directory, 'users-00000.ndjson.gz')])
+        )
+        self.assertEqual([], os.listdir(os.path.join(self.directory, 'checkpoints')))
+
+    def test_it_should_parse_connection_options(self, _):
+        """
+        Ensures the port follows --use-ssl and --fields is split
+
+        :return:
+        """
+        required = ['/users', '--host', 'usergrid.com', '--org', 'man', '--app', 'chuck']
+
+        options = parse_args(required + ['--fields', 'uuid, owner.name'])
+        self.assertEqual(80, options.port)
+        self.assertFalse(options.use_ssl)
+        self.assertEqual(['uuid', 'owner.name'], options.fields)
+
+        self.assertEqual(443, parse_args(required + ['--use-ssl']).port)
+        self.assertEqual(8443, parse_args(required + ['--use-ssl', '--port', '8443']).port)
+
+    def test_it_should_export_as_a_user_over_ssl(self, mock):
+        """
+        Ensures --use-ssl connects with https and --username logs in with
+        the password
+
+        :param mock:
+        :return:
+        """
+        self.register_pages(mock, base='https://usergrid.com:443')
+        mock.register_uri(
+            "POST",
+            "https://usergrid.com:443/man/chuck/token",
+            json={'access_token': 'token', 'expires_in': 3600, 'user': {'username': 'bob'}}
+        )
+
+        status = main([
+            '/users', '--host', 'usergrid.com', '--org', 'man', '--app', 'chuck', '--use-ssl',
+            '--username', 'bob', '--password', 'secret', '--limit', '2',
+            '--output-dir', self.directory
+        ])
+
+        self.assertEqual(0, status)
+        login = parse_qs(mock.request_history[0].text)
+        self.assertEqual(['password'], login['grant_type'])
+        self.assertEqual(['bob'], login['username'])
+        self.assertEqual(['secret'], login['password'])
+        self.assertEqual(
+            5,
+            len(read_parts([os.path.join(self.directory, 'export-00000.ndjson.gz')]))
+        )
+
+    def test_it_should_log_in_again_when_the_token_expires(self, mock):
+        """
+        Ensures an export outliving its token logs in again, with client
+        credentials or with the user's password
+
+        :param mock:
+        :return:
+        """
+        started = time.time()
+        clock = [started]
+
+        def second_page(request, context):
+            # the token expires while the export is running
+            clock[0] += 7200
+            return {'entities': [{'name': 'bar'}], 'cursor': 'third'}
+
+        mock.register_uri(
+            "POST",
+            "http://usergrid.com:80/man/chuck/token",
+            json={'access_token': 'token', 'expires_in': 3600, 'user': {'username': 'bob'}}
+        )
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users",
+            json={'entities': [{'name': 'foo'}], 'cursor': 'second'}
+        )
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users?cursor=second",
+            json=second_page
+        )
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users?cursor=third",
+            json={'entities': [{'name': 'baz'}]}
+        )
+
+        for prefix, credentials in (
+                ('client', ['--client-id', 'id', '--client-secret', 'secret']),
+                ('user', ['--username', 'bob', '--password', 'secret'])
+        ):
+            mock.reset_mock()
+            clock[0] = started
+
+            with patch('time.time', lambda: clock[0]):
+                status = main([
+                    '/users', '--host', 'usergrid.com', '--org', 'man', '--app', 'chuck',
+                    '--limit', '1', '--output-dir', self.directory, '--prefix', prefix
+                ] + credentials)
+
+            self.assertEqual(0, status)
+            logins = [request.text for request in mock.request_history
+                      if request.method == 'POST']
+            self.assertEqual(2, len(logins))
+            self.assertEqual(logins[0], logins[1])
+            self.assertEqual(
+                ['foo', 'bar', 'baz'],
+                [entity['name'] for entity in read_parts(
+                    [os.path.join(self.directory, prefix + '-00000.ndjson.gz')]
+                )]
+            )
@@ -0,0 +1,86 @@
+"""
+Performance regression gate tests
+"""
+from unittest import TestCase
+from benchmarks import gate
+from benchmarks.fake_usergrid import FakeUserGrid
+
+
+class TestGate(TestCase):
+    """
+    Ensures the gate measures through the fake transport and flags regressions
+    """
+
+    def test_it_should_answer_through_the_fake_transport(self):
+        """
+        Ensures client calls reach the fake without a socket
+
+        :return:
+        """
+        fake = FakeUserGrid()
+        fake.seed('things', 5)
+        user_grid = gate.fake_client(fake)
+
+        self.assertEqual('things-3', user_grid.get_entity('/things/things-3')['name'])
+        self.assertEqual(
+            5,
+            len(list(user_grid.collect_entities('/things', limit=2, stream=True)))
+        )
+        self.assertEqual(4, fake.requests)
+
+    def test_it_should_measure_benchmarks(self):
+        """
+        Ensures every metric is produced
+
+        :return:
+        """
+        results = gate.run(
+            {'requests': 5, 'entities': 30, 'page_size': 10, 'payload_size': 8, 'repeat': 1},
+            only=['get_entities', 'collect_entities']
+        )
+
+        self.assertEqual(['collect_entities', 'get_entities'], sorted(results))
+        for metrics in results.values():
+            self.assertEqual(
+                sorted(metric for metric, _ in gate.METRICS),
+                sorted(metrics)
+            )
+            self.assertGreater(metrics['ops_per_second'], 0)
+            self.assertGreater(metrics['relative_throughput'], 0)
+            self.assertGreater(metrics['peak_memory_bytes'], 0)
+
+    def test_it_should_flag_regressions(self):
+        """
+        Ensures changes past the tolerance are flagged in the right direction,
+        and operations per second, which depend on the machine, never are
+
+        :return:
+        """
+        baseline = {'scan': {
+            'ops_per_second': 1000.0,
+            'relative_throughput': 10.0,
+            'peak_memory_bytes': 1000000
+        }}
+        current = {
+            'scan': {
+                'ops_per_second': 300.0,
+                'relative_throughput': 6.0,
+                'peak_memory_bytes': 1010000
+            },
+            'added': {'relative_throughput': 1.0}
+        }
+
+        rows = gate.compare(baseline, current, {'relative_throughput': 0.2})
+        statuses = dict(((row[0], row[1]), row[5]) for row in rows)
+
+        self.assertEqual('regression', statuses[('scan', 'relative_throughput')])
+        self.assertEqual('info', statuses[('scan', 'ops_per_second')])
+        self.assertEqual('ok', statuses[('scan', 'peak_memory_bytes')])
+        self.assertEqual('new', statuses[('added', 'relative_throughput')])
+
+        current = {'scan': {'relative_throughput': 15.0, 'peak_memory_bytes': 2000000}}
+        rows = gate.compare(baseline, current)
+        statuses = dict((row[1], row[5]) for row in rows)
+        self.assertEqual('improved', statuses['relative_throughput'])
+        self.assertEqual('regression', statuses['peak_memory_bytes'])
+        self.assertIn('REGRESSION', gate.format_report(rows))
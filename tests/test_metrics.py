@@ -0,0 +1,87 @@
+"""
+Request metrics tests
+"""
+from unittest import TestCase
+from usergrid.metrics import Histogram, RequestMetrics, render_prometheus
+from usergrid.paths import path_template
+
+
+class TestRequestMetrics(TestCase):
+    """
+    Ensures metrics are counted per endpoint and rendered
+    """
+
+    def test_it_should_template_paths(self):
+        """
+        Ensures entity ids are replaced and names kept
+
+        :return:
+        """
+        self.assertEqual('users', path_template('users'))
+        self.assertEqual('users/{id}/likes/{id}', path_template('users/foo/likes/bar'))
+
+    def test_it_should_estimate_quantiles(self):
+        """
+        Ensures quantiles are the upper bound of their bucket
+
+        :return:
+        """
+        histogram = Histogram(buckets=(0.1, 1.0))
+        self.assertIsNone(histogram.quantile(0.5))
+
+        for value in (0.05, 0.05, 0.5, 5.0):
+            histogram.observe(value)
+
+        self.assertEqual(0.1, histogram.quantile(0.5))
+        self.assertEqual(float('inf'), histogram.quantile(0.99))
+        self.assertEqual(
+            [(0.1, 2), (1.0, 3), (float('inf'), 4)],
+            histogram.snapshot()['buckets']
+        )
+
+    def test_it_should_count_per_endpoint(self):
+        """
+        Ensures requests, errors, retries and bytes are kept per endpoint
+
+        :return:
+        """
+        metrics = RequestMetrics()
+        metrics.record('GET', 'users/{id}', 0.2, status=200, response_bytes=100)
+        metrics.record('GET', 'users/{id}', 0.1, status=503)
+        metrics.record_retry('GET', 'users/{id}')
+        metrics.record('POST', 'users', 0.01, error='ConnectionError', request_bytes=10)
+
+        users, post = metrics.stats()
+
+        self.assertEqual('users/{id}', users['template'])
+        self.assertEqual(2, users['requests'])
+        self.assertEqual({'503': 1}, users['errors'])
+        self.assertEqual(1, users['retries'])
+        self.assertEqual(100, users['response_bytes'])
+        self.assertEqual({'ConnectionError': 1}, post['errors'])
+        self.assertEqual(10, post['request_bytes'])
+
+    def test_it_should_render_prometheus(self):
+        """
+        Ensures the snapshot renders as text exposition
+
+        :return:
+        """
+        metrics = RequestMetrics(buckets=(0.5,))
+        metrics.record('GET', 'users', 0.25, status=404)
+
+        text = render_prometheus(metrics.stats())
+
+        self.assertIn('usergrid_requests_total{method="GET",template="users"} 1\n', text)
+        self.assertIn(
+            'usergrid_errors_total{method="GET",status="404",template="users"} 1\n',
+            text
+        )
+        self.assertIn(
+            'usergrid_request_duration_seconds_bucket{le="+Inf",method="GET",template="users"} 1\n',
+            text
+        )
+        self.assertIn(
+            'usergrid_request_duration_seconds_sum{method="GET",template="users"} 0.25\n',
+            text
+        )
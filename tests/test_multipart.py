@@ -0,0 +1,119 @@
+"""
+Streaming multipart body tests
+"""
+import io
+from unittest import TestCase
+import hashlib
+import os
+import tempfile
+from usergrid.multipart import MultipartBody, UploadSummary, upload_timeout, source_size, \
+    file_md5, matches_checksum
+
+
+class TestMultipartBody(TestCase):
+    """
+    Ensures bodies are encoded in chunks with the right length
+    """
+
+    def test_it_should_encode_fields_and_file(self):
+        """
+        Ensures the encoded body is well formed and as long as announced
+
+        :return:
+        """
+        body = MultipartBody(
+            [('name', 'photo.jpg')],
+            'file',
+            'photo.jpg',
+            io.BytesIO(b'0123456789'),
+            chunk_size=4
+        )
+        chunks = list(body)
+        encoded = b''.join(chunks)
+        boundary = body.boundary.encode('utf-8')
+
+        self.assertEqual(body.len, len(encoded))
+        self.assertEqual('multipart/form-data; boundary=%s' % body.boundary, body.content_type)
+        self.assertIn(
+            b'--' + boundary + b'\r\n'
+            b'Content-Disposition: form-data; name="name"\r\n\r\nphoto.jpg\r\n',
+            encoded
+        )
+        self.assertIn(
+            b'Content-Disposition: form-data; name="file"; filename="photo.jpg"\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n0123456789\r\n--' + boundary + b'--\r\n',
+            encoded
+        )
+        self.assertIn(b'0123', chunks)
+
+    def test_it_should_stream_iterators_of_unknown_size(self):
+        """
+        Ensures iterators are sent as they come and report progress
+
+        :return:
+        """
+        progress = []
+        body = MultipartBody(
+            [],
+            'file',
+            'data',
+            iter([b'ab', b'', b'cd']),
+            progress=lambda sent, total: progress.append((sent, total))
+        )
+
+        self.assertIsNone(body.len)
+        encoded = b''.join(body)
+
+        self.assertIn(b'\r\n\r\nabcd\r\n', encoded)
+        self.assertIn(b'Content-Type: application/octet-stream', encoded)
+        self.assertEqual((len(encoded), None), progress[-1])
+        self.assertEqual(4, len(progress))
+
+    def test_it_should_size_sources_and_timeouts(self):
+        """
+        Ensures sizes are found from the remaining bytes and timeouts follow them
+
+        :return:
+        """
+        source = io.BytesIO(b'x' * 100)
+        source.read(40)
+
+        self.assertEqual(60, source_size(source))
+        self.assertEqual(40, source.tell())
+        self.assertEqual(3, source_size(b'abc'))
+        self.assertIsNone(source_size(iter([b'abc'])))
+
+        self.assertEqual(60, upload_timeout(10))
+        self.assertEqual(100, upload_timeout(1000, min_throughput=10, minimum=1))
+        self.assertEqual(300, upload_timeout(None))
+
+    def test_it_should_match_checksums(self):
+        """
+        Ensures files are hashed and compared with quoted or plain checksums
+
+        :return:
+        """
+        handle, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'wb') as source:
+            source.write(b'x' * 100000)
+        md5 = hashlib.md5(b'x' * 100000).hexdigest()
+
+        self.assertEqual(md5, file_md5(path, chunk_size=4096))
+        self.assertTrue(matches_checksum({'etag': '"%s"' % md5.upper()}, md5))
+        self.assertTrue(matches_checksum({'checksum': md5}, md5))
+        self.assertFalse(matches_checksum({'content-length': 100000}, md5))
+        self.assertFalse(matches_checksum(None, md5))
+
+    def test_it_should_report_upload_throughput(self):
+        """
+        Ensures throughput is bytes over elapsed seconds
+
+        :return:
+        """
+        summary = UploadSummary()
+        self.assertEqual(0.0, summary.throughput)
+
+        summary.bytes = 1000
+        summary.elapsed = 4.0
+        self.assertEqual(250.0, summary.throughput)
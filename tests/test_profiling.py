@@ -0,0 +1,67 @@
+"""
+Scan profile tests
+"""
+import time
+from unittest import TestCase
+from usergrid.profiling import ScanProfile, timed_decode, timed_network
+
+
+class TestScanProfile(TestCase):
+    """
+    Ensures phases are attributed and reported
+    """
+
+    def test_it_should_total_pages(self):
+        """
+        Ensures totals add up every page
+
+        :return:
+        """
+        profile = ScanProfile()
+        first = profile.new_page()
+        first.entities = 2
+        first.network = 0.5
+        second = profile.new_page()
+        second.entities = 1
+        second.network = 0.25
+        second.callback = 1.0
+
+        self.assertEqual([1, 2], [page.number for page in profile.pages])
+        self.assertEqual(3, profile.entities)
+        self.assertEqual(0.75, profile.totals()['network'])
+        self.assertEqual(1.0, profile.totals()['callback'])
+
+        report = profile.report().splitlines()
+        self.assertEqual(
+            ['page', 'entities', 'network', 'decode', 'callback', 'token_refresh', 'retry_sleep'],
+            report[0].split()
+        )
+        self.assertEqual(
+            ['total', '3', '0.750', '0.000', '1.000', '0.000', '0.000'],
+            report[3].split()
+        )
+
+    def test_it_should_split_network_from_decode(self):
+        """
+        Ensures time reading chunks is not counted as decoding
+
+        :return:
+        """
+        page = ScanProfile().new_page()
+
+        def slow_chunks():
+            time.sleep(0.05)
+            yield b'[1]'
+
+        def decode(chunks):
+            for chunk in chunks:
+                time.sleep(0.02)
+                yield chunk
+
+        self.assertEqual(
+            [b'[1]'],
+            list(timed_decode(decode(timed_network(slow_chunks(), page)), page))
+        )
+        self.assertGreaterEqual(page.network, 0.05)
+        self.assertGreaterEqual(page.decode, 0.02)
+        self.assertLess(page.decode, 0.05)
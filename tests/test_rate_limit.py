@@ -0,0 +1,98 @@
+"""
+Rate limiter tests
+"""
+import threading
+import time
+from unittest import TestCase
+from usergrid.rate_limit import TokenBucket, RateLimiter
+
+
+class TestRateLimiter(TestCase):
+    """
+    Ensures requests are held back to the configured limits
+    """
+
+    def test_it_should_allow_a_burst_then_pace(self):
+        """
+        Ensures the bucket lets burst through at once then waits for tokens
+
+        :return:
+        """
+        bucket = TokenBucket(rate=20, burst=2)
+
+        self.assertEqual(0, bucket.acquire())
+        self.assertEqual(0, bucket.acquire())
+
+        started = time.time()
+        bucket.acquire()
+        self.assertGreaterEqual(time.time() - started, 0.04)
+
+    def test_it_should_only_apply_matching_limits(self):
+        """
+        Ensures limits for other methods and collections are skipped
+
+        :return:
+        """
+        limiter = RateLimiter().limit(method='POST', collection='users', rate=1, burst=1)
+
+        started = time.time()
+        for _ in range(3):
+            with limiter.acquire('GET', 'users'):
+                pass
+            with limiter.acquire('POST', 'cars'):
+                pass
+
+        with limiter.acquire('post', 'users'):
+            pass
+
+        self.assertLess(time.time() - started, 0.5)
+
+    def test_it_should_cap_requests_in_flight(self):
+        """
+        Ensures no more than max_in_flight requests run at once
+
+        :return:
+        """
+        limiter = RateLimiter(max_in_flight=2)
+        lock = threading.Lock()
+        counts = {'current': 0, 'peak': 0}
+
+        def send():
+            with limiter.acquire('GET', 'users'):
+                with lock:
+                    counts['current'] += 1
+                    counts['peak'] = max(counts['peak'], counts['current'])
+                time.sleep(0.02)
+                with lock:
+                    counts['current'] -= 1
+
+        threads = [threading.Thread(target=send) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(2, counts['peak'])
+        self.assertGreater(limiter.waited, 0)
+
+    def test_it_should_release_held_slots_once(self):
+        """
+        Ensures slots taken with hold are given back once however often
+        release is called
+
+        :return:
+        """
+        limiter = RateLimiter(max_in_flight=1)
+
+        held = limiter.hold('GET', 'users')
+        held.release()
+        held.release()
+
+        with limiter.acquire('GET', 'users'):
+            other = threading.Thread(target=lambda: limiter.hold('GET', 'users').release())
+            other.start()
+            other.join(0.05)
+            self.assertTrue(other.is_alive())
+
+        other.join(1)
+        self.assertFalse(other.is_alive())
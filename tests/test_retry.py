@@ -0,0 +1,98 @@
+"""
+Retry policy tests
+"""
+from unittest import TestCase
+import requests
+from usergrid.retry import RetryPolicy, RetryBudget
+
+
+class FakeResponse(object):
+    """
+    Just enough of a response for the policy
+    """
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class TestRetryPolicy(TestCase):
+    """
+    Ensures the policy retries only what is safe and within budget
+    """
+
+    def test_it_should_retry_idempotent_failures(self):
+        """
+        Ensures retryable statuses and exceptions get a delay
+
+        :return:
+        """
+        policy = RetryPolicy(backoff_factor=1, jitter=False)
+
+        self.assertEqual(1, policy.retry_delay('GET', 1, response=FakeResponse(503)))
+        self.assertEqual(
+            2,
+            policy.retry_delay('delete', 2, exception=requests.ConnectionError())
+        )
+        self.assertEqual(2, policy.retries)
+
+    def test_it_should_not_retry_unsafe_requests(self):
+        """
+        Ensures POSTs, client errors, other exceptions and the last attempt
+        are not retried
+
+        :return:
+        """
+        policy = RetryPolicy()
+
+        self.assertIsNone(policy.retry_delay('POST', 1, response=FakeResponse(503)))
+        self.assertIsNone(policy.retry_delay('GET', 1, response=FakeResponse(404)))
+        self.assertIsNone(policy.retry_delay('GET', 1, exception=ValueError()))
+        self.assertIsNone(policy.retry_delay('GET', 3, response=FakeResponse(503)))
+        self.assertEqual(0, policy.retries)
+
+    def test_it_should_honor_retry_after(self):
+        """
+        Ensures Retry-After stretches the wait up to max_backoff
+
+        :return:
+        """
+        policy = RetryPolicy(backoff_factor=0.1, max_backoff=5, jitter=False)
+
+        self.assertEqual(
+            3,
+            policy.retry_delay('GET', 1, response=FakeResponse(503, {'Retry-After': '3'}))
+        )
+        self.assertEqual(
+            5,
+            policy.retry_delay('GET', 1, response=FakeResponse(503, {'Retry-After': '60'}))
+        )
+
+    def test_it_should_cap_backoff_with_jitter(self):
+        """
+        Ensures jittered waits stay between zero and the cap
+
+        :return:
+        """
+        policy = RetryPolicy(backoff_factor=1, max_backoff=4)
+        for attempt in range(1, 10):
+            self.assertTrue(0 <= policy.backoff(attempt) <= 4)
+
+    def test_it_should_stop_when_budget_is_spent(self):
+        """
+        Ensures the budget caps retries to a share of requests
+
+        :return:
+        """
+        budget = RetryBudget(ratio=0.5, min_retries=1, window=60)
+        policy = RetryPolicy(max_attempts=5, budget=budget)
+        for _ in range(4):
+            budget.record_request()
+
+        delays = [
+            policy.retry_delay('GET', 1, response=FakeResponse(503))
+            for _ in range(5)
+        ]
+
+        self.assertEqual(3, len([delay for delay in delays if delay is not None]))
+        self.assertEqual(2, policy.exhausted)
@@ -0,0 +1,85 @@
+"""
+Streaming parser tests
+"""
+import json
+from unittest import TestCase
+from tests import read_json_file
+from usergrid.streaming import iter_entities
+
+
+def split(body, size):
+    """
+    Splits an encoded body into chunks of size bytes
+
+    :param bytes body:
+    :param int size:
+    :return:
+    """
+    return [body[index:index + size] for index in range(0, len(body), size)]
+
+
+class TestIterEntities(TestCase):
+    """
+    Ensures entities are decoded from any chunking of the body
+    """
+
+    def test_it_should_decode_entities_across_chunks(self):
+        """
+        Ensures every chunk size yields the same entities and fields
+
+        :return:
+        """
+        response = read_json_file('get_entities_response.json')
+        response['count'] = 1234567
+        response['title'] = 'café ☃'
+        body = json.dumps(response).encode('utf-8')
+
+        for size in (1, 2, 7, 64, len(body)):
+            fields = {}
+            entities = list(iter_entities(split(body, size), fields=fields))
+
+            self.assertEqual(response['entities'], entities)
+            self.assertEqual(response['cursor'], fields['cursor'])
+            self.assertEqual(1234567, fields['count'])
+            self.assertEqual(response['title'], fields['title'])
+
+    def test_it_should_drop_keys(self):
+        """
+        Ensures unwanted top level keys are removed from each entity
+
+        :return:
+        """
+        body = json.dumps({
+            'entities': [{'uuid': 'a', 'metadata': {'uuid': 'keep'}}]
+        }).encode('utf-8')
+
+        self.assertEqual(
+            [{'uuid': 'a'}],
+            list(iter_entities([body], drop_keys=['metadata']))
+        )
+
+    def test_it_should_read_responses_without_entities(self):
+        """
+        Ensures error bodies are collected into fields
+
+        :return:
+        """
+        response = read_json_file('get_entity_not_found_response.json')
+        fields = {}
+
+        self.assertEqual(
+            [],
+            list(iter_entities(split(json.dumps(response).encode('utf-8'), 5), fields=fields))
+        )
+        self.assertEqual(response, fields)
+
+    def test_it_should_fail_on_truncated_body(self):
+        """
+        Ensures a body cut short raises instead of ending quietly
+
+        :return:
+        """
+        body = json.dumps({'entities': [{'uuid': 'a'}, {'uuid': 'b'}]}).encode('utf-8')
+
+        with self.assertRaises(ValueError):
+            list(iter_entities(split(body[:-10], 4)))
@@ -0,0 +1,88 @@
+"""
+EntitySync tests
+"""
+from unittest import TestCase
+from usergrid.sync import EntitySync
+
+
+class StubUserGrid(object):
+    """
+    Serves a fixed list of entities from collect_entities
+    """
+
+    def __init__(self, entities):
+        self.entities = entities
+        self.queries = []
+
+    def collect_entities(self, endpoint, ql=None, limit=None):
+        self.queries.append((endpoint, ql, limit))
+        return iter(self.entities)
+
+
+class TestEntitySync(TestCase):
+    """
+    Ensures syncs resume from the watermark without gaps or duplicates
+    """
+
+    def test_it_should_query_by_modified(self):
+        """
+        Ensures the query filters and orders by modified
+
+        :return:
+        """
+        user_grid = StubUserGrid([])
+        sync = EntitySync(user_grid, '/sessions', since=100, where="type = 'web'")
+        list(sync)
+
+        self.assertEqual(
+            [('/sessions', "select * where modified >= 100 and (type = 'web') "
+                           "order by modified asc", None)],
+            user_grid.queries
+        )
+
+    def test_it_should_track_watermark_with_ties(self):
+        """
+        Ensures entities seen at the watermark are skipped on the next sync
+
+        :return:
+        """
+        first = StubUserGrid([
+            {'uuid': 'a', 'modified': 100},
+            {'uuid': 'b', 'modified': 200},
+            {'uuid': 'c', 'modified': 200}
+        ])
+        sync = EntitySync(first, '/sessions')
+
+        self.assertEqual(['a', 'b', 'c'], [entity['uuid'] for entity in sync])
+        self.assertEqual(200, sync.watermark)
+        self.assertEqual({'b', 'c'}, sync.watermark_uuids)
+
+        second = StubUserGrid([
+            {'uuid': 'b', 'modified': 200},
+            {'uuid': 'c', 'modified': 200},
+            {'uuid': 'd', 'modified': 200},
+            {'uuid': 'e', 'modified': 300}
+        ])
+        sync = EntitySync(
+            second,
+            '/sessions',
+            since=sync.watermark,
+            since_uuids=sync.watermark_uuids
+        )
+
+        self.assertEqual(['d', 'e'], [entity['uuid'] for entity in sync])
+        self.assertEqual(300, sync.watermark)
+        self.assertEqual({'e'}, sync.watermark_uuids)
+        self.assertEqual(2, sync.count)
+
+    def test_it_should_keep_watermark_when_nothing_changed(self):
+        """
+        Ensures an empty sync hands back the same watermark
+
+        :return:
+        """
+        sync = EntitySync(StubUserGrid([]), '/sessions', since=200, since_uuids=['b'])
+        list(sync)
+
+        self.assertEqual(200, sync.watermark)
+        self.assertEqual({'b'}, sync.watermark_uuids)
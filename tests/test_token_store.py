@@ -0,0 +1,123 @@
+"""
+Token store tests
+"""
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from usergrid.token_store import TokenStore, FileTokenStore
+
+
+class TestFileTokenStore(TestCase):
+    """
+    Ensures tokens are shared through files and refreshes are serialized
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_it_should_save_and_read_tokens(self):
+        """
+        Ensures a token saved by one store is read by another
+
+        :return:
+        """
+        key = TokenStore.make_key('http://usergrid.com/man/chuck/token', 'manchuck')
+        FileTokenStore(self.directory).set(key, {'access_token': 'abc', 'expires': 10})
+
+        self.assertEqual(
+            {'access_token': 'abc', 'expires': 10},
+            FileTokenStore(self.directory).get(key)
+        )
+        self.assertIsNone(FileTokenStore(self.directory).get('missing'))
+
+        mode = os.stat(os.path.join(self.directory, key + '.json')).st_mode
+        self.assertEqual(0o600, stat.S_IMODE(mode))
+
+    def test_it_should_key_by_endpoint_identity_and_secret(self):
+        """
+        Ensures different clients, or the same client with another secret,
+        do not share a key
+
+        :return:
+        """
+        endpoint = 'http://usergrid.com/man/chuck/token'
+        self.assertNotEqual(
+            TokenStore.make_key(endpoint, 'one', 'secret'),
+            TokenStore.make_key(endpoint, 'two', 'secret')
+        )
+        self.assertNotEqual(
+            TokenStore.make_key(endpoint, 'one', 'secret'),
+            TokenStore.make_key(endpoint, 'one', 'wrong')
+        )
+        self.assertNotIn('secret', TokenStore.make_key(endpoint, 'one', 'secret'))
+
+    def test_it_should_refuse_shared_directories(self):
+        """
+        Ensures directories other users can write to, or symlinks to one,
+        are not used
+
+        :return:
+        """
+        shared = os.path.join(self.directory, 'shared')
+        os.mkdir(shared)
+        os.chmod(shared, 0o777)
+        with self.assertRaises(PermissionError):
+            FileTokenStore(shared)
+
+        link = os.path.join(self.directory, 'link')
+        os.symlink(self.directory, link)
+        with self.assertRaises(PermissionError):
+            FileTokenStore(link)
+
+        created = os.path.join(self.directory, 'created')
+        FileTokenStore(created)
+        self.assertEqual(0o700, stat.S_IMODE(os.stat(created).st_mode))
+
+    def test_it_should_not_follow_planted_symlinks(self):
+        """
+        Ensures saving replaces a symlink instead of writing through it
+
+        :return:
+        """
+        target = os.path.join(self.directory, 'target')
+        with open(target, 'w') as target_file:
+            target_file.write('untouched')
+        store = FileTokenStore(os.path.join(self.directory, 'tokens'))
+        os.symlink(target, store._path('key', 'json'))
+
+        self.assertIsNone(store.get('key'))
+        store.set('key', {'access_token': 'abc'})
+
+        with open(target) as target_file:
+            self.assertEqual('untouched', target_file.read())
+        self.assertEqual({'access_token': 'abc'}, store.get('key'))
+        self.assertEqual(['key.json'], os.listdir(os.path.join(self.directory, 'tokens')))
+
+    def test_it_should_hold_the_lock_exclusively(self):
+        """
+        Ensures a second holder waits for the first
+
+        :return:
+        """
+        store = FileTokenStore(self.directory)
+        events = []
+
+        def hold(name):
+            with store.lock('key'):
+                events.append(name + ' in')
+                time.sleep(0.05)
+                events.append(name + ' out')
+
+        threads = [threading.Thread(target=hold, args=(name,)) for name in 'ab']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(events[0][0], events[1][0])
+        self.assertEqual(events[2][0], events[3][0])
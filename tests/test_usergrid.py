@@ -9,10 +9,23 @@ from usergrid.usergrid import *
 import logging
 from unittest.mock import Mock
 from unittest.mock import call
+import hashlib
+import io
 import os
+import shutil
+import tempfile
 import json
+import threading
+import time
 import types
 from usergrid.exceptions import UserGridException
+from usergrid.token_store import FileTokenStore
+from usergrid.retry import RetryPolicy
+from usergrid.circuit_breaker import CircuitBreakers
+from usergrid.rate_limit import RateLimiter
+from usergrid.hooks import RequestHooks
+from usergrid.profiling import ScanProfile
+from usergrid.checkpoint import MemoryCheckpointStore
 
 SESSION = requests.Session()
 ADAPTER = requests_mock.Adapter()
@@ -167,6 +180,108 @@ class TestUserGrid(TestCase):
             'UserGrid get_entities did not return connections for an entity'
         )
 
+    def test_it_should_cache_entities_until_updated(self, mock):
+        """
+        Ensures cached entities are served locally until a write to the path
+
+        :param mock:
+        :return:
+        """
+        entities_response = read_json_file('get_entity_response.json')
+        get_request = mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            json=entities_response
+        )
+        mock.register_uri(
+            "PUT",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            json=read_json_file('put_response.json')
+        )
+
+        user_grid = UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            port=80,
+            cache_size=10
+        )
+
+        user_grid.get_entity('/users/foo')
+        entity = user_grid.get_entity_by_id('users', 'foo')
+        self.assertEqual(1, get_request.call_count)
+        self.assertEqual('5dc2e4ba-2f33-11e6-9880-47e38a0eed23', entity['uuid'])
+
+        user_grid.update_entity_by_id('users', 'foo', {'foo': 'bar'})
+        user_grid.get_entity('/users/foo')
+        self.assertEqual(2, get_request.call_count)
+        self.assertEqual(1, user_grid.cache.hits)
+        self.assertEqual(2, user_grid.cache.misses)
+
+    def test_it_should_invalidate_cache_when_writes_fail(self, mock):
+        """
+        Ensures a failed write, which may still have been applied, drops the
+        cached entity
+
+        :param mock:
+        :return:
+        """
+        get_request = mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            json=read_json_file('get_entity_response.json')
+        )
+        mock.register_uri(
+            "PUT",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            status_code=503,
+            json={'error': 'unavailable', 'exception': 'java.lang.RuntimeException'}
+        )
+
+        user_grid = UserGrid(host='usergrid.com', org='man', app='chuck', port=80, cache_size=10)
+
+        user_grid.get_entity('/users/foo')
+        with self.assertRaises(Exception):
+            user_grid.update_entity('/users/foo', {'foo': 'bar'})
+        user_grid.get_entity('/users/foo')
+
+        self.assertEqual(2, get_request.call_count)
+
+    def test_it_should_remember_not_found_entities(self, mock):
+        """
+        Ensures repeated misses are answered locally until the path is written
+
+        :param mock:
+        :return:
+        """
+        get_request = mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            json=read_json_file('get_entity_not_found_response.json'),
+            status_code=404
+        )
+        mock.register_uri(
+            "POST",
+            "http://usergrid.com:80/man/chuck/users",
+            json=read_json_file('post_response.json')
+        )
+
+        user_grid = UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            port=80,
+            negative_cache_ttl=30
+        )
+
+        self.assertIsNone(user_grid.get_entity('/users/foo'))
+        self.assertIsNone(user_grid.get_entity('/users/foo'))
+        self.assertEqual(1, get_request.call_count)
+
+        user_grid.post_entity('/users', {'name': 'foo'})
+        self.assertIsNone(user_grid.get_entity('/users/foo'))
+        self.assertEqual(2, get_request.call_count)
+
     def test_it_should_return_empty_generator(self, mock):
         """
         Test to return empty generator for collect entities if resource is
@@ -275,6 +390,42 @@ class TestUserGrid(TestCase):
             'UserGrid get_entities did not create entity'
         )
 
+    def test_it_should_post_entities_in_batches(self, mock):
+        """
+        Ensures post_entities sends array POSTs and keeps input order
+
+        :param mock:
+        :return:
+        """
+
+        def created(request, context):
+            return {
+                'entities': [
+                    dict(entity, uuid='uuid-%s' % entity['name'])
+                    for entity in json.loads(request.body)
+                ]
+            }
+
+        post_request = mock.register_uri(
+            "POST",
+            "http://usergrid.com:80/man/chuck/users",
+            json=created
+        )
+
+        names = [str(index) for index in range(7)]
+        entities = self.user_grid.post_entities(
+            '/users',
+            ({'name': name} for name in names),
+            batch_size=3,
+            max_workers=2
+        )
+
+        self.assertEqual(
+            ['uuid-%s' % name for name in names],
+            [entity['uuid'] for entity in entities]
+        )
+        self.assertEqual(3, post_request.call_count)
+
     def test_it_should_put_entity(self, mock):
         """
         Ensures UG can update an entity
@@ -303,6 +454,102 @@ class TestUserGrid(TestCase):
             'UserGrid get_entities did not create entity'
         )
 
+    def test_it_should_update_entities_by_query(self, mock):
+        """
+        Ensures update_entities follows the cursor across query PUTs
+
+        :param mock:
+        :return:
+        """
+
+        def updated(request, context):
+            if 'cursor' in request.qs:
+                return {'entities': [{'uuid': 'c'}]}
+
+            return {'entities': [{'uuid': 'a'}, {'uuid': 'b'}], 'cursor': 'next'}
+
+        put_request = mock.register_uri(
+            "PUT",
+            "http://usergrid.com:80/man/chuck/sessions?ql=select * where stale=true&limit=2",
+            json=updated
+        )
+
+        count = self.user_grid.update_entities(
+            '/sessions',
+            'select * where stale=true',
+            {'active': False},
+            limit=2
+        )
+
+        self.assertEqual(3, count)
+        self.assertEqual(2, put_request.call_count)
+        self.assertEqual({'active': False}, json.loads(put_request.last_request.body))
+
+    def test_it_should_delete_entities_by_query(self, mock):
+        """
+        Ensures delete_entities repeats until nothing is left
+
+        :param mock:
+        :return:
+        """
+        remaining = [5]
+
+        def deleted(request, context):
+            count = min(remaining[0], 2)
+            remaining[0] -= count
+            return {'entities': [{'uuid': str(index)} for index in range(count)]}
+
+        delete_request = mock.register_uri(
+            "DELETE",
+            "http://usergrid.com:80/man/chuck/sessions?ql=select * where stale=true&limit=2",
+            json=deleted
+        )
+
+        count = self.user_grid.delete_entities(
+            '/sessions',
+            'select * where stale=true',
+            limit=2
+        )
+
+        self.assertEqual(5, count)
+        self.assertEqual(4, delete_request.call_count)
+
+    def test_it_should_cap_query_limits(self, mock):
+        """
+        Ensures update_entities and delete_entities ask for at most 1000
+        entities and carry on past the first batch of a larger limit
+
+        :param mock:
+        :return:
+        """
+        remaining = [2500]
+
+        def affected(request, context):
+            count = min(remaining[0], int(request.qs['limit'][0]), 1000)
+            remaining[0] -= count
+            page = {'entities': [{'uuid': str(index)} for index in range(count)]}
+            if remaining[0] and request.method == 'PUT':
+                page['cursor'] = 'next'
+            return page
+
+        url = "http://usergrid.com:80/man/chuck/sessions?ql=select * where stale=true"
+        put_request = mock.register_uri("PUT", url, json=affected)
+        delete_request = mock.register_uri("DELETE", url, json=affected)
+
+        updated = self.user_grid.update_entities(
+            '/sessions', 'select * where stale=true', {'active': False}, limit=5000
+        )
+        self.assertEqual(2500, updated)
+        self.assertEqual(3, put_request.call_count)
+
+        remaining[0] = 2500
+        deleted = self.user_grid.delete_entities(
+            '/sessions', 'select * where stale=true', limit=5000
+        )
+        self.assertEqual(2500, deleted)
+        self.assertEqual(4, delete_request.call_count)
+        self.assertEqual(['1000'], delete_request.last_request.qs['limit'])
+
     def test_it_should_post_activity(self, mock):
         """
         Ensures that activity is posted correctly
@@ -402,6 +649,318 @@ class TestUserGrid(TestCase):
             'UserGrid get_entities did not create entity'
         )
 
+    def test_it_should_stream_file_uploads(self, mock):
+        """
+        Ensures file-like objects are streamed with progress and a timeout
+        derived from their size
+
+        :param mock:
+        :return:
+        """
+        uploads = []
+
+        def request_match(request):
+            uploads.append((b''.join(request.body), request.headers, request.timeout))
+            return True
+
+        post_response = read_json_file('post_file_response.json')
+        mock.register_uri(
+            "POST",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            json=post_response,
+            additional_matcher=request_match
+        )
+
+        progress = []
+        created = self.user_grid.post_file(
+            '/users/foo',
+            io.BytesIO(b'x' * 100000),
+            filename='big.bin',
+            progress=lambda sent, total: progress.append((sent, total)),
+            min_throughput=1000
+        )
+
+        body, headers, timeout = uploads[0]
+        self.assertEqual(post_response, created)
+        self.assertIn(b'filename="big.bin"', body)
+        self.assertIn(b'x' * 100000, body)
+        self.assertEqual(str(len(body)), headers['Content-Length'])
+        self.assertTrue(headers['Content-Type'].startswith('multipart/form-data; boundary='))
+        self.assertEqual((20, len(body) / 1000.0), timeout)
+        self.assertEqual((len(body), len(body)), progress[-1])
+
+    def test_it_should_upload_files_in_parallel(self, mock):
+        """
+        Ensures every file is uploaded, failures are recorded and files
+        already attached are skipped
+
+        :param mock:
+        :return:
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        files = []
+        for name in ('a', 'b', 'c', 'd'):
+            path = os.path.join(directory, name + '.txt')
+            with open(path, 'wb') as source:
+                source.write(name.encode('utf-8') * 10)
+            files.append(('/users/' + name, path))
+
+        unchanged = hashlib.md5(b'c' * 10).hexdigest()
+        for name in ('a', 'b', 'c', 'd'):
+            mock.register_uri(
+                "GET",
+                "http://usergrid.com:80/man/chuck/users/" + name,
+                json={'entities': [{'name': name, 'file-metadata': {'checksum': unchanged}}]}
+            )
+            mock.register_uri(
+                "POST",
+                "http://usergrid.com:80/man/chuck/users/" + name,
+                status_code=500 if name == 'b' else 200,
+                json={'error': 'boom', 'exception': 'java.lang.RuntimeException'}
+                if name == 'b' else {'entities': [{'name': name}]}
+            )
+
+        summary = self.user_grid.post_files(iter(files), max_workers=3, skip_unchanged=True)
+
+        self.assertEqual([files[0], files[3]], sorted(summary.uploaded))
+        self.assertEqual([files[2]], summary.skipped)
+        self.assertEqual([files[1]], [failure[:2] for failure in summary.failed])
+        self.assertEqual(20, summary.bytes)
+        self.assertGreater(summary.throughput, 0)
+        self.assertEqual(
+            ['a', 'b', 'd'],
+            sorted(request.path.rsplit('/', 1)[1] for request in mock.request_history
+                   if request.method == 'POST')
+        )
+
+    # pylint: disable=too-many-arguments
+    def _serve_file(self, mock, data, ranges=True, break_after=None, etag='"v1"',
+                    fail_ranges=()):
+        """
+        Serves data as the file attached to /users/foo, honoring Range
+        headers unless ranges is False and If-Range against etag
+
+        :param mock:
+        :param bytes data:
+        :param boolean ranges:
+        :param int break_after: bytes sent before the first response breaks off
+        :param str etag:
+        :param tuple fail_ranges: Range headers answered with a 500 once
+        :rtype list:
+        :return: the Range header of each file request
+        """
+        calls = []
+        failing = set(fail_ranges)
+
+        class BrokenBody(io.BytesIO):
+            """
+            A body whose connection drops once it has been read
+            """
+            def read(self, *args, **kwargs):
+                chunk = super(BrokenBody, self).read(*args, **kwargs)
+                if not chunk:
+                    raise OSError('connection reset')
+                return chunk
+
+        def body(request, context):
+            calls.append(request.headers.get('Range'))
+            context.headers['ETag'] = etag
+            if request.headers.get('Range') in failing:
+                failing.discard(request.headers['Range'])
+                context.status_code = 500
+                return io.BytesIO(b'')
+
+            start, end = 0, len(data)
+            if ranges and 'Range' in request.headers and \
+                    request.headers.get('If-Range', etag) == etag:
+                first, last = request.headers['Range'][len('bytes='):].split('-')
+                start, end = int(first), int(last) + 1 if last else len(data)
+                context.status_code = 206
+
+            if break_after is not None and len(calls) == 1:
+                return BrokenBody(data[start:start + break_after])
+
+            return io.BytesIO(data[start:end])
+
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            json={'entities': [{
+                'name': 'foo',
+                'file-metadata': {'content-type': 'image/jpeg', 'content-length': len(data)}
+            }]},
+            request_headers={'Accept': 'application/json'}
+        )
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            body=body,
+            request_headers={'Accept': 'image/jpeg'}
+        )
+        return calls
+
+    def test_it_should_download_files(self, mock):
+        """
+        Ensures the file is streamed to a buffer with its file-metadata
+
+        :param mock:
+        :return:
+        """
+        data = bytes(bytearray(range(256))) * 10
+        calls = self._serve_file(mock, data)
+        progress = []
+        buffer = io.BytesIO()
+
+        size = self.user_grid.download_file(
+            '/users/foo',
+            buffer,
+            progress=lambda received, total: progress.append((received, total))
+        )
+
+        self.assertEqual(len(data), size)
+        self.assertEqual(data, buffer.getvalue())
+        self.assertEqual(['bytes=0-2559'], calls)
+        self.assertEqual((len(data), len(data)), progress[-1])
+
+    def test_it_should_resume_downloads(self, mock):
+        """
+        Ensures a broken transfer continues with Range and If-Range
+
+        :param mock:
+        :return:
+        """
+        data = b'0123456789' * 100
+        calls = self._serve_file(mock, data, break_after=300)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'foo.jpg')
+
+        self.user_grid.download_file('/users/foo', path)
+
+        with open(path, 'rb') as downloaded:
+            self.assertEqual(data, downloaded.read())
+        self.assertEqual(2, len(calls))
+        # where the second request starts depends on how much was read before the break
+        self.assertTrue(calls[1].startswith('bytes='))
+        self.assertEqual('"v1"', mock.request_history[-1].headers['If-Range'])
+        self.assertEqual(['foo.jpg'], os.listdir(directory))
+
+    def test_it_should_resume_interrupted_downloads(self, mock):
+        """
+        Ensures a download that failed leaves dest alone and a later call
+        fetches only what is missing
+
+        :param mock:
+        :return:
+        """
+        data = b'0123456789' * 100
+        calls = self._serve_file(mock, data, break_after=300)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'foo.jpg')
+
+        with self.assertRaises(UserGridException):
+            self.user_grid.download_file('/users/foo', path, max_resumes=0)
+
+        self.assertFalse(os.path.exists(path))
+        with open(path + '.partial.json') as sidecar:
+            done = json.load(sidecar)['done']
+
+        self.user_grid.download_file('/users/foo', path)
+
+        with open(path, 'rb') as downloaded:
+            self.assertEqual(data, downloaded.read())
+        self.assertEqual('bytes=%d-999' % done[0][1] if done else 'bytes=0-999', calls[-1])
+        self.assertEqual('"v1"', mock.request_history[-1].headers['If-Range'])
+        self.assertEqual(['foo.jpg'], os.listdir(directory))
+
+    def test_it_should_download_parts_in_parallel(self, mock):
+        """
+        Ensures ranged parts are fetched and reassembled in place, falling
+        back to one request when ranges are ignored
+
+        :param mock:
+        :return:
+        """
+        data = bytes(bytearray(range(256))) * 4
+        for ranges, expected_calls in ((True, 4), (False, 2)):
+            mock.reset_mock()
+            calls = self._serve_file(mock, data, ranges=ranges)
+            buffer = io.BytesIO()
+
+            self.user_grid.download_file(
+                '/users/foo',
+                buffer,
+                max_workers=3,
+                part_size=300,
+                content_type='image/jpeg',
+                size=len(data)
+            )
+
+            self.assertEqual(data, buffer.getvalue())
+            if ranges:
+                self.assertEqual(
+                    ['bytes=0-299', 'bytes=300-599', 'bytes=600-899', 'bytes=900-1023'],
+                    sorted(calls)
+                )
+            self.assertGreaterEqual(len(calls), expected_calls)
+
+    def test_it_should_only_fetch_missing_parts(self, mock):
+        """
+        Ensures a part that failed leaves no file at dest and is the only
+        part fetched again
+
+        :param mock:
+        :return:
+        """
+        data = bytes(bytearray(range(256))) * 4
+        calls = self._serve_file(mock, data, fail_ranges=('bytes=300-599',))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'foo.jpg')
+        options = {'max_workers': 3, 'part_size': 300}
+
+        with self.assertRaises(UserGridException):
+            self.user_grid.download_file('/users/foo', path, **options)
+        self.assertFalse(os.path.exists(path))
+
+        del calls[:]
+        self.user_grid.download_file('/users/foo', path, **options)
+
+        with open(path, 'rb') as downloaded:
+            self.assertEqual(data, downloaded.read())
+        self.assertEqual(['bytes=300-599'], calls)
+        self.assertEqual(['foo.jpg'], os.listdir(directory))
+
+    def test_it_should_restart_downloads_of_changed_files(self, mock):
+        """
+        Ensures a file that changed since the parts were written, or a stale
+        file at dest, is downloaded again whole
+
+        :param mock:
+        :return:
+        """
+        data = bytes(bytearray(range(256))) * 4
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'foo.jpg')
+        with open(path, 'wb') as stale:
+            stale.write(b'x' * len(data))
+        with open(path + '.partial', 'wb') as partial:
+            partial.write(b'y' * len(data))
+        with open(path + '.partial.json', 'w') as sidecar:
+            json.dump({'size': len(data), 'validator': '"v0"', 'done': [[0, 600]]}, sidecar)
+
+        calls = self._serve_file(mock, data, etag='"v1"')
+        self.user_grid.download_file('/users/foo', path, max_workers=3, part_size=300)
+
+        with open(path, 'rb') as downloaded:
+            self.assertEqual(data, downloaded.read())
+        self.assertEqual('"v0"', mock.request_history[1].headers['If-Range'])
+        self.assertEqual(None, calls[-1])
+        self.assertEqual(['foo.jpg'], os.listdir(directory))
+
     def test_it_should_login_with_client_credentials(self, mock):
         """
         Ensures UserGrid will login correctly with client credentials
@@ -637,34 +1196,28 @@ class TestUserGrid(TestCase):
             login_request.call_count
         )
 
-    def test_it_should_not_reconnect_when_token_expires(self, mock):
+    def test_it_should_login_once_for_concurrent_expired_calls(self, mock):
         """
-        Ensures a reconnect will not happen when turned off
+        Ensures threads sharing an expired token wait on a single login
 
         :param mock:
         :return:
         """
         post_response = read_json_file('grant_auth_response.json')
-        called = False
-
-        def multiple_response(request, context):
-            context.response_code = 200
-            if not called:
-                post_response['expires_in'] = -100000
 
+        def slow_login(request, context):
+            time.sleep(0.1)
             return post_response
 
         login_request = mock.register_uri(
             "POST",
             "http://usergrid.com/man/chuck/token",
-            json=multiple_response
+            json=slow_login
         )
-
-        entities_response = read_json_file('get_entity_response.json')
         mock.register_uri(
             "GET",
             "http://usergrid.com/man/chuck/users/foo?limit=1",
-            json=entities_response
+            json=read_json_file('get_entity_response.json')
         )
 
         user_grid = UserGrid(
@@ -673,57 +1226,39 @@ class TestUserGrid(TestCase):
             app='chuck',
             client_id='foo',
             client_secret='bar',
-            autoreconnect=False
+            autoreconnect=True
         )
-
         user_grid.login()
-        with self.assertRaises(UserGridException) as expired:
-            user_grid.get_entity('/users/foo')
+        user_grid._token_expires = time.time() - 1
 
-        self.assertEqual(
-            1,
-            login_request.call_count
-        )
-
-        self.assertEqual(
-            expired.exception.detail,
-            'Access token has expired'
-        )
+        threads = [
+            threading.Thread(target=user_grid.get_entity, args=('/users/foo',))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
 
-        self.assertEqual(
-            expired.exception.title,
-            'expired_token'
-        )
+        self.assertEqual(2, login_request.call_count)
 
-    def test_it_should_not_reconnect_when_token_set(self, mock):
+    def test_it_should_refresh_token_before_it_expires(self, mock):
         """
-        Ensures that UG will not reconnect when setting a user token
+        Ensures a token inside the refresh margin is renewed in the background
 
         :param mock:
         :return:
         """
         post_response = read_json_file('grant_auth_response.json')
-        called = False
-
-        def multiple_response(request, context):
-            context.response_code = 200
-            if not called:
-                post_response['expires_in'] = -100000
-
-            return post_response
-
         login_request = mock.register_uri(
             "POST",
             "http://usergrid.com/man/chuck/token",
-            json=multiple_response
+            json=post_response
         )
-
-        entities_response = read_json_file('expired_token.json')
         mock.register_uri(
             "GET",
             "http://usergrid.com/man/chuck/users/foo?limit=1",
-            json=entities_response,
-            status_code=401
+            json=read_json_file('get_entity_response.json')
         )
 
         user_grid = UserGrid(
@@ -732,7 +1267,165 @@ class TestUserGrid(TestCase):
             app='chuck',
             client_id='foo',
             client_secret='bar',
-            autoreconnect=True
+            autoreconnect=True,
+            token_refresh_margin=60
+        )
+        user_grid.login()
+        user_grid._token_expires = time.time() + 30
+
+        self.assertIsNotNone(user_grid.get_entity('/users/foo'))
+
+        for _ in range(50):
+            if login_request.call_count == 2:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(2, login_request.call_count)
+        self.assertGreater(user_grid._token_expires, time.time() + 60)
+
+    def test_it_should_reuse_token_from_token_store(self, mock):
+        """
+        Ensures clients sharing a token store only log in once
+
+        :param mock:
+        :return:
+        """
+        login_request = mock.register_uri(
+            "POST",
+            "http://usergrid.com/man/chuck/token",
+            json=read_json_file('grant_auth_response.json')
+        )
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        user_grids = [
+            UserGrid(
+                host='usergrid.com',
+                org='man',
+                app='chuck',
+                client_id='foo',
+                client_secret='bar',
+                token_store=FileTokenStore(directory)
+            )
+            for _ in range(3)
+        ]
+        for user_grid in user_grids:
+            user_grid.login()
+
+        self.assertEqual(1, login_request.call_count)
+        self.assertEqual(
+            user_grids[0].access_token,
+            user_grids[2].access_token
+        )
+
+        # another secret is checked by UG rather than answered from the store
+        UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            client_id='foo',
+            client_secret='wrong',
+            token_store=FileTokenStore(directory)
+        ).login()
+        self.assertEqual(2, login_request.call_count)
+
+    def test_it_should_not_reconnect_when_token_expires(self, mock):
+        """
+        Ensures a reconnect will not happen when turned off
+
+        :param mock:
+        :return:
+        """
+        post_response = read_json_file('grant_auth_response.json')
+        called = False
+
+        def multiple_response(request, context):
+            context.response_code = 200
+            if not called:
+                post_response['expires_in'] = -100000
+
+            return post_response
+
+        login_request = mock.register_uri(
+            "POST",
+            "http://usergrid.com/man/chuck/token",
+            json=multiple_response
+        )
+
+        entities_response = read_json_file('get_entity_response.json')
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com/man/chuck/users/foo?limit=1",
+            json=entities_response
+        )
+
+        user_grid = UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            client_id='foo',
+            client_secret='bar',
+            autoreconnect=False
+        )
+
+        user_grid.login()
+        with self.assertRaises(UserGridException) as expired:
+            user_grid.get_entity('/users/foo')
+
+        self.assertEqual(
+            1,
+            login_request.call_count
+        )
+
+        self.assertEqual(
+            expired.exception.detail,
+            'Access token has expired'
+        )
+
+        self.assertEqual(
+            expired.exception.title,
+            'expired_token'
+        )
+
+    def test_it_should_not_reconnect_when_token_set(self, mock):
+        """
+        Ensures that UG will not reconnect when setting a user token
+
+        :param mock:
+        :return:
+        """
+        post_response = read_json_file('grant_auth_response.json')
+        called = False
+
+        def multiple_response(request, context):
+            context.response_code = 200
+            if not called:
+                post_response['expires_in'] = -100000
+
+            return post_response
+
+        login_request = mock.register_uri(
+            "POST",
+            "http://usergrid.com/man/chuck/token",
+            json=multiple_response
+        )
+
+        entities_response = read_json_file('expired_token.json')
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com/man/chuck/users/foo?limit=1",
+            json=entities_response,
+            status_code=401
+        )
+
+        user_grid = UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            client_id='foo',
+            client_secret='bar',
+            autoreconnect=True
         )
 
         # connect to get a token
@@ -809,6 +1502,455 @@ class TestUserGrid(TestCase):
             'UserGrid get_entities did not generate entities'
         )
 
+    def test_it_should_prefetch_pages(self, mock):
+        """
+        Ensures prefetching yields the same entities as a serial scan
+
+        :param mock:
+        :return:
+        """
+        page_response = read_json_file('get_entities_response.json')
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users",
+            json=page_response
+        )
+
+        actual_user_ids = [
+            user['uuid'] for user in
+            self.user_grid.collect_entities('/users', prefetch=2)
+        ]
+
+        self.assertEqual(
+            [user['uuid'] for user in page_response['entities']],
+            actual_user_ids
+        )
+
+    def test_it_should_stream_entities(self, mock):
+        """
+        Ensures streamed scans decode pages and drop keys
+
+        :param mock:
+        :return:
+        """
+        page_response = read_json_file('get_entities_response.json')
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users",
+            json=page_response
+        )
+
+        entities = list(self.user_grid.collect_entities(
+            '/users',
+            stream=True,
+            drop_keys=['metadata']
+        ))
+
+        self.assertEqual(
+            [user['uuid'] for user in page_response['entities']],
+            [user['uuid'] for user in entities]
+        )
+        self.assertFalse(any('metadata' in user for user in entities))
+
+    def test_it_should_stream_nothing_when_not_found(self, mock):
+        """
+        Ensures a streamed scan of a missing collection is empty
+
+        :param mock:
+        :return:
+        """
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users",
+            json=read_json_file('get_entity_not_found_response.json'),
+            status_code=404
+        )
+
+        self.assertEqual([], list(self.user_grid.collect_entities('/users', stream=True)))
+
+    def test_it_should_retry_failed_pages(self, mock):
+        """
+        Ensures a page that fails is retried instead of ending the scan
+
+        :param mock:
+        :return:
+        """
+        page_response = read_json_file('get_entities_response.json')
+        page_request = mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users",
+            [
+                {'exc': requests.exceptions.ConnectionError},
+                {'status_code': 503, 'json': {}},
+                {'json': page_response}
+            ]
+        )
+
+        user_grid = UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            port=80,
+            retry_policy=RetryPolicy(backoff_factor=0.001)
+        )
+        entities = list(user_grid.collect_entities('/users'))
+
+        self.assertEqual(len(page_response['entities']), len(entities))
+        self.assertEqual(3, page_request.call_count)
+        self.assertEqual(2, user_grid.retry_count)
+
+    def test_it_should_not_retry_posts(self, mock):
+        """
+        Ensures non idempotent requests are only sent once
+
+        :param mock:
+        :return:
+        """
+        post_request = mock.register_uri(
+            "POST",
+            "http://usergrid.com:80/man/chuck/users",
+            exc=requests.exceptions.ConnectionError
+        )
+
+        user_grid = UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            port=80,
+            retry_policy=RetryPolicy(backoff_factor=0.001)
+        )
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            user_grid.post_entity('/users', {'name': 'foo'})
+
+        self.assertEqual(1, post_request.call_count)
+
+    def test_it_should_call_request_hooks(self, mock):
+        """
+        Ensures hooks see each request with its template, ql and page
+
+        :param mock:
+        :return:
+        """
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users",
+            json={'entities': [{'name': 'foo'}, {'name': 'bar'}], 'cursor': 'next'}
+        )
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users?cursor=next",
+            json={'entities': [{'name': 'baz'}]}
+        )
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/devices/foo",
+            exc=requests.ConnectionError
+        )
+
+        class RecordingHooks(RequestHooks):
+            """
+            Keeps every call
+            """
+            def __init__(self):
+                self.calls = []
+
+            def before_request(self, info):
+                info.context['span'] = 'open'
+
+            def after_response(self, info, response):
+                self.calls.append(('response', info, info.context['span']))
+
+            def on_error(self, info, exception):
+                self.calls.append(('error', info, exception))
+
+        hooks = RecordingHooks()
+        user_grid = UserGrid(host='usergrid.com', org='man', app='chuck', port=80, hooks=hooks)
+
+        for stream in (False, True):
+            hooks.calls = []
+            names = [user['name'] for user in user_grid.collect_entities(
+                '/users', ql='select *', limit=2, stream=stream
+            )]
+            self.assertEqual(['foo', 'bar', 'baz'], names)
+            self.assertEqual(
+                [('response', 'users', 'select *', 1, 200, 'open'),
+                 ('response', 'users', 'select *', 2, 200, 'open')],
+                [(kind, info.template, info.ql, info.page, info.status, span)
+                 for kind, info, span in hooks.calls]
+            )
+
+        hooks.calls = []
+        with self.assertRaises(requests.ConnectionError):
+            user_grid.get_entity('/devices/foo')
+
+        (kind, info, exception), = hooks.calls
+        self.assertEqual('error', kind)
+        self.assertEqual('devices/{id}', info.template)
+        self.assertIsNone(info.page)
+        self.assertEqual('ConnectionError', info.error)
+        self.assertIsInstance(exception, requests.ConnectionError)
+
+    def _register_three_pages(self, mock):
+        """
+        Serves /users as three pages of two, one and one entities
+
+        :param mock:
+        :return:
+        """
+        for query, names, cursor in (
+                ('', ['foo', 'bar'], 'second'),
+                ('?cursor=second', ['baz', 'qux'], 'third'),
+                ('?cursor=third', ['quux'], None)
+        ):
+            page = {'entities': [{'name': name} for name in names]}
+            if cursor:
+                page['cursor'] = cursor
+            mock.register_uri("GET", "http://usergrid.com:80/man/chuck/users" + query, json=page)
+
+    def test_it_should_resume_scans_from_checkpoints(self, mock):
+        """
+        Ensures a scan that stopped continues from the last finished page
+        and the checkpoint is dropped once the scan completes
+
+        :param mock:
+        :return:
+        """
+        self._register_three_pages(mock)
+        store = MemoryCheckpointStore()
+
+        scan = self.user_grid.collect_entities(
+            '/users', limit=2, checkpoint='nightly', checkpoint_store=store)
+        self.assertEqual(['foo', 'bar', 'baz'], [next(scan)['name'] for _ in range(3)])
+        scan.close()
+
+        saved = store.get('nightly')
+        self.assertEqual(('second', 2), (saved['cursor'], saved['count']))
+
+        with self.assertRaises(UserGridException):
+            list(self.user_grid.collect_entities(
+                '/users', limit=10, checkpoint='nightly', checkpoint_store=store))
+
+        for stream in (False, True):
+            store.set('nightly', saved)
+            names = [
+                entity['name'] for entity in self.user_grid.collect_entities(
+                    '/users', limit=2, checkpoint='nightly', checkpoint_store=store,
+                    stream=stream, prefetch=1)
+            ]
+
+            self.assertEqual(['baz', 'qux', 'quux'], names)
+            self.assertIsNone(store.get('nightly'))
+
+    def test_it_should_resume_processing_from_checkpoints(self, mock):
+        """
+        Ensures process_entities only records pages whose entities were all
+        processed, on the pool too
+
+        :param mock:
+        :return:
+        """
+        self._register_three_pages(mock)
+        store = MemoryCheckpointStore()
+        names = []
+
+        def fail_on_qux(entity):
+            if entity['name'] == 'qux':
+                raise ValueError('qux')
+            names.append(entity['name'])
+
+        with self.assertRaises(ValueError):
+            self.user_grid.process_entities(
+                '/users', fail_on_qux, limit=2, checkpoint='nightly', checkpoint_store=store)
+        self.assertEqual('second', store.get('nightly')['cursor'])
+
+        summary = self.user_grid.process_entities(
+            '/users', lambda entity: names.append(entity['name']), limit=2, max_workers=2,
+            checkpoint='nightly', checkpoint_store=store)
+
+        # baz was processed before qux failed and is seen again on resume
+        self.assertEqual(3, summary.processed)
+        self.assertEqual(['foo', 'bar', 'baz'], names[:3])
+        self.assertEqual(['baz', 'quux', 'qux'], sorted(names[3:]))
+        self.assertIsNone(store.get('nightly'))
+
+    def test_it_should_profile_scan_phases(self, mock):
+        """
+        Ensures each page records its network, decode and callback time
+
+        :param mock:
+        :return:
+        """
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users",
+            json={'entities': [{'name': 'foo'}, {'name': 'bar'}], 'cursor': 'next'}
+        )
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users?cursor=next",
+            json={'entities': [{'name': 'baz'}]}
+        )
+
+        names = []
+
+        def slow_callback(entity):
+            names.append(entity['name'])
+            time.sleep(0.01)
+
+        profile = ScanProfile()
+        summary = self.user_grid.process_entities('/users', slow_callback, limit=2, profile=profile)
+        self.assertIs(profile, summary.profile)
+
+        streamed_profile = ScanProfile()
+        for entity in self.user_grid.collect_entities(
+                '/users', limit=2, stream=True, profile=streamed_profile):
+            slow_callback(entity)
+
+        self.assertEqual(['foo', 'bar', 'baz'] * 2, names)
+        for scan_profile in (profile, streamed_profile):
+            self.assertEqual([2, 1], [page.entities for page in scan_profile.pages])
+            self.assertGreaterEqual(scan_profile.pages[0].callback, 0.02)
+            self.assertGreater(scan_profile.pages[1].network, 0)
+            self.assertGreater(scan_profile.pages[1].decode, 0)
+            self.assertGreaterEqual(scan_profile.elapsed, scan_profile.totals()['callback'])
+
+    def test_it_should_record_request_metrics(self, mock):
+        """
+        Ensures each request is counted under its method and path template
+
+        :param mock:
+        :return:
+        """
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            json=read_json_file('get_entity_response.json')
+        )
+
+        user_grid = UserGrid(host='usergrid.com', org='man', app='chuck', port=80)
+        user_grid.get_entity('/users/foo')
+        user_grid.get_entity('/users/foo')
+
+        stats, = user_grid.stats()
+        self.assertEqual('GET', stats['method'])
+        self.assertEqual('users/{id}', stats['template'])
+        self.assertEqual(2, stats['requests'])
+        self.assertEqual({}, stats['errors'])
+        self.assertGreater(stats['response_bytes'], 0)
+        self.assertEqual(2, stats['latency']['count'])
+
+    def test_it_should_throttle_requests(self, mock):
+        """
+        Ensures the rate limiter paces requests to its collection
+
+        :param mock:
+        :return:
+        """
+        mock.register_uri(
+            "POST",
+            "http://usergrid.com:80/man/chuck/users",
+            json={'entities': [{'name': 'foo'}]}
+        )
+
+        user_grid = UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            port=80,
+            rate_limiter=RateLimiter().limit(method='POST', collection='users', rate=20, burst=1)
+        )
+
+        started = time.time()
+        for _ in range(3):
+            user_grid.post_entity('/users', {'name': 'foo'})
+
+        self.assertGreaterEqual(time.time() - started, 0.09)
+
+    def test_it_should_hold_in_flight_slots_while_streaming(self, mock):
+        """
+        Ensures a streamed response counts against max_in_flight until it
+        has been read and closed
+
+        :param mock:
+        :return:
+        """
+        limiter = RateLimiter(max_in_flight=1)
+        blocked = []
+
+        def wait_for_slot():
+            with limiter.acquire('GET', 'users'):
+                pass
+
+        class Body(io.BytesIO):
+            """
+            A body that checks the slot is still taken while it is read
+            """
+            def read(self, *args, **kwargs):
+                if not blocked:
+                    waiting = threading.Thread(target=wait_for_slot)
+                    waiting.start()
+                    waiting.join(0.1)
+                    blocked.append(waiting)
+                return super(Body, self).read(*args, **kwargs)
+
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            body=lambda request, context: Body(b'x' * 100)
+        )
+        user_grid = UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            port=80,
+            rate_limiter=limiter
+        )
+
+        buffer = io.BytesIO()
+        user_grid.download_file('/users/foo', buffer, content_type='image/jpeg', size=100)
+
+        self.assertEqual(b'x' * 100, buffer.getvalue())
+        self.assertTrue(blocked[0].is_alive())
+        blocked[0].join(1)
+        self.assertFalse(blocked[0].is_alive())
+
+    def test_it_should_fail_fast_when_circuit_is_open(self, mock):
+        """
+        Ensures requests are refused once the host keeps failing
+
+        :param mock:
+        :return:
+        """
+        get_request = mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            status_code=503,
+            json={
+                'error': 'unavailable',
+                'error_description': 'Service unavailable',
+                'exception': 'ServiceUnavailableException'
+            }
+        )
+
+        user_grid = UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            port=80,
+            circuit_breakers=CircuitBreakers(min_calls=2, open_timeout=60)
+        )
+
+        for _ in range(2):
+            with self.assertRaises(UserGridException):
+                user_grid.get_entity('/users/foo')
+
+        with self.assertRaises(UserGridException) as circuit_open:
+            user_grid.get_entity('/users/foo')
+
+        self.assertEqual(UserGridException.ERROR_CIRCUIT_OPEN, circuit_open.exception.title)
+        self.assertEqual(2, get_request.call_count)
+
     def test_it_should_process_entities(self, mock):
         """
 
@@ -852,6 +1994,40 @@ class TestUserGrid(TestCase):
             'UserGrid get_entities did not process entities'
         )
 
+    def test_it_should_process_entities_on_workers(self, mock):
+        """
+        Ensures a worker pool processes every entity and collects failures
+
+        :param mock:
+        :return:
+        """
+        page_response = read_json_file('get_entities_response.json')
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users",
+            json=page_response
+        )
+
+        failing_uuid = page_response['entities'][2]['uuid']
+        seen = []
+
+        def process(entity):
+            if entity['uuid'] == failing_uuid:
+                raise ValueError('cannot process')
+            seen.append(entity['uuid'])
+
+        summary = self.user_grid.process_entities(
+            '/users',
+            method=process,
+            max_workers=4
+        )
+
+        self.assertEqual(len(page_response['entities']) - 1, summary.processed)
+        self.assertEqual(1, len(summary.failed))
+        self.assertEqual(failing_uuid, summary.failed[0][0]['uuid'])
+        self.assertEqual(summary.processed, len(seen))
+        self.assertGreaterEqual(summary.elapsed, 0)
+
     def test_archive_one_entity(self, mock):
         """
         tests archiving an entity
@@ -1077,3 +2253,65 @@ class TestUserGrid(TestCase):
             )
 
             return
+
+    def test_it_should_reuse_pooled_session(self, mock):
+        """
+        Ensures requests share one pooled session configured from the
+        constructor
+
+        :param mock:
+        :return:
+        """
+        entities_response = read_json_file('get_entity_response.json')
+        mock.register_uri(
+            "GET",
+            "http://usergrid.com:80/man/chuck/users/foo",
+            json=entities_response
+        )
+
+        user_grid = UserGrid(
+            host='usergrid.com',
+            org='man',
+            app='chuck',
+            port=80,
+            pool_maxsize=4,
+            keep_alive=False
+        )
+
+        user_grid.get_entity('/users/foo')
+        session = user_grid.session
+        user_grid.get_entity('/users/foo')
+
+        self.assertIs(session, user_grid.session)
+        self.assertEqual(4, session.get_adapter('http://usergrid.com')._pool_maxsize)
+        self.assertEqual('close', mock.last_request.headers['Connection'])
+
+    def test_it_should_drop_idle_connections(self, mock):
+        """
+        Ensures idle pools are cleared while the session and its adapters
+        are kept
+
+        :param mock:
+        :return:
+        """
+        user_grid = UserGrid(host='usergrid.com', org='man', app='chuck', idle_timeout=30)
+        session = user_grid.session
+        pool_manager = session.get_adapter('http://usergrid.com').poolmanager
+        pool_manager.connection_from_url('http://usergrid.com')
+        self.assertEqual(1, len(pool_manager.pools))
+
+        user_grid._last_used -= 60
+        self.assertIs(session, user_grid.session)
+        self.assertEqual(0, len(pool_manager.pools))
+
+    def test_it_should_close_session_on_exit(self, mock):
+        """
+        Ensures the context manager closes the pooled session
+
+        :param mock:
+        :return:
+        """
+        with UserGrid(host='usergrid.com', org='man', app='chuck') as user_grid:
+            session = user_grid.session
+
+        self.assertIsNot(session, user_grid.session)
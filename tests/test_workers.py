@@ -0,0 +1,128 @@
+"""
+Background worker helper tests
+"""
+import time
+from unittest import TestCase
+from usergrid.workers import prefetch, chunked, bounded_map
+
+
+class TestPrefetch(TestCase):
+    """
+    Ensures prefetch keeps order, bounds and errors of the source
+    """
+
+    def test_it_should_yield_items_in_order(self):
+        """
+        Ensures every item is yielded in source order
+
+        :return:
+        """
+        self.assertEqual(list(range(50)), list(prefetch(iter(range(50)), 3)))
+
+    def test_it_should_raise_source_exceptions(self):
+        """
+        Ensures an exception in the source reaches the consumer
+
+        :return:
+        """
+
+        def failing():
+            yield 1
+            raise ValueError('page failed')
+
+        pages = prefetch(failing(), 2)
+        self.assertEqual(1, next(pages))
+        with self.assertRaises(ValueError):
+            next(pages)
+
+    def test_it_should_bound_items_in_flight(self):
+        """
+        Ensures the producer stays at most depth items ahead
+
+        :return:
+        """
+        produced = []
+        def source():
+            for item in range(10):
+                produced.append(item)
+                yield item
+
+        pages = prefetch(source(), 2)
+        self.assertEqual(0, next(pages))
+        time.sleep(0.3)
+
+        # one consumed, two buffered and one waiting to be buffered
+        self.assertLessEqual(len(produced), 4)
+        pages.close()
+
+
+class TestChunked(TestCase):
+    """
+    Ensures chunked groups items
+    """
+
+    def test_it_should_group_items(self):
+        """
+        Ensures the last chunk holds the remainder
+
+        :return:
+        """
+        self.assertEqual(
+            [[0, 1, 2], [3, 4, 5], [6]],
+            list(chunked(iter(range(7)), 3))
+        )
+
+
+class TestBoundedMap(TestCase):
+    """
+    Ensures bounded_map runs items on a pool and reports failures
+    """
+
+    @staticmethod
+    def square(item):
+        if item == 3:
+            raise ValueError('bad item')
+
+        time.sleep(0.01 * (item % 3))
+        return item * item
+
+    def test_it_should_keep_order(self):
+        """
+        Ensures ordered mode yields results in input order
+
+        :return:
+        """
+        results = list(bounded_map(self.square, range(8), 4))
+
+        self.assertEqual(list(range(8)), [item for item, _, _ in results])
+        self.assertEqual(25, results[5][1])
+        self.assertIsInstance(results[3][2], ValueError)
+
+    def test_it_should_yield_every_item_unordered(self):
+        """
+        Ensures unordered mode still yields each item once
+
+        :return:
+        """
+        results = list(bounded_map(self.square, range(8), 4, ordered=False))
+
+        self.assertEqual(list(range(8)), sorted(item for item, _, _ in results))
+
+    def test_it_should_apply_backpressure(self):
+        """
+        Ensures the source is not read far ahead of the consumer
+
+        :return:
+        """
+        taken = []
+
+        def source():
+            for item in range(100):
+                taken.append(item)
+                yield item
+
+        results = bounded_map(lambda item: item, source(), 2, max_pending=4)
+        next(results)
+
+        self.assertLessEqual(len(taken), 5)
+        results.close()
@@ -1,4 +1,13 @@
 from .usergrid import *
+from .async_usergrid import *
+from .token_store import *
+from .retry import *
+from .circuit_breaker import *
+from .rate_limit import *
+from .metrics import *
+from .hooks import *
+from .profiling import *
+from .checkpoint import *
 from .mock_usergrid import *
 
 import logging
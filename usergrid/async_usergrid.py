@@ -0,0 +1,386 @@
+"""
+asyncio User Grid class
+"""
+import asyncio
+import json
+import logging
+import os
+from usergrid.exceptions import UserGridException
+from usergrid.decorators import catch_usergrid_not_found_exception
+from usergrid import multipart
+from usergrid.usergrid import BaseUserGrid
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None  # pylint: disable=invalid-name
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class AsyncUserGrid(BaseUserGrid):
+    """
+    Awaitable version of UserGrid for asyncio applications
+
+    Requires aiohttp to be installed
+    """
+    __slots__ = (
+        '_aio_session',
+        '_login_lock',
+        '_refresh_task'
+    )
+
+    def __init__(self, **kwargs):
+        """
+        See BaseUserGrid for the connection options
+        """
+        super(AsyncUserGrid, self).__init__(**kwargs)
+        self._aio_session = None
+        self._login_lock = asyncio.Lock()
+        self._refresh_task = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Closes the pooled session and all of its connections
+
+        :return:
+        """
+        if self._aio_session is not None:
+            await self._aio_session.close()
+            self._aio_session = None
+
+    @property
+    def session(self):
+        """
+        The pooled aiohttp session used for every request
+
+        The session is created on first use so that it binds to the running
+        event loop
+
+        :rtype aiohttp.ClientSession:
+        :return:
+        """
+        if aiohttp is None:
+            raise RuntimeError('aiohttp is required to use AsyncUserGrid')
+
+        if self._aio_session is None or self._aio_session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._pool_connections * self._pool_maxsize,
+                limit_per_host=self._pool_maxsize,
+                force_close=not self._keep_alive,
+                keepalive_timeout=(
+                    None if not self._keep_alive else self._idle_timeout or 15
+                )
+            )
+            self._aio_session = aiohttp.ClientSession(connector=connector)
+
+        return self._aio_session
+
+    async def _send(self, method, url, **kwargs):
+        """
+        Sends a request and decodes the response body
+
+        :param str method:
+        :param str url:
+        :param kwargs:
+        :rtype (int, dict):
+        :return: status code and decoded json body
+        """
+        timeout = kwargs.pop('timeout', self._default_timeout)
+        params = kwargs.pop('params', None)
+        if params:
+            kwargs['params'] = dict(
+                (key, str(value)) for key, value in params.items()
+            )
+
+        async with self.session.request(
+                method,
+                url,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+                **kwargs
+        ) as response:
+            logger.debug('%s [%s] %s', method, response.status, url)
+            return response.status, await response.json(content_type=None)
+
+    async def login(self, **kwargs):
+        """
+        Login to UG
+
+        :param str superuser: name for the super admin
+        :param str username: user name to autheticate with
+        :param str password: password for super/user name
+        :param str client_id: id for client_grant
+        :param str client_secret: secret for client_grant
+        :param int ttl: Time in seconds for the auth token to exist
+        :return:
+        """
+        url, data, user_name = self._prepare_login(**kwargs)
+
+        try:
+            status_code, login_json = await self._send(
+                'POST',
+                url,
+                data=data,
+                timeout=20
+            )
+            self._complete_login(status_code, login_json, user_name)
+        except Exception as test:
+            raise UserGridException(
+                title=UserGridException.ERROR_GENERAL,
+                detail='Failed to connect to usergrid'
+            )
+
+    async def _check_expired_token(self):
+        """
+        Called in _make_request to check if the token is expired
+
+        Concurrent callers wait on a single login. Inside the refresh margin
+        the token is refreshed in a background task.
+        :return:
+        """
+        if self._token_needs_login():
+            async with self._login_lock:
+                # Another task may have logged in while we were waiting
+                if self._token_needs_login():
+                    await self.login()
+            return
+
+        if self._token_due_refresh() and not self._login_lock.locked():
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.ensure_future(self._refresh_token())
+
+    async def _refresh_token(self):
+        """
+        Logs in again from the background refresh task
+
+        :return:
+        """
+        async with self._login_lock:
+            try:
+                if self._token_due_refresh():
+                    await self.login()
+            except Exception as refresh_exception:  # pylint: disable=broad-except
+                logger.exception(refresh_exception)
+
+    async def _make_request(self, method, url, **kwargs):
+        """
+        Makes a call to user grid and forces a timeout
+
+        :param method:
+        :param url:
+        :param kwargs:
+        :rtype dict:
+        :return:
+        """
+        try:
+            await self._check_expired_token()
+            _, response_json = await self._send(
+                method,
+                url,
+                **self._prepare_request(kwargs)
+            )
+            return self._parse_response(response_json)
+
+        except Exception as request_exception:
+            logger.exception(request_exception)
+            raise
+
+    async def collect_entities(self, endpoint, ql=None, limit=None):  # pylint: disable=invalid-name
+        """
+        An async generator to return all entities
+
+        Do no use this for end-user code
+
+        :param str endpoint:
+        :param str ql:
+        :param int limit:
+        :rtype dict:
+        :return:
+        """
+        cursor = None
+
+        if not limit or limit > 1000:
+            limit = 1000
+
+        while True:
+            page_entities, cursor = await self.get_entities(
+                endpoint,
+                ql=ql,
+                limit=limit,
+                cursor=cursor
+            )
+
+            for entity in page_entities:
+                yield entity
+
+            if cursor is None or len(page_entities) < limit:
+                break
+
+    @catch_usergrid_not_found_exception(return_value_on_exception=([], None))
+    async def get_entities(self, endpoint, cursor=None, ql=None, limit=None):  # pylint: disable=invalid-name
+        """
+        Get entities from UG
+
+        :param str endpoint:
+        :param str cursor:
+        :param str ql:
+        :param int limit:
+        :rtype (list, str):
+        :return:
+        """
+        response = await self._make_request(
+            'GET',
+            self._get_full_endpoint(endpoint),
+            params=self._query_params(cursor=cursor, ql=ql, limit=limit)
+        )
+
+        return [response.get('entities'), response.get('cursor')]
+
+    @catch_usergrid_not_found_exception(return_value_on_exception=None)
+    async def get_entity(self, endpoint, ql=None):  # pylint: disable=invalid-name
+        """
+        Gets one entity from UG
+
+        :param str endpoint:
+        :param str ql:
+        :rtype dict | None:
+        :return:
+        """
+        entities, cursor = await self.get_entities(endpoint, ql=ql, limit=1)  # pylint: disable=unused-variable
+        entity = None
+        if entities:
+            entity = entities[0]
+
+        return entity
+
+    async def get_entity_by_id(self, entity, entity_id):
+        """
+        Helper to get an entity by an entity_id
+
+        :param entity:
+        :param entity_id:
+        :return:
+        """
+        return await self.get_entity(entity + '/' + entity_id)
+
+    async def delete_entity(self, endpoint):
+        """
+        Calls DELETE on an endpoint
+
+        :param endpoint:
+        :return:
+        """
+        return await self._make_request(
+            'DELETE',
+            self._get_full_endpoint(endpoint)
+        )
+
+    async def delete_entity_by_id(self, entity, entity_id):
+        """
+        Helper to delete entity by an id
+
+        :param entity:
+        :param entity_id:
+        :return:
+        """
+        return await self.delete_entity(entity + '/' + entity_id)
+
+    async def post_entity(self, endpoint, data):
+        """
+        Creates an entity
+
+        :param str endpoint:
+        :param dict data:
+        :return:
+        """
+        response = await self._make_request(
+            'POST',
+            self._get_full_endpoint(endpoint),
+            data=json.dumps(data)
+        )
+
+        return response['entities'][0]
+
+    async def update_entity(self, endpoint, data):
+        """
+        Runs put on an endpoint
+
+        :param str endpoint:
+        :param dict data:
+        :return:
+        """
+        response = await self._make_request(
+            'PUT',
+            self._get_full_endpoint(endpoint),
+            data=json.dumps(data)
+        )
+
+        return response['entities'][0]
+
+    async def update_entity_by_id(self, entity, entity_id, data):
+        """
+        Helper to update an entity by id
+
+        :param entity:
+        :param entity_id:
+        :param data:
+        :return:
+        """
+        return await self.update_entity(entity + '/' + entity_id, data)
+
+    async def post_relationship(self, endpoint):
+        """
+        Posts a relationship to an entity
+
+        :param str endpoint:
+        :return:
+        """
+        return await self._make_request(
+            'POST',
+            self._get_full_endpoint(endpoint)
+        )
+
+    async def delete_relationship(self, endpoint):
+        """
+        Deletes a relationship to an entity
+
+        :param str endpoint:
+        :return:
+        """
+        return await self._make_request(
+            'DELETE',
+            self._get_full_endpoint(endpoint)
+        )
+
+    async def post_file(self, endpoint, filepath):
+        """
+        Saves a file to UserGrid
+
+        :param endpoint:
+        :param filepath:
+        :return:
+        """
+        with open(filepath, 'rb') as file_handler:
+            form = aiohttp.FormData()
+            form.add_field(
+                'file',
+                file_handler,
+                filename=os.path.basename(filepath)
+            )
+            form.add_field('name', os.path.basename(filepath))
+
+            return await self._make_request(
+                'POST',
+                self._get_full_endpoint(endpoint),
+                data=form,
+                timeout=multipart.upload_timeout(os.path.getsize(filepath))
+            )
+
+
+__all__ = ['AsyncUserGrid']
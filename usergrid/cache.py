@@ -0,0 +1,276 @@
+"""
+In-process cache for entities read from UG
+"""
+import collections
+import copy
+import threading
+import time
+from usergrid.paths import normalize_path, paths_overlap
+
+
+class EntityCache(object):
+    """
+    LRU cache of entities keyed by endpoint and ql with a TTL per entry
+
+    Cached entities are copied in and out so callers can mutate what they
+    get back without changing the cache.
+    """
+    __slots__ = (
+        '_max_size',
+        '_ttl',
+        '_entries',
+        '_lock',
+        'hits',
+        'misses'
+    )
+
+    def __init__(self, max_size=1024, ttl=60):
+        """
+        :param int max_size: entries kept before the least recently used is evicted
+        :param float ttl: seconds an entry is served for
+        """
+        assert max_size > 0
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(endpoint, ql):  # pylint: disable=invalid-name
+        return normalize_path(endpoint), ql
+
+    @staticmethod
+    def _aliases(entity):
+        """
+        Other paths that address a cached entity, by uuid and by name
+
+        :param dict entity:
+        :rtype list:
+        :return:
+        """
+        if not isinstance(entity, dict) or 'metadata' not in entity:
+            return []
+
+        path = normalize_path(entity['metadata'].get('path') or '')
+        if not path:
+            return []
+
+        aliases = [path]
+        if 'name' in entity:
+            aliases.append(path.rsplit('/', 1)[0] + '/' + str(entity['name']))
+
+        return aliases
+
+    def get(self, endpoint, ql=None):  # pylint: disable=invalid-name
+        """
+        Looks up an entity
+
+        :param str endpoint:
+        :param str ql:
+        :rtype (boolean, dict):
+        :return: whether the entry was found and the cached entity
+        """
+        key = self._key(endpoint, ql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, copy.deepcopy(entry[1])
+
+    def set(self, endpoint, ql, entity):  # pylint: disable=invalid-name
+        """
+        Stores an entity
+
+        :param str endpoint:
+        :param str ql:
+        :param dict entity:
+        :return:
+        """
+        key = self._key(endpoint, ql)
+        entry = (time.time() + self._ttl, copy.deepcopy(entity), self._aliases(entity))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, endpoint):
+        """
+        Drops every entry a write to endpoint could have changed
+
+        :param str endpoint:
+        :return:
+        """
+        path = normalize_path(endpoint)
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if paths_overlap(path, key[0]) or path in entry[2]
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        """
+        Drops every entry and resets the counters
+
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Snapshot of the cache counters
+
+        :rtype dict:
+        :return:
+        """
+        return {
+            'size': len(self._entries),
+            'max_size': self._max_size,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class NegativeCache(object):
+    """
+    Remembers calls that ended in a not found error for a short time
+
+    Each client keeps its own cache. Keys are the call arguments without
+    the client, and each entry keeps the paths found in the arguments so
+    writes to those paths can drop it. Every entry lives for the same ttl,
+    so expired entries are always the oldest and are swept when new misses
+    are added.
+    """
+    __slots__ = (
+        '_ttl',
+        '_max_size',
+        '_entries',
+        '_lock',
+        'hits',
+        'misses'
+    )
+
+    def __init__(self, ttl, max_size=1024):
+        """
+        :param float ttl: seconds a miss is remembered
+        :param int max_size: entries kept before the oldest is evicted
+        """
+        assert ttl > 0
+        assert max_size > 0
+        self._ttl = ttl
+        self._max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(args, kwargs):
+        """
+        Builds a cache key from call arguments
+
+        :param tuple args: without the client
+        :param dict kwargs:
+        :rtype tuple | None:
+        :return: None when the arguments can not be hashed
+        """
+        key = (args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+
+        return key
+
+    def contains(self, key):
+        """
+        Checks for an unexpired miss
+
+        :param tuple key:
+        :rtype boolean:
+        :return:
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False
+
+            self.hits += 1
+            return True
+
+    def add(self, key):
+        """
+        Records a miss for ttl seconds
+
+        :param tuple key:
+        :return:
+        """
+        args, kwargs = key
+        paths = [
+            normalize_path(value)
+            for value in args + tuple(value for name, value in kwargs if name == 'endpoint')
+            if isinstance(value, str)
+        ]
+        now = time.time()
+
+        with self._lock:
+            self._entries[key] = (now + self._ttl, paths)
+            self._entries.move_to_end(key)
+
+            while self._entries:
+                oldest = next(iter(self._entries.values()))
+                if oldest[0] >= now and len(self._entries) <= self._max_size:
+                    break
+                self._entries.popitem(last=False)
+
+    def invalidate(self, endpoint):
+        """
+        Drops misses a write to endpoint could have turned into hits
+
+        :param str endpoint:
+        :return:
+        """
+        path = normalize_path(endpoint)
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if any(paths_overlap(path, other) for other in entry[1])
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        """
+        Drops every entry and resets the counters
+
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+__all__ = ['EntityCache', 'NegativeCache']
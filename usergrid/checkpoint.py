@@ -0,0 +1,170 @@
+"""
+Checkpoint stores for resuming collection scans
+"""
+import errno
+import hashlib
+import os
+import time
+from usergrid import file_store
+
+
+class CheckpointStore(object):
+    """
+    Interface for checkpoint stores
+
+    A checkpoint is a dict with the endpoint, ql and limit of a scan, the
+    cursor of the next page, the number of entities consumed so far and
+    when it was saved.
+    """
+    __slots__ = ()
+
+    def get(self, key):
+        """
+        Reads a checkpoint
+
+        :param str key:
+        :rtype dict | None:
+        :return:
+        """
+        raise NotImplementedError()
+
+    def set(self, key, checkpoint):
+        """
+        Saves a checkpoint
+
+        :param str key:
+        :param dict checkpoint:
+        :return:
+        """
+        raise NotImplementedError()
+
+    def delete(self, key):
+        """
+        Forgets a checkpoint, once its scan has finished
+
+        :param str key:
+        :return:
+        """
+        raise NotImplementedError()
+
+
+class MemoryCheckpointStore(CheckpointStore):
+    """
+    Keeps checkpoints in a dict, for resuming within one process
+    """
+    __slots__ = (
+        '_checkpoints',
+    )
+
+    def __init__(self):
+        self._checkpoints = {}
+
+    def get(self, key):
+        checkpoint = self._checkpoints.get(key)
+        return dict(checkpoint) if checkpoint is not None else None
+
+    def set(self, key, checkpoint):
+        self._checkpoints[key] = dict(checkpoint)
+
+    def delete(self, key):
+        self._checkpoints.pop(key, None)
+
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    Stores checkpoints as JSON files in a directory
+
+    Files are replaced atomically so a process killed while saving leaves
+    the previous checkpoint behind. Like FileTokenStore, the directory must
+    only be usable by its owner.
+    """
+    __slots__ = (
+        '_directory',
+    )
+
+    def __init__(self, directory=None):
+        """
+        :param str directory: defaults to usergrid-checkpoints-<uid> in the temp dir
+        :raises PermissionError: when the directory is not private
+        """
+        self._directory = file_store.private_directory(
+            directory or file_store.default_directory('usergrid-checkpoints')
+        )
+
+    def _path(self, key):
+        return os.path.join(
+            self._directory,
+            '%s.json' % hashlib.sha256(key.encode('utf-8')).hexdigest()
+        )
+
+    def get(self, key):
+        """
+        Reads a checkpoint, None if missing or unreadable
+
+        :param str key:
+        :rtype dict | None:
+        :return:
+        """
+        return file_store.read_json(self._path(key))
+
+    def set(self, key, checkpoint):
+        """
+        Saves a checkpoint, replacing the file atomically
+
+        :param str key:
+        :param dict checkpoint:
+        :return:
+        """
+        file_store.write_json(self._path(key), checkpoint)
+
+    def delete(self, key):
+        """
+        :param str key:
+        :return:
+        """
+        try:
+            os.remove(self._path(key))
+        except OSError as remove_exception:
+            if remove_exception.errno != errno.ENOENT:
+                raise
+
+
+def new_checkpoint(endpoint, ql, limit, cursor=None, count=0):  # pylint: disable=invalid-name
+    """
+    :param str endpoint:
+    :param str ql:
+    :param int limit:
+    :param str cursor: cursor of the next page, None before the first page
+    :param int count: entities consumed so far
+    :rtype dict:
+    :return:
+    """
+    return {
+        'endpoint': endpoint,
+        'ql': ql,
+        'limit': limit,
+        'cursor': cursor,
+        'count': count,
+        'saved': time.time()
+    }
+
+
+def same_scan(checkpoint, endpoint, ql, limit):  # pylint: disable=invalid-name
+    """
+    Whether a checkpoint was saved by a scan with these arguments
+
+    :param dict checkpoint:
+    :param str endpoint:
+    :param str ql:
+    :param int limit:
+    :rtype boolean:
+    :return:
+    """
+    return (
+        checkpoint.get('endpoint') == endpoint and
+        checkpoint.get('ql') == ql and
+        checkpoint.get('limit') == limit
+    )
+
+
+__all__ = ['CheckpointStore', 'MemoryCheckpointStore', 'FileCheckpointStore']
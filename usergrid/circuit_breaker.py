@@ -0,0 +1,254 @@
+"""
+Circuit breaker for failing fast when UG is unhealthy
+"""
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+# pylint: disable=too-many-instance-attributes
+class CircuitBreaker(object):
+    """
+    Tracks the failure rate of calls to one host
+
+    Closed lets every call through. When enough calls in the window failed,
+    or took longer than slow_call_duration, the breaker opens and calls are
+    refused until open_timeout passes. It then half opens and lets
+    half_open_calls probes through: if they all succeed it closes, if one
+    fails it opens again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    __slots__ = (
+        'name',
+        '_failure_rate',
+        '_min_calls',
+        '_window',
+        '_slow_call_duration',
+        '_open_timeout',
+        '_half_open_calls',
+        '_on_state_change',
+        '_state',
+        '_opened_at',
+        '_calls',
+        '_probes',
+        '_probe_successes',
+        '_lock'
+    )
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, name=None, failure_rate=0.5, min_calls=20, window=30.0,
+                 slow_call_duration=None, open_timeout=30.0, half_open_calls=1,
+                 on_state_change=None):
+        """
+        :param str name: shown in logs and errors, usually the host
+        :param float failure_rate: share of failed calls that opens the breaker
+        :param int min_calls: calls needed in the window before it can open
+        :param float window: seconds of calls to consider
+        :param float slow_call_duration: calls slower than this count as failures
+        :param float open_timeout: seconds to refuse calls before probing
+        :param int half_open_calls: successful probes needed to close
+        :param callable on_state_change: called with the breaker, old and new state
+        """
+        self.name = name
+        self._failure_rate = failure_rate
+        self._min_calls = min_calls
+        self._window = window
+        self._slow_call_duration = slow_call_duration
+        self._open_timeout = open_timeout
+        self._half_open_calls = half_open_calls
+        self._on_state_change = on_state_change
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._calls = collections.deque()
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """
+        The current state, moving from open to half open once the timeout passed
+
+        :rtype str:
+        :return:
+        """
+        with self._lock:
+            change = self._check_timeout()
+            state = self._state
+
+        self._notify(change)
+        return state
+
+    def _check_timeout(self):
+        """
+        Half opens once the open timeout passed, must be called with the lock held
+
+        :rtype tuple | None:
+        :return:
+        """
+        if self._state == self.OPEN and time.time() - self._opened_at >= self._open_timeout:
+            return self._transition(self.HALF_OPEN)
+
+        return None
+
+    def _transition(self, state):
+        """
+        Changes state, must be called with the lock held
+
+        :param str state:
+        :rtype tuple:
+        :return: the old and new state to pass to _notify
+        """
+        old_state = self._state
+        self._state = state
+        self._probes = 0
+        self._probe_successes = 0
+        self._calls.clear()
+        if state == self.OPEN:
+            self._opened_at = time.time()
+
+        return old_state, state
+
+    def _notify(self, change):
+        """
+        Reports a state change, called without the lock so callbacks can
+        use the breaker
+
+        :param tuple change:
+        :return:
+        """
+        if change is None:
+            return
+
+        old_state, state = change
+        logger.warning('Circuit breaker %s: %s -> %s', self.name, old_state, state)
+        if self._on_state_change is not None:
+            try:
+                self._on_state_change(self, old_state, state)
+            except Exception as callback_exception:  # pylint: disable=broad-except
+                logger.exception(callback_exception)
+
+    def allow(self):
+        """
+        Checks if a call may be made, every allowed call must be recorded
+
+        :rtype boolean:
+        :return:
+        """
+        with self._lock:
+            change = self._check_timeout()
+            allowed = self._state == self.CLOSED
+            if self._state == self.HALF_OPEN and self._probes < self._half_open_calls:
+                self._probes += 1
+                allowed = True
+
+        self._notify(change)
+        return allowed
+
+    def record(self, success, duration=0.0):
+        """
+        Records the outcome of an allowed call
+
+        :param boolean success:
+        :param float duration: seconds the call took
+        :return:
+        """
+        failed = not success or (
+            self._slow_call_duration is not None and duration > self._slow_call_duration
+        )
+        now = time.time()
+
+        with self._lock:
+            change = self._record(failed, now)
+
+        self._notify(change)
+
+    def _record(self, failed, now):
+        """
+        Updates the state for a call outcome, must be called with the lock held
+
+        :param boolean failed:
+        :param float now:
+        :rtype tuple | None:
+        :return:
+        """
+        if self._state == self.HALF_OPEN:
+            if failed:
+                return self._transition(self.OPEN)
+
+            self._probe_successes += 1
+            if self._probe_successes >= self._half_open_calls:
+                return self._transition(self.CLOSED)
+            return None
+
+        if self._state != self.CLOSED:
+            return None
+
+        self._calls.append((now, failed))
+        while self._calls and self._calls[0][0] < now - self._window:
+            self._calls.popleft()
+
+        if len(self._calls) < self._min_calls:
+            return None
+
+        failures = len([call for call in self._calls if call[1]])
+        if failures >= self._failure_rate * len(self._calls):
+            return self._transition(self.OPEN)
+
+        return None
+
+
+class CircuitBreakers(object):
+    """
+    One circuit breaker per host, built with the same options
+
+    Share an instance between clients to share breaker state
+    """
+    __slots__ = (
+        '_options',
+        '_breakers',
+        '_lock'
+    )
+
+    def __init__(self, **options):
+        """
+        :param options: CircuitBreaker options
+        """
+        self._options = options
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def for_host(self, host):
+        """
+        The breaker for a host, created on first use
+
+        :param str host:
+        :rtype CircuitBreaker:
+        :return:
+        """
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(name=host, **self._options)
+
+            return self._breakers[host]
+
+    def states(self):
+        """
+        Snapshot of every breaker's state
+
+        :rtype dict:
+        :return:
+        """
+        with self._lock:
+            breakers = list(self._breakers.items())
+
+        return dict((host, breaker.state) for host, breaker in breakers)
+
+
+__all__ = ['CircuitBreaker', 'CircuitBreakers']
@@ -1,24 +1,67 @@
+import asyncio
 import functools
+from usergrid.cache import NegativeCache
 from usergrid.exceptions import UserGridException
 
 
-def catch_usergrid_not_found_exception(return_value_on_exception=None):
+def catch_usergrid_not_found_exception(return_value_on_exception=None,
+                                       negative_cache=None):
     """
     decorator to catch usergrid not found exception.
     :param return_value_on_exception: default return value when there is a
            usergrid service not found exception.
+    :param negative_cache: callable passed the first argument (self for
+           methods) and returning the NegativeCache that answers repeated
+           calls that were not found with the default value, or None to call
+           the function every time. The cache belongs to that object, so the
+           first argument is not part of its keys.
     :return:
     """
 
+    def lookup(args, kwargs):
+        cache = negative_cache(args[0]) if negative_cache and args else None
+        if cache is None:
+            return None, None
+
+        key = NegativeCache.key(args[1:], kwargs)
+        if key is None:
+            return None, None
+
+        return cache, key
+
+    def remember(cache, key, ug_exception):
+        if ug_exception.detail != 'Service resource not found':
+            raise ug_exception
+
+        if cache is not None:
+            cache.add(key)
+        return return_value_on_exception
+
     def catch_not_found_exception(function):
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                cache, key = lookup(args, kwargs)
+                if cache is not None and cache.contains(key):
+                    return return_value_on_exception
+
+                try:
+                    return await function(*args, **kwargs)
+                except UserGridException as ug_exception:
+                    return remember(cache, key, ug_exception)
+
+            return async_wrapper
+
         @functools.wraps(function)
         def wrapper(*args, **kwargs):
+            cache, key = lookup(args, kwargs)
+            if cache is not None and cache.contains(key):
+                return return_value_on_exception
+
             try:
                 return function(*args, **kwargs)
             except UserGridException as ug_exception:
-                if ug_exception.detail == 'Service resource not found':
-                    return return_value_on_exception
-                raise ug_exception
+                return remember(cache, key, ug_exception)
 
         return wrapper
 
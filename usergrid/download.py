@@ -0,0 +1,397 @@
+"""
+Helpers for streaming file downloads to disk or a buffer
+"""
+import os
+import threading
+from usergrid import file_store
+
+CHUNK_SIZE = 64 * 1024
+
+# parts smaller than this are not worth a request of their own
+PART_SIZE = 8 * 1024 * 1024
+
+
+class RestartDownload(Exception):
+    """
+    The parts downloaded so far can not be completed, the download starts
+    over with the whole file
+    """
+
+
+class RangesNotSupported(RestartDownload):
+    """
+    The server answered a ranged request with the whole file, because it
+    ignores Range or because the file changed since If-Range's version
+    """
+
+
+class FileChanged(RestartDownload):
+    """
+    Parts of the download came from different versions of the file
+    """
+
+
+def partial_path(dest):
+    """
+    Where a download to dest is written until it completes
+
+    :param str dest:
+    :rtype str:
+    :return:
+    """
+    return dest + '.partial'
+
+
+def file_version(metadata):
+    """
+    What identifies the version of a file in an entity's file-metadata
+
+    :param dict metadata:
+    :rtype str | None:
+    :return:
+    """
+    for key in ('etag', 'checksum', 'last-modified'):
+        if metadata.get(key) is not None:
+            return str(metadata[key])
+
+    return None
+
+
+def response_validator(response):
+    """
+    The validator If-Range can send back for a response: a strong ETag, or
+    Last-Modified when there is none
+
+    :param requests.Response response:
+    :rtype str | None:
+    :return:
+    """
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+
+    return response.headers.get('Last-Modified')
+
+
+def merge_ranges(ranges):
+    """
+    Sorts ranges and joins those that touch or overlap
+
+    :param list ranges: (start, end) pairs, end excluded
+    :rtype list:
+    :return:
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def split_ranges(start, size, part_size=PART_SIZE):
+    """
+    Splits bytes start to size into parts of part_size
+
+    :param int start:
+    :param int size:
+    :param int part_size:
+    :rtype list:
+    :return: (start, end) pairs, end excluded
+    """
+    assert part_size > 0
+    return [
+        (offset, min(size, offset + part_size))
+        for offset in range(start, size, part_size)
+    ]
+
+
+class DownloadState(object):
+    """
+    The byte ranges of a download that have been written
+
+    For a download to a path it is kept next to the .partial file, so an
+    interrupted download resumes with the ranges that are missing rather
+    than trusting the size of the partial file. It is only reused for the
+    same size and version of the file.
+    """
+    __slots__ = (
+        'path',
+        'size',
+        'version',
+        'validator',
+        'done',
+        '_lock'
+    )
+
+    def __init__(self, path, size, version=None):
+        """
+        :param str path: sidecar file, None to keep the state in memory
+        :param int size: bytes in the file
+        :param str version: from the entity's file-metadata
+        """
+        self.path = path
+        self.size = size
+        self.version = version
+        self.validator = None
+        self.done = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, size, version=None):
+        """
+        Reads the state an earlier download of the same file saved
+
+        :param str path:
+        :param int size:
+        :param str version: when known, a state saved for another version
+                            is ignored
+        :rtype DownloadState | None:
+        :return:
+        """
+        saved = file_store.read_json(path)
+        if not saved or saved.get('size') != size:
+            return None
+
+        if version is not None and saved.get('version') != version:
+            return None
+
+        state = cls(path, size, version)
+        state.validator = saved.get('validator')
+        state.done = merge_ranges(tuple(done) for done in saved.get('done', []))
+        return state
+
+    def save(self):
+        """
+        :return:
+        """
+        if self.path is not None:
+            file_store.write_json(self.path, {
+                'size': self.size,
+                'version': self.version,
+                'validator': self.validator,
+                'done': self.done
+            })
+
+    def remove(self):
+        """
+        Deletes the sidecar once the download is complete
+
+        :return:
+        """
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def reset(self):
+        """
+        Forgets everything written, for a download that starts over
+
+        :return:
+        """
+        with self._lock:
+            self.validator = None
+            self.done = []
+            self.save()
+
+    def check_validator(self, validator):
+        """
+        Records the validator of the first response and checks later
+        responses came from the same version of the file
+
+        :param str validator:
+        :return:
+        :raises FileChanged:
+        """
+        if validator is None:
+            return
+
+        with self._lock:
+            if self.validator is None:
+                self.validator = validator
+                self.save()
+            elif self.validator != validator:
+                raise FileChanged('%s changed to %s' % (self.validator, validator))
+
+    def finish(self, start, end):
+        """
+        Records bytes start to end as written
+
+        :param int start:
+        :param int end: excluded
+        :return:
+        """
+        with self._lock:
+            self.done = merge_ranges(self.done + [(start, end)])
+            self.save()
+
+    def received(self):
+        """
+        :rtype int:
+        :return: bytes already written
+        """
+        return sum(end - start for start, end in self.done)
+
+    def remaining(self, part_size=PART_SIZE):
+        """
+        The ranges still to download, split into parts of part_size
+
+        :param int part_size:
+        :rtype list:
+        :return: (start, end) pairs, end excluded
+        """
+        remaining = []
+        offset = 0
+        for start, end in self.done + [(self.size, self.size)]:
+            remaining.extend(split_ranges(offset, start, part_size))
+            offset = max(offset, end)
+
+        return remaining
+
+
+class FileWriter(object):
+    """
+    Writes chunks at given offsets to a path or a writable binary buffer
+
+    Writes are serialized so parts downloaded on several threads can share
+    the destination.
+    """
+    __slots__ = (
+        '_handle',
+        '_owned',
+        '_lock'
+    )
+
+    def __init__(self, dest, resume=False):
+        """
+        :param dest: a path or a writable binary file-like object
+        :param boolean resume: keep what an existing file holds
+        """
+        self._owned = isinstance(dest, str)
+        if self._owned:
+            mode = 'r+b' if resume and os.path.exists(dest) else 'wb'
+            self._handle = open(dest, mode)
+        else:
+            self._handle = dest
+        self._lock = threading.Lock()
+
+    @property
+    def seekable(self):
+        """
+        :rtype boolean:
+        :return:
+        """
+        return getattr(self._handle, 'seekable', lambda: False)()
+
+    def truncate(self, size):
+        """
+        Cuts or extends the destination to size bytes
+
+        :param int size:
+        :return:
+        """
+        with self._lock:
+            self._handle.seek(size)
+            self._handle.truncate(size)
+
+    def write_at(self, offset, data):
+        """
+        :param int offset:
+        :param bytes data:
+        :return:
+        """
+        with self._lock:
+            if self.seekable:
+                self._handle.seek(offset)
+            self._handle.write(data)
+
+    def flush(self):
+        """
+        Hands what was written to the OS, before it is recorded as done
+
+        :return:
+        """
+        with self._lock:
+            getattr(self._handle, 'flush', lambda: None)()
+
+    def close(self):
+        """
+        Closes the destination if it was opened from a path
+
+        :return:
+        """
+        if self._owned:
+            self._handle.close()
+        else:
+            getattr(self._handle, 'flush', lambda: None)()
+
+
+def open_destination(dest, size, version=None, resume=True):
+    """
+    Opens where a download is written and the state of its parts
+
+    A path is written to its .partial file, continuing the parts an earlier
+    download of the same file recorded when resume is set. A stream is
+    written in one pass as it can not be rewound, so it has no state.
+
+    :param dest: a path or a writable binary file-like object
+    :param int size: bytes in the file, None when unknown
+    :param str version: from the entity's file-metadata
+    :param boolean resume: keep parts an earlier download wrote
+    :rtype (FileWriter, DownloadState | None):
+    :return:
+    """
+    if not isinstance(dest, str):
+        writer = FileWriter(dest)
+        if size is None or not writer.seekable:
+            return writer, None
+        return writer, DownloadState(None, size)
+
+    target = partial_path(dest)
+    if size is None:
+        return FileWriter(target), None
+
+    state = None
+    if resume and os.path.exists(target):
+        state = DownloadState.load(target + '.json', size, version)
+    if state is None:
+        state = DownloadState(target + '.json', size, version)
+
+    return FileWriter(target, resume=bool(state.done)), state
+
+
+class Progress(object):
+    """
+    Thread safe count of bytes received, reported to a callback
+    """
+    __slots__ = (
+        'received',
+        'total',
+        '_callback',
+        '_lock'
+    )
+
+    def __init__(self, callback, total, received=0):
+        """
+        :param callable callback: called with bytes received and total, may be None
+        :param int total:
+        :param int received: bytes already there when resuming
+        """
+        self.received = received
+        self.total = total
+        self._callback = callback
+        self._lock = threading.Lock()
+
+    def add(self, count):
+        """
+        :param int count: bytes received, negative when a part restarts
+        :return:
+        """
+        with self._lock:
+            self.received += count
+            received = self.received
+
+        if self._callback is not None:
+            self._callback(received, self.total)
+
@@ -6,6 +6,7 @@ class UserGridException(Exception):
     ERROR_EXPIRED_TOKEN = 'expired_token'
     ERROR_GENERAL = 'usergrid_failure'
     ERROR_LOGIN = 'login_failed'
+    ERROR_CIRCUIT_OPEN = 'circuit_open'
 
     _title = None
 
@@ -0,0 +1,454 @@
+"""
+Exports a collection to gzipped NDJSON files
+
+    usergrid-export --host ug.example.com --org org --app app /cars \\
+        --fields uuid,name,owner.name --output-dir /data/cars --checkpoint cars
+
+Entities are streamed from UG and written as they are decoded, so memory
+use does not grow with the collection.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from usergrid.checkpoint import CheckpointStore, FileCheckpointStore, MemoryCheckpointStore
+from usergrid.usergrid import UserGrid
+
+# parts are closed at the first page boundary after they reach this size
+MAX_PART_BYTES = 256 * 1024 * 1024
+
+# gzip level 1 compresses several times faster than the default of 9 and
+# keeps up with the network
+COMPRESS_LEVEL = 1
+
+# encoded lines are handed to gzip in blocks of about this size
+WRITE_BUFFER_BYTES = 256 * 1024
+
+_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+
+def project(entity, fields):
+    """
+    Keeps only fields of an entity
+
+    Nested keys are given as dotted paths, eg location.city. Missing fields
+    are left out.
+
+    :param dict entity:
+    :param list fields: field paths, the whole entity when empty
+    :rtype dict:
+    :return:
+    """
+    if not fields:
+        return entity
+
+    projected = {}
+    for field in fields:
+        path = field.split('.')
+        value = entity
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+
+    return projected
+
+
+class PartWriter(object):
+    """
+    Writes NDJSON lines to numbered gzip parts
+
+    A part is written under a .partial name and renamed once it is closed,
+    so a complete part is never confused with one cut short.
+    """
+    __slots__ = (
+        'directory',
+        'prefix',
+        'max_bytes',
+        'compresslevel',
+        'part',
+        'parts',
+        'lines',
+        '_raw',
+        '_gzip',
+        '_buffer',
+        '_buffered'
+    )
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, directory, prefix='export', max_bytes=MAX_PART_BYTES,
+                 compresslevel=COMPRESS_LEVEL, part=0):
+        """
+        :param str directory:
+        :param str prefix: start of every part's file name
+        :param int max_bytes: compressed size after which a part is full
+        :param int compresslevel:
+        :param int part: number of the first part
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+        self.part = part
+        self.parts = []
+        self.lines = 0
+        self._raw = None
+        self._gzip = None
+        self._buffer = []
+        self._buffered = 0
+
+    def path(self, part):
+        """
+        :param int part:
+        :rtype str:
+        :return:
+        """
+        return os.path.join(self.directory, '%s-%05d.ndjson.gz' % (self.prefix, part))
+
+    def write(self, entity):
+        """
+        Adds an entity as one line of the current part
+
+        :param dict entity:
+        :return:
+        """
+        line = (_ENCODER.encode(entity) + '\n').encode('utf-8')
+        self._buffer.append(line)
+        self._buffered += len(line)
+        self.lines += 1
+
+        if self._buffered >= WRITE_BUFFER_BYTES:
+            self.flush()
+
+    def flush(self):
+        """
+        Compresses the buffered lines
+
+        :return:
+        """
+        if not self._buffer:
+            return
+
+        if self._gzip is None:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            self._raw = open(self.path(self.part) + '.partial', 'wb')
+            self._gzip = gzip.GzipFile(
+                filename=os.path.basename(self.path(self.part))[:-len('.gz')],
+                mode='wb',
+                compresslevel=self.compresslevel,
+                fileobj=self._raw
+            )
+
+        self._gzip.write(b''.join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+
+    @property
+    def full(self):
+        """
+        Whether the current part has reached max_bytes
+
+        :rtype boolean:
+        :return:
+        """
+        self.flush()
+        return self._raw is not None and self._raw.tell() >= self.max_bytes
+
+    def close_part(self):
+        """
+        Finishes the current part, the next write starts a new one
+
+        :return:
+        """
+        self.flush()
+        if self._gzip is None:
+            return
+
+        self._gzip.close()
+        self._raw.close()
+        self._gzip = self._raw = None
+
+        os.replace(self.path(self.part) + '.partial', self.path(self.part))
+        self.parts.append(self.path(self.part))
+        self.part += 1
+
+    def close(self):
+        """
+        Closes the files of a part that was not finished, which keeps its
+        .partial name
+
+        :return:
+        """
+        if self._gzip is not None:
+            self._gzip.close()
+            self._raw.close()
+            self._gzip = self._raw = None
+
+
+class _PartCheckpoints(CheckpointStore):
+    """
+    Only passes on the checkpoints of pages that end a part
+
+    collect_entities saves a checkpoint after every page. Closing parts at
+    those points and keeping only their checkpoints means a resumed export
+    starts with the first part that was not finished, so no entity is
+    written twice.
+    """
+    __slots__ = (
+        '_store',
+        '_writer'
+    )
+
+    def __init__(self, store, writer):
+        """
+        :param CheckpointStore store:
+        :param PartWriter writer:
+        """
+        self._store = store
+        self._writer = writer
+
+    def get(self, key):
+        return self._store.get(key)
+
+    def set(self, key, checkpoint):
+        if self._writer.full:
+            self._writer.close_part()
+            checkpoint['part'] = self._writer.part
+            self._store.set(key, checkpoint)
+
+    def delete(self, key):
+        self._writer.close_part()
+        self._store.delete(key)
+
+
+class ExportSummary(object):
+    """
+    Outcome of an export
+    """
+    __slots__ = (
+        'entities',
+        'parts',
+        'elapsed'
+    )
+
+    def __init__(self, entities=0, parts=None, elapsed=0.0):
+        """
+        :param int entities: entities written by this run
+        :param list parts: paths of the parts written by this run
+        :param float elapsed: seconds taken
+        """
+        self.entities = entities
+        self.parts = parts if parts is not None else []
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return '<ExportSummary entities=%d parts=%d elapsed=%.3fs>' % (
+            self.entities,
+            len(self.parts),
+            self.elapsed
+        )
+
+
+# pylint: disable=too-many-arguments,too-many-locals
+def export_entities(user_grid, endpoint, directory, ql=None, limit=None,  # pylint: disable=invalid-name
+                    fields=None, prefetch=0, prefix='export', max_bytes=MAX_PART_BYTES,
+                    compresslevel=COMPRESS_LEVEL, checkpoint=None, checkpoint_store=None):
+    """
+    Writes every entity of endpoint to gzipped NDJSON parts in directory
+
+    With a checkpoint, an export that was interrupted continues with the
+    part it was writing.
+
+    :param UserGrid user_grid:
+    :param str endpoint:
+    :param str directory:
+    :param str ql:
+    :param int limit: entities per page
+    :param list fields: field paths to keep, see project
+    :param int prefetch: number of pages to fetch in the background
+    :param str prefix: start of every part's file name
+    :param int max_bytes: size after which a part is closed
+    :param int compresslevel:
+    :param str checkpoint: key to save the export's progress under
+    :param CheckpointStore checkpoint_store: defaults to the client's
+    :rtype ExportSummary:
+    :return:
+    """
+    store = MemoryCheckpointStore()
+    key = checkpoint or 'export'
+    if checkpoint is not None:
+        store = checkpoint_store or user_grid.checkpoint_store
+
+    saved = store.get(key)
+    writer = PartWriter(
+        directory,
+        prefix=prefix,
+        max_bytes=max_bytes,
+        compresslevel=compresslevel,
+        part=saved.get('part', 0) if saved else 0
+    )
+
+    started = time.time()
+    try:
+        for entity in user_grid.collect_entities(
+                endpoint,
+                ql=ql,
+                limit=limit,
+                prefetch=prefetch,
+                stream=True,
+                checkpoint=key,
+                checkpoint_store=_PartCheckpoints(store, writer)
+        ):
+            writer.write(project(entity, fields))
+    finally:
+        # a part cut short is rewritten by the resumed export
+        writer.close()
+
+    return ExportSummary(writer.lines, writer.parts, time.time() - started)
+
+
+class _ExportUserGrid(UserGrid):
+    """
+    A client that logs in again when its token expires, also after a
+    password login
+
+    UserGrid turns autoreconnect off for password logins because it does
+    not keep the password. An export can outlive its token, so the command
+    keeps the user's credentials for the length of the run.
+    """
+    __slots__ = (
+        '_credentials',
+    )
+
+    def __init__(self, **kwargs):
+        """
+        :param dict credentials: username and password to log in again with
+        """
+        self._credentials = kwargs.pop('credentials', None)
+        super(_ExportUserGrid, self).__init__(**kwargs)
+
+    def login(self, **kwargs):
+        if not kwargs and self._credentials:
+            kwargs = dict(self._credentials)
+
+        super(_ExportUserGrid, self).login(**kwargs)
+        self._auto_reconnect = True
+
+
+def field_list(value):
+    """
+    Parses a comma separated --fields value
+
+    :param str value:
+    :rtype list:
+    :return: field paths
+    """
+    return [field.strip() for field in value.split(',') if field.strip()]
+
+
+def parse_args(argv=None):
+    """
+    :param list argv:
+    :rtype argparse.Namespace:
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='Export a UserGrid collection to gzipped NDJSON')
+    parser.add_argument('endpoint', help='collection to export, eg /cars')
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, help='defaults to 443 with --use-ssl, 80 otherwise')
+    parser.add_argument('--use-ssl', action='store_true', help='connect with https')
+    parser.add_argument('--org', required=True)
+    parser.add_argument('--app', required=True)
+    parser.add_argument('--client-id', default=os.environ.get('USERGRID_CLIENT_ID'),
+                        help='defaults to $USERGRID_CLIENT_ID')
+    parser.add_argument('--client-secret', default=os.environ.get('USERGRID_CLIENT_SECRET'),
+                        help='defaults to $USERGRID_CLIENT_SECRET')
+    parser.add_argument('--username', help='log in as this user instead of with client credentials')
+    parser.add_argument('--password', default=os.environ.get('USERGRID_PASSWORD'),
+                        help='password of --username, defaults to $USERGRID_PASSWORD')
+    parser.add_argument('--ql', help='only export entities matching this query')
+    parser.add_argument('--limit', type=int, default=1000, help='entities per page')
+    parser.add_argument('--fields', type=field_list,
+                        help='comma separated fields to keep, dotted for nested keys')
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help='pages fetched in the background')
+    parser.add_argument('--output-dir', default='.', help='directory to write the parts to')
+    parser.add_argument('--prefix', default='export', help='start of the part file names')
+    parser.add_argument('--max-bytes', type=int, default=MAX_PART_BYTES,
+                        help='size after which a new part is started')
+    parser.add_argument('--compress-level', type=int, default=COMPRESS_LEVEL, choices=range(1, 10))
+    parser.add_argument('--checkpoint', help='key to save progress under, rerun with it to resume')
+    parser.add_argument('--checkpoint-dir',
+                        help='directory for checkpoints, defaults to one in the temp directory')
+    options = parser.parse_args(argv)
+    if options.port is None:
+        options.port = 443 if options.use_ssl else 80
+    if options.username and not options.password:
+        parser.error('--username needs --password or $USERGRID_PASSWORD')
+    return options
+
+
+def main(argv=None):
+    """
+    Command line entry point
+
+    :param list argv:
+    :rtype int:
+    :return: exit status
+    """
+    options = parse_args(argv)
+    user_grid = _ExportUserGrid(
+        host=options.host,
+        port=options.port,
+        use_ssl=options.use_ssl,
+        org=options.org,
+        app=options.app,
+        client_id=options.client_id,
+        client_secret=options.client_secret,
+        credentials={'username': options.username, 'password': options.password}
+        if options.username else None,
+        autoreconnect=True,
+        checkpoint_store=FileCheckpointStore(options.checkpoint_dir)
+        if options.checkpoint else None
+    )
+
+    with user_grid:
+        if options.username or (options.client_id and options.client_secret):
+            user_grid.login()
+
+        summary = export_entities(
+            user_grid,
+            options.endpoint,
+            options.output_dir,
+            ql=options.ql,
+            limit=options.limit,
+            fields=options.fields,
+            prefetch=options.prefetch,
+            prefix=options.prefix,
+            max_bytes=options.max_bytes,
+            compresslevel=options.compress_level,
+            checkpoint=options.checkpoint
+        )
+
+    sys.stderr.write('Exported %d entities to %d part(s) in %.1fs (%.0f entities/s)\n' % (
+        summary.entities,
+        len(summary.parts),
+        summary.elapsed,
+        summary.entities / summary.elapsed if summary.elapsed else 0
+    ))
+    return 0
+
+
+__all__ = ['export_entities', 'project', 'PartWriter', 'ExportSummary']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Private JSON files shared by the token and checkpoint stores
+"""
+import json
+import os
+import stat
+import tempfile
+
+# open without following a symlink planted in place of the file
+_NOFOLLOW = getattr(os, 'O_NOFOLLOW', 0)
+
+
+def default_directory(name):
+    """
+    A per user directory in the temp dir, so users of a shared host do not
+    compete for the same path
+
+    :param str name:
+    :rtype str:
+    :return:
+    """
+    if hasattr(os, 'getuid'):
+        name = '%s-%d' % (name, os.getuid())
+
+    return os.path.join(tempfile.gettempdir(), name)
+
+
+def private_directory(directory):
+    """
+    Creates directory readable only by the current user, or checks that an
+    existing one is
+
+    :param str directory:
+    :rtype str:
+    :return: directory
+    :raises PermissionError: when the directory is a symlink, belongs to
+                             another user or can be used by other users
+    """
+    try:
+        os.makedirs(directory, 0o700)
+    except FileExistsError:
+        pass
+
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError('%s is not a directory' % directory)
+
+    if hasattr(os, 'getuid'):
+        if info.st_uid != os.getuid():
+            raise PermissionError('%s belongs to another user' % directory)
+
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            raise PermissionError(
+                '%s can be used by other users, its mode should be 0700' % directory
+            )
+
+    return directory
+
+
+def read_json(path):
+    """
+    Reads a JSON file, None if missing or unreadable
+
+    :param str path:
+    :rtype dict | None:
+    :return:
+    """
+    try:
+        descriptor = os.open(path, os.O_RDONLY | _NOFOLLOW)
+    except OSError:
+        return None
+
+    try:
+        with os.fdopen(descriptor, 'r') as json_file:
+            return json.load(json_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    """
+    Replaces a JSON file atomically
+
+    The data is written to a new temporary file only the owner can read,
+    then renamed over path.
+
+    :param str path:
+    :param dict data:
+    :return:
+    """
+    directory, name = os.path.split(path)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.%s.' % name, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as json_file:
+            json.dump(data, json_file)
+
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def open_lock_file(path):
+    """
+    Opens or creates a lock file only the owner can use
+
+    :param str path:
+    :rtype int:
+    :return: file descriptor
+    """
+    return os.open(path, os.O_RDWR | os.O_CREAT | _NOFOLLOW, 0o600)
+
+
+__all__ = []
@@ -0,0 +1,119 @@
+"""
+Hooks called around each request sent to UG
+"""
+import logging
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+# pylint: disable=too-many-instance-attributes
+class RequestInfo(object):
+    """
+    What is known about one attempt at a request
+
+    status, response_bytes, elapsed and error are filled in once the
+    attempt completes. context is a dict for hooks to keep their own state,
+    such as a span, from before_request to after_response or on_error.
+    """
+    __slots__ = (
+        'method',
+        'url',
+        'template',
+        'ql',
+        'page',
+        'attempt',
+        'started',
+        'elapsed',
+        'status',
+        'request_bytes',
+        'response_bytes',
+        'error',
+        'context'
+    )
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, method, url, template, ql=None, page=None, attempt=1,
+                 started=None, request_bytes=0):
+        """
+        :param str method:
+        :param str url: full url without the query string
+        :param str template: path template, eg users/{id}
+        :param str ql: query sent with the request
+        :param int page: page number within a collect_entities scan, from 1
+        :param int attempt: attempt number, from 1
+        :param float started: time the attempt was sent at
+        :param int request_bytes: size of the request body
+        """
+        self.method = method
+        self.url = url
+        self.template = template
+        self.ql = ql  # pylint: disable=invalid-name
+        self.page = page
+        self.attempt = attempt
+        self.started = started
+        self.elapsed = None
+        self.status = None
+        self.request_bytes = request_bytes
+        self.response_bytes = None
+        self.error = None
+        self.context = {}
+
+    def __repr__(self):
+        return '<RequestInfo %s %s status=%s attempt=%d>' % (
+            self.method,
+            self.template,
+            self.status,
+            self.attempt
+        )
+
+
+class RequestHooks(object):
+    """
+    Base class for request hooks, every method does nothing by default
+
+    Exceptions raised by hooks are logged and do not affect the request.
+    """
+    __slots__ = ()
+
+    def before_request(self, info):
+        """
+        Called before each attempt is sent
+
+        :param RequestInfo info:
+        :return:
+        """
+
+    def after_response(self, info, response):
+        """
+        Called when an attempt received a response, whatever its status
+
+        :param RequestInfo info:
+        :param requests.Response response:
+        :return:
+        """
+
+    def on_error(self, info, exception):
+        """
+        Called when an attempt failed without a response
+
+        :param RequestInfo info:
+        :param Exception exception:
+        :return:
+        """
+
+
+def call_hook(hook, *args):
+    """
+    Calls a hook method, logging instead of raising its exceptions
+
+    :param callable hook:
+    :param args:
+    :return:
+    """
+    try:
+        hook(*args)
+    except Exception as hook_exception:  # pylint: disable=broad-except
+        logger.exception(hook_exception)
+
+
+__all__ = ['RequestInfo', 'RequestHooks']
@@ -0,0 +1,287 @@
+"""
+Request metrics for UG calls
+"""
+import bisect
+import threading
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """
+    Counts observations into cumulative buckets, like a Prometheus histogram
+    """
+    __slots__ = (
+        'buckets',
+        'counts',
+        'count',
+        'sum'
+    )
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """
+        :param tuple buckets: sorted upper bounds, an infinite bucket is implied
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+        Adds an observation
+
+        :param float value:
+        :return:
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, quantile):
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in
+
+        :param float quantile: between 0 and 1
+        :rtype float | None:
+        :return: None without observations, inf past the last bucket
+        """
+        if not self.count:
+            return None
+
+        rank = quantile * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+
+        return float('inf')
+
+    def snapshot(self):
+        """
+        :rtype dict:
+        :return: count, sum, p50, p95, p99 and cumulative counts per bucket
+        """
+        cumulative = []
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            cumulative.append((bound, seen))
+
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': cumulative
+        }
+
+
+class _EndpointMetrics(object):
+    """
+    Counters for one method and path template
+    """
+    __slots__ = (
+        'requests',
+        'errors',
+        'retries',
+        'request_bytes',
+        'response_bytes',
+        'latency'
+    )
+
+    def __init__(self, buckets):
+        self.requests = 0
+        self.errors = {}
+        self.retries = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency = Histogram(buckets)
+
+
+class RequestMetrics(object):
+    """
+    Counts requests, errors, retries and bytes and records latencies per
+    method and path template
+
+    Path templates keep collection and connection names and replace entity
+    ids, so users/{id}/likes groups every user's likes. A single instance
+    may be shared between clients.
+    """
+    __slots__ = (
+        '_buckets',
+        '_endpoints',
+        '_lock'
+    )
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """
+        :param tuple buckets: latency bucket upper bounds in seconds
+        """
+        self._buckets = tuple(buckets)
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, method, template):
+        """
+        Counters for a method and template, must be called with the lock held
+
+        :param str method:
+        :param str template:
+        :rtype _EndpointMetrics:
+        :return:
+        """
+        key = (method, template)
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            endpoint = self._endpoints[key] = _EndpointMetrics(self._buckets)
+
+        return endpoint
+
+    # pylint: disable=too-many-arguments
+    def record(self, method, template, elapsed, status=None, error=None,
+               request_bytes=0, response_bytes=0):
+        """
+        Records one attempt
+
+        :param str method:
+        :param str template: path template, see paths.path_template
+        :param float elapsed: seconds until the response arrived
+        :param int status: response status, None when no response arrived
+        :param str error: exception name when no response arrived
+        :param int request_bytes: size of the request body
+        :param int response_bytes: size of the response body
+        :return:
+        """
+        with self._lock:
+            endpoint = self._endpoint(method, template)
+            endpoint.requests += 1
+            endpoint.request_bytes += request_bytes
+            endpoint.response_bytes += response_bytes
+            endpoint.latency.observe(elapsed)
+
+            if error is not None or (status is not None and status >= 400):
+                error_key = error if error is not None else str(status)
+                endpoint.errors[error_key] = endpoint.errors.get(error_key, 0) + 1
+
+    def record_retry(self, method, template):
+        """
+        Records that an attempt is going to be retried
+
+        :param str method:
+        :param str template:
+        :return:
+        """
+        with self._lock:
+            self._endpoint(method, template).retries += 1
+
+    def reset(self):
+        """
+        Drops every counter
+
+        :return:
+        """
+        with self._lock:
+            self._endpoints.clear()
+
+    def stats(self):
+        """
+        Snapshot of every endpoint, the ones taking the most total time first
+
+        :rtype list:
+        :return: one dict per method and template
+        """
+        with self._lock:
+            snapshot = [
+                {
+                    'method': method,
+                    'template': template,
+                    'requests': endpoint.requests,
+                    'errors': dict(endpoint.errors),
+                    'retries': endpoint.retries,
+                    'request_bytes': endpoint.request_bytes,
+                    'response_bytes': endpoint.response_bytes,
+                    'latency': endpoint.latency.snapshot()
+                }
+                for (method, template), endpoint in self._endpoints.items()
+            ]
+
+        return sorted(snapshot, key=lambda stat: stat['latency']['sum'], reverse=True)
+
+
+def _labels(**labels):
+    return ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in sorted(labels.items())
+    )
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(stats, prefix='usergrid'):
+    """
+    Renders a stats() snapshot in the Prometheus text exposition format
+
+    :param list stats: from RequestMetrics.stats or UserGrid.stats
+    :param str prefix: metric name prefix
+    :rtype str:
+    :return:
+    """
+    counters = (
+        ('requests_total', 'requests', 'Requests sent, including retries'),
+        ('retries_total', 'retries', 'Requests retried'),
+        ('request_bytes_total', 'request_bytes', 'Request body bytes sent'),
+        ('response_bytes_total', 'response_bytes', 'Response body bytes received'),
+    )
+    lines = []
+
+    for name, field, description in counters:
+        lines.append('# HELP %s_%s %s' % (prefix, name, description))
+        lines.append('# TYPE %s_%s counter' % (prefix, name))
+        for stat in stats:
+            lines.append('%s_%s{%s} %d' % (
+                prefix, name,
+                _labels(method=stat['method'], template=stat['template']),
+                stat[field]
+            ))
+
+    lines.append('# HELP %s_errors_total Failed requests by status or exception' % prefix)
+    lines.append('# TYPE %s_errors_total counter' % prefix)
+    for stat in stats:
+        for status, count in sorted(stat['errors'].items()):
+            lines.append('%s_errors_total{%s} %d' % (
+                prefix,
+                _labels(method=stat['method'], template=stat['template'], status=status),
+                count
+            ))
+
+    lines.append('# HELP %s_request_duration_seconds Request latency' % prefix)
+    lines.append('# TYPE %s_request_duration_seconds histogram' % prefix)
+    for stat in stats:
+        latency = stat['latency']
+        for bound, count in latency['buckets']:
+            lines.append('%s_request_duration_seconds_bucket{%s} %d' % (
+                prefix,
+                _labels(method=stat['method'], template=stat['template'], le=_number(bound)),
+                count
+            ))
+
+        labels = _labels(method=stat['method'], template=stat['template'])
+        lines.append('%s_request_duration_seconds_sum{%s} %s' % (
+            prefix, labels, _number(latency['sum'])
+        ))
+        lines.append('%s_request_duration_seconds_count{%s} %d' % (
+            prefix, labels, latency['count']
+        ))
+
+    return '\n'.join(lines) + '\n'
+
+
+__all__ = ['Histogram', 'RequestMetrics', 'render_prometheus']
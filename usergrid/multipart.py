@@ -0,0 +1,257 @@
+"""
+Streaming multipart/form-data bodies for file uploads
+"""
+import hashlib
+import io
+import mimetypes
+import os
+import uuid
+
+CHUNK_SIZE = 64 * 1024
+
+# seconds allowed for an upload whose size is unknown
+UPLOAD_TIMEOUT = 300
+
+# slowest link an upload is expected to work on, in bytes per second
+UPLOAD_MIN_THROUGHPUT = 64 * 1024
+
+# file-metadata keys UG may keep the MD5 of an uploaded file under
+CHECKSUM_KEYS = ('checksum', 'etag')
+
+
+def _quote(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def source_size(source):
+    """
+    Bytes left to read from an upload source, None when unknown
+
+    :param source: bytes, a file-like object or an iterator of bytes
+    :rtype int | None:
+    :return:
+    """
+    if isinstance(source, bytes):
+        return len(source)
+
+    if hasattr(source, 'fileno'):
+        try:
+            size = os.fstat(source.fileno()).st_size
+            return max(0, size - source.tell())
+        except (io.UnsupportedOperation, OSError, AttributeError):
+            pass
+
+    if hasattr(source, 'seek') and hasattr(source, 'tell'):
+        try:
+            position = source.tell()
+            size = source.seek(0, os.SEEK_END)
+            source.seek(position)
+            return size - position
+        except (io.UnsupportedOperation, OSError):
+            pass
+
+    return None
+
+
+def upload_timeout(size, min_throughput=UPLOAD_MIN_THROUGHPUT, minimum=60):
+    """
+    Seconds to wait on an upload, long enough for size bytes on a slow link
+
+    :param int size: bytes to upload, None when unknown
+    :param float min_throughput: bytes per second the link is expected to manage
+    :param float minimum: shortest timeout
+    :rtype float:
+    :return:
+    """
+    if size is None:
+        return UPLOAD_TIMEOUT
+
+    return max(minimum, size / float(min_throughput))
+
+
+def file_md5(path, chunk_size=CHUNK_SIZE):
+    """
+    Hex MD5 of a file, read in chunks
+
+    :param str path:
+    :param int chunk_size:
+    :rtype str:
+    :return:
+    """
+    digest = hashlib.md5()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def matches_checksum(file_metadata, md5):
+    """
+    Whether an entity's file-metadata records a file with this MD5
+
+    :param dict file_metadata:
+    :param str md5: hex digest
+    :rtype boolean:
+    :return:
+    """
+    for key in CHECKSUM_KEYS:
+        value = (file_metadata or {}).get(key)
+        if isinstance(value, str) and value.strip('"').lower() == md5:
+            return True
+
+    return False
+
+
+class UploadSummary(object):
+    """
+    Outcome of uploading many files
+    """
+    __slots__ = (
+        'uploaded',
+        'skipped',
+        'failed',
+        'bytes',
+        'elapsed'
+    )
+
+    def __init__(self):
+        # (endpoint, path) for each file sent
+        self.uploaded = []
+        # (endpoint, path) for each file already attached
+        self.skipped = []
+        # (endpoint, path, exception) for each failed file
+        self.failed = []
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """
+        Bytes uploaded per second
+
+        :rtype float:
+        :return:
+        """
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return '<UploadSummary uploaded=%d skipped=%d failed=%d %.0f B/s>' % (
+            len(self.uploaded),
+            len(self.skipped),
+            len(self.failed),
+            self.throughput
+        )
+
+
+class MultipartBody(object):
+    """
+    A multipart/form-data body produced chunk by chunk
+
+    Iterating reads the file part as it is sent, so only one chunk is in
+    memory. requests sends a Content-Length when len is known and chunked
+    transfer encoding otherwise. A body can only be sent once.
+    """
+    __slots__ = (
+        'boundary',
+        'len',
+        '_parts',
+        '_chunk_size',
+        '_progress',
+        'sent'
+    )
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, fields, name, filename, source, content_type=None, size=None,
+                 chunk_size=CHUNK_SIZE, progress=None):
+        """
+        :param list fields: (name, value) text fields sent before the file
+        :param str name: form field name of the file
+        :param str filename: file name sent with the file
+        :param source: bytes, a file-like object or an iterator of bytes
+        :param str content_type: guessed from filename when not set
+        :param int size: bytes in source, found from source when not set
+        :param int chunk_size: bytes read from source at a time
+        :param callable progress: called with bytes sent and total bytes,
+                                  total is None when the size is unknown
+        """
+        self.boundary = uuid.uuid4().hex
+        content_type = (
+            content_type or
+            mimetypes.guess_type(filename)[0] or
+            'application/octet-stream'
+        )
+
+        head = b''.join(
+            self._part_header(field_name, None, None) + str(value).encode('utf-8') + b'\r\n'
+            for field_name, value in fields
+        ) + self._part_header(name, filename, content_type)
+        tail = ('\r\n--%s--\r\n' % self.boundary).encode('utf-8')
+
+        if size is None:
+            size = source_size(source)
+
+        self._parts = (head, source, tail)
+        self._chunk_size = chunk_size
+        self._progress = progress
+        self.len = len(head) + size + len(tail) if size is not None else None
+        self.sent = 0
+
+    @property
+    def content_type(self):
+        """
+        The Content-Type header for the body
+
+        :rtype str:
+        :return:
+        """
+        return 'multipart/form-data; boundary=%s' % self.boundary
+
+    def _part_header(self, name, filename, content_type):
+        disposition = 'form-data; name="%s"' % _quote(name)
+        if filename is not None:
+            disposition += '; filename="%s"' % _quote(filename)
+
+        header = '--%s\r\nContent-Disposition: %s\r\n' % (self.boundary, disposition)
+        if content_type is not None:
+            header += 'Content-Type: %s\r\n' % content_type
+
+        return (header + '\r\n').encode('utf-8')
+
+    def _source_chunks(self, source):
+        if isinstance(source, bytes):
+            for start in range(0, len(source), self._chunk_size):
+                yield source[start:start + self._chunk_size]
+            return
+
+        if hasattr(source, 'read'):
+            while True:
+                chunk = source.read(self._chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+        for chunk in source:
+            yield chunk
+
+    def _chunks(self):
+        head, source, tail = self._parts
+        yield head
+        for chunk in self._source_chunks(source):
+            yield chunk
+        yield tail
+
+    def __iter__(self):
+        for chunk in self._chunks():
+            if not chunk:
+                continue
+
+            self.sent += len(chunk)
+            yield chunk
+
+            # resumed once the chunk has been written to the socket
+            if self._progress is not None:
+                self._progress(self.sent, self.len)
+
+
+__all__ = ['MultipartBody', 'UploadSummary', 'upload_timeout', 'source_size', 'file_md5']
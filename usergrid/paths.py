@@ -0,0 +1,65 @@
+"""
+Helpers for UG endpoint paths
+"""
+
+
+def normalize_path(path):
+    """
+    Normalizes an endpoint so that equivalent paths compare equal
+
+    Leading, trailing and repeated slashes are dropped so that
+    '/users/foo/', 'users//foo' and 'users/foo' all become 'users/foo'
+
+    :param str path:
+    :rtype str:
+    :return:
+    """
+    return '/'.join(segment for segment in path.split('/') if segment)
+
+
+def paths_overlap(path, other):
+    """
+    Checks if a change to one path can affect what is read from the other
+
+    Paths overlap when they are equal or one is nested under the other
+
+    :param str path: normalized path
+    :param str other: normalized path
+    :rtype boolean:
+    :return:
+    """
+    if path == other:
+        return True
+
+    return other.startswith(path + '/') or path.startswith(other + '/')
+
+
+def collection_of(path):
+    """
+    The collection a normalized path belongs to, its first segment
+
+    :param str path: normalized path
+    :rtype str:
+    :return:
+    """
+    return path.split('/', 1)[0]
+
+
+def path_template(path):
+    """
+    Replaces the entity ids in a normalized path with {id}
+
+    UG paths alternate collection or connection names and entity ids, so
+    'users/foo/likes/bar' becomes 'users/{id}/likes/{id}'
+
+    :param str path: normalized path
+    :rtype str:
+    :return:
+    """
+    return '/'.join(
+        '{id}' if index % 2 else segment
+        for index, segment in enumerate(path.split('/'))
+    )
+
+
+__all__ = ['normalize_path', 'paths_overlap', 'collection_of', 'path_template']
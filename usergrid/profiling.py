@@ -0,0 +1,187 @@
+"""
+Time attribution for collection scans
+"""
+import threading
+import time
+
+PHASES = ('network', 'decode', 'callback', 'token_refresh', 'retry_sleep')
+
+
+class PageProfile(object):
+    """
+    Seconds spent in each phase while one page of a scan was read and consumed
+
+    network: waiting for UG, including reading the body
+    decode: turning the body into entities
+    callback: the consumer's time between entities, the callback in
+              process_entities
+    token_refresh: logging in again before the page request
+    retry_sleep: backing off between attempts
+    """
+    __slots__ = ('number', 'entities') + PHASES
+
+    def __init__(self, number):
+        """
+        :param int number: page number in the scan, from 1
+        """
+        self.number = number
+        self.entities = 0
+        self.network = 0.0
+        self.decode = 0.0
+        self.callback = 0.0
+        self.token_refresh = 0.0
+        self.retry_sleep = 0.0
+
+    def phases(self):
+        """
+        :rtype dict:
+        :return: seconds per phase
+        """
+        return dict((phase, getattr(self, phase)) for phase in PHASES)
+
+    def __repr__(self):
+        return '<PageProfile %d entities=%d %s>' % (
+            self.number,
+            self.entities,
+            ' '.join('%s=%.3fs' % item for item in sorted(self.phases().items()))
+        )
+
+
+class ScanProfile(object):
+    """
+    Per page and aggregate time breakdown of a collect_entities or
+    process_entities scan
+
+    Pass an instance as profile to fill it in. With prefetch, network and
+    decode overlap with the callback so the phases add up to more than
+    elapsed.
+    """
+    __slots__ = (
+        'pages',
+        'elapsed',
+        '_lock'
+    )
+
+    def __init__(self):
+        self.pages = []
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def new_page(self):
+        """
+        Starts the profile of the next page
+
+        :rtype PageProfile:
+        :return:
+        """
+        with self._lock:
+            page = PageProfile(len(self.pages) + 1)
+            self.pages.append(page)
+
+        return page
+
+    @property
+    def entities(self):
+        """
+        Number of entities consumed
+
+        :rtype int:
+        :return:
+        """
+        return sum(page.entities for page in self.pages)
+
+    def totals(self):
+        """
+        Seconds per phase over every page
+
+        :rtype dict:
+        :return:
+        """
+        return dict(
+            (phase, sum(getattr(page, phase) for page in self.pages))
+            for phase in PHASES
+        )
+
+    def report(self):
+        """
+        A table of the time spent in each phase per page and in total
+
+        :rtype str:
+        :return:
+        """
+        header = ('page', 'entities') + PHASES
+        rows = [
+            [str(page.number), str(page.entities)] +
+            ['%.3f' % getattr(page, phase) for phase in PHASES]
+            for page in self.pages
+        ]
+        totals = self.totals()
+        rows.append(
+            ['total', str(self.entities)] + ['%.3f' % totals[phase] for phase in PHASES]
+        )
+
+        widths = [
+            max(len(row[column]) for row in rows + [list(header)])
+            for column in range(len(header))
+        ]
+        lines = [
+            '  '.join(cell.rjust(width) for cell, width in zip(row, widths))
+            for row in [list(header)] + rows
+        ]
+        lines.append('elapsed %.3fs' % self.elapsed)
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return '<ScanProfile pages=%d entities=%d elapsed=%.3fs %s>' % (
+            len(self.pages),
+            self.entities,
+            self.elapsed,
+            ' '.join('%s=%.3fs' % item for item in sorted(self.totals().items()))
+        )
+
+
+def timed_decode(entities, page):
+    """
+    Adds the time spent decoding entities to page, minus the network time
+    recorded meanwhile by the chunk iterator wrapped with timed_network
+
+    :param entities: iterator of entities
+    :param PageProfile page:
+    :return:
+    """
+    entities = iter(entities)
+    while True:
+        started = time.time()
+        network = page.network
+        try:
+            entity = next(entities)
+        except StopIteration:
+            page.decode += time.time() - started - (page.network - network)
+            return
+
+        page.decode += time.time() - started - (page.network - network)
+        yield entity
+
+
+def timed_network(chunks, page):
+    """
+    Adds the time spent reading body chunks to page
+
+    :param chunks: iterator of bytes
+    :param PageProfile page:
+    :return:
+    """
+    chunks = iter(chunks)
+    while True:
+        started = time.time()
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            page.network += time.time() - started
+            return
+
+        page.network += time.time() - started
+        yield chunk
+
+
+__all__ = ['ScanProfile', 'PageProfile']
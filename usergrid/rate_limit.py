@@ -0,0 +1,238 @@
+"""
+Client side rate limiting for UG requests
+"""
+import contextlib
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    Lets rate requests through per second on average, with bursts of up to
+    burst requests after a quiet period
+    """
+    __slots__ = (
+        'rate',
+        'burst',
+        '_tokens',
+        '_updated',
+        '_lock'
+    )
+
+    def __init__(self, rate, burst=None):
+        """
+        :param float rate: tokens added per second
+        :param float burst: most tokens held, defaults to one second worth
+        """
+        assert rate > 0
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """
+        Takes a token, going into debt when none is left
+
+        :rtype float:
+        :return: seconds to wait before the token may be used
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+
+            if self._tokens >= 0:
+                return 0.0
+
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """
+        Blocks until a token is available
+
+        :rtype float:
+        :return: seconds waited
+        """
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+        return delay
+
+
+class RateLimit(object):
+    """
+    A requests per second target and a cap on requests in flight, either
+    may be None
+    """
+    __slots__ = (
+        'method',
+        'collection',
+        'bucket',
+        'in_flight'
+    )
+
+    def __init__(self, method=None, collection=None, rate=None, burst=None, max_in_flight=None):
+        """
+        :param str method: only limit this HTTP method, any when None
+        :param str collection: only limit this collection, any when None
+        :param float rate: requests per second
+        :param float burst: requests allowed at once after a quiet period
+        :param int max_in_flight: requests sent but not yet answered
+        """
+        self.method = method.upper() if method else None
+        self.collection = collection.strip('/') if collection else None
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+    def matches(self, method, collection):
+        """
+        Checks if the limit applies to a request
+
+        :param str method:
+        :param str collection:
+        :rtype boolean:
+        :return:
+        """
+        return ((self.method is None or self.method == method) and
+                (self.collection is None or self.collection == collection))
+
+
+class InFlight(object):
+    """
+    The in flight slots taken for one request
+
+    Released once, however many times release is called, so a streamed
+    response can give its slots back when it is closed.
+    """
+    __slots__ = (
+        '_semaphores',
+        '_lock'
+    )
+
+    def __init__(self, semaphores):
+        """
+        :param list semaphores: held, in the order they were taken
+        """
+        self._semaphores = semaphores
+        self._lock = threading.Lock()
+
+    def release(self):
+        """
+        Gives the slots back
+
+        :return:
+        """
+        with self._lock:
+            semaphores, self._semaphores = self._semaphores, []
+
+        for semaphore in reversed(semaphores):
+            semaphore.release()
+
+
+class RateLimiter(object):
+    """
+    Throttles requests to a global limit and to limits per method and
+    collection
+
+    Every matching limit is applied, so a POST to users waits for the global
+    limit, a POST limit and a users limit if all are set. A request holds
+    its in flight slots until its response is read; UserGrid keeps the
+    slots of a streamed response until the response is closed, so the body
+    transfer counts against max_in_flight too.
+    """
+    __slots__ = (
+        '_limits',
+        '_lock',
+        'waited'
+    )
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None):
+        """
+        :param float rate: requests per second across all requests
+        :param float burst: requests allowed at once after a quiet period
+        :param int max_in_flight: requests sent but not yet answered
+        """
+        self._limits = []
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+        if rate or max_in_flight:
+            self.limit(rate=rate, burst=burst, max_in_flight=max_in_flight)
+
+    def limit(self, method=None, collection=None, rate=None, burst=None, max_in_flight=None):
+        """
+        Adds a limit for requests with a method, to a collection or both
+
+        :param str method: eg POST
+        :param str collection: eg users
+        :param float rate: requests per second
+        :param float burst: requests allowed at once after a quiet period
+        :param int max_in_flight: requests sent but not yet answered
+        :rtype RateLimiter:
+        :return: self so calls can be chained
+        """
+        self._limits.append(RateLimit(
+            method=method,
+            collection=collection,
+            rate=rate,
+            burst=burst,
+            max_in_flight=max_in_flight
+        ))
+        return self
+
+    def hold(self, method, collection):
+        """
+        Waits for a token from each matching rate, then takes an in flight
+        slot from each matching cap
+
+        Slots are always taken in the order the limits were added so
+        concurrent requests cannot deadlock. The caller releases them.
+
+        :param str method:
+        :param str collection:
+        :rtype InFlight:
+        :return:
+        """
+        method = method.upper()
+        limits = [limit for limit in self._limits if limit.matches(method, collection)]
+        started = time.time()
+
+        for limit in limits:
+            if limit.bucket is not None:
+                limit.bucket.acquire()
+
+        held = []
+        try:
+            for limit in limits:
+                if limit.in_flight is not None:
+                    limit.in_flight.acquire()
+                    held.append(limit.in_flight)
+        except BaseException:
+            InFlight(held).release()
+            raise
+
+        with self._lock:
+            self.waited += time.time() - started
+        return InFlight(held)
+
+    @contextlib.contextmanager
+    def acquire(self, method, collection):
+        """
+        Context manager held around sending a request, see hold
+
+        :param str method:
+        :param str collection:
+        :return:
+        """
+        held = self.hold(method, collection)
+        try:
+            yield
+        finally:
+            held.release()
+
+
+__all__ = ['TokenBucket', 'RateLimiter']
@@ -0,0 +1,178 @@
+"""
+Retry policy for UG requests
+"""
+import collections
+import random
+import threading
+import time
+import requests
+
+
+class RetryBudget(object):
+    """
+    Caps retries to a share of the requests made in a sliding window
+
+    When the backend is down every request fails, so without a budget each
+    caller retries max_attempts times and multiplies the load on it.
+    """
+    __slots__ = (
+        '_ratio',
+        '_min_retries',
+        '_window',
+        '_requests',
+        '_retries',
+        '_lock'
+    )
+
+    def __init__(self, ratio=0.2, min_retries=10, window=10.0):
+        """
+        :param float ratio: retries allowed per request in the window
+        :param int min_retries: retries always allowed in the window
+        :param float window: seconds of history to keep
+        """
+        self._ratio = ratio
+        self._min_retries = min_retries
+        self._window = window
+        self._requests = collections.deque()
+        self._retries = collections.deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        for history in (self._requests, self._retries):
+            while history and history[0] < now - self._window:
+                history.popleft()
+
+    def record_request(self):
+        """
+        Counts a first attempt
+
+        :return:
+        """
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            self._requests.append(now)
+
+    def withdraw(self):
+        """
+        Takes a retry from the budget
+
+        :rtype boolean:
+        :return: False when the budget is spent
+        """
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            allowed = self._min_retries + self._ratio * len(self._requests)
+            if len(self._retries) >= allowed:
+                return False
+
+            self._retries.append(now)
+            return True
+
+
+class RetryPolicy(object):
+    """
+    Decides which failed requests are retried and how long to wait
+
+    Only idempotent methods are retried. Waits grow exponentially from
+    backoff_factor up to max_backoff, with full jitter so that clients
+    failing together do not retry together.
+    """
+    __slots__ = (
+        'max_attempts',
+        'backoff_factor',
+        'max_backoff',
+        'jitter',
+        'retry_statuses',
+        'retry_exceptions',
+        'idempotent_methods',
+        'budget',
+        'retries',
+        'exhausted',
+        '_lock'
+    )
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, max_attempts=3, backoff_factor=0.5, max_backoff=30.0, jitter=True,
+                 retry_statuses=(500, 502, 503, 504),
+                 retry_exceptions=(requests.ConnectionError, requests.Timeout),
+                 idempotent_methods=('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'),
+                 budget=None):
+        """
+        :param int max_attempts: attempts including the first one
+        :param float backoff_factor: seconds to wait before the first retry
+        :param float max_backoff: longest wait between attempts
+        :param boolean jitter: wait a random time up to the backoff
+        :param tuple retry_statuses: response status codes to retry
+        :param tuple retry_exceptions: exceptions to retry
+        :param tuple idempotent_methods: methods safe to send twice
+        :param RetryBudget budget: shared cap on retries, defaults to a new one
+        """
+        assert max_attempts >= 1
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.idempotent_methods = frozenset(method.upper() for method in idempotent_methods)
+        self.budget = budget if budget is not None else RetryBudget()
+        self.retries = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt):
+        """
+        Seconds to wait after a failed attempt
+
+        :param int attempt: the attempt that failed, starting at 1
+        :rtype float:
+        :return:
+        """
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1)))
+        if self.jitter:
+            return random.uniform(0, delay)
+
+        return delay
+
+    def retry_delay(self, method, attempt, response=None, exception=None):
+        """
+        Checks if a failed attempt should be retried
+
+        :param str method:
+        :param int attempt: the attempt that failed, starting at 1
+        :param requests.Response response: the response, if one was received
+        :param Exception exception: the exception, if one was raised
+        :rtype float | None:
+        :return: seconds to wait before retrying, None to give up
+        """
+        if method.upper() not in self.idempotent_methods:
+            return None
+
+        if exception is not None:
+            if not isinstance(exception, self.retry_exceptions):
+                return None
+        elif response is None or response.status_code not in self.retry_statuses:
+            return None
+
+        if attempt >= self.max_attempts:
+            return None
+
+        if not self.budget.withdraw():
+            with self._lock:
+                self.exhausted += 1
+            return None
+
+        with self._lock:
+            self.retries += 1
+        delay = self.backoff(attempt)
+
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = min(self.max_backoff, max(delay, float(retry_after)))
+
+        return delay
+
+
+__all__ = ['RetryPolicy', 'RetryBudget']
@@ -0,0 +1,157 @@
+"""
+Incremental parsing of UG collection responses
+"""
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader(object):
+    """
+    Text buffer over a stream of byte chunks
+    """
+    __slots__ = (
+        '_chunks',
+        '_decoder',
+        '_json',
+        'buffer',
+        'pos',
+        'eof'
+    )
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Appends the next chunk to the buffer
+
+        :rtype boolean:
+        :return: False once the stream is exhausted
+        """
+        if self.eof:
+            return False
+
+        # drop what has been parsed so the buffer stays around one entity
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+
+        for chunk in self._chunks:
+            if chunk:
+                self.buffer += self._decoder.decode(chunk)
+                return True
+
+        self.buffer += self._decoder.decode(b'', final=True)
+        self.eof = True
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character, None at the end
+
+        :rtype str:
+        :return:
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+
+            if not self.fill():
+                return None
+
+    def expect(self, characters):
+        """
+        Consumes the next character, which must be one of characters
+
+        :param str characters:
+        :rtype str:
+        :return:
+        """
+        character = self.peek()
+        if character is None or character not in characters:
+            raise ValueError(
+                'Expected one of %r at %d, found %r' % (characters, self.pos, character)
+            )
+
+        self.pos += 1
+        return character
+
+    def value(self):
+        """
+        Decodes the next complete JSON value
+
+        :return:
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buffer, self.pos)
+                # a number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+
+            self.fill()
+
+
+def iter_entities(chunks, drop_keys=None, fields=None):
+    """
+    Yields each entity of a UG response body as soon as it is decoded
+
+    Only the entity being decoded is held in memory rather than the whole
+    body. Every other top level key of the response, such as cursor or
+    error, is stored in fields.
+
+    :param chunks: iterable of bytes making up the response body
+    :param iterable drop_keys: top level entity keys to discard, eg metadata
+    :param dict fields: receives the top level keys other than entities
+    :rtype dict:
+    :return:
+    """
+    drop_keys = tuple(drop_keys or ())
+    fields = fields if fields is not None else {}
+    reader = _Reader(chunks)
+
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        key = reader.value()
+        reader.expect(':')
+
+        if key == 'entities' and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.expect(']')
+            else:
+                while True:
+                    entity = reader.value()
+                    for drop_key in drop_keys:
+                        entity.pop(drop_key, None)
+
+                    yield entity
+
+                    if reader.expect(',]') == ']':
+                        break
+        else:
+            fields[key] = reader.value()
+
+        if reader.expect(',}') == '}':
+            return
+
+
+__all__ = ['iter_entities']
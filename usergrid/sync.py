@@ -0,0 +1,91 @@
+"""
+Incremental sync of a collection by modified timestamp
+"""
+
+
+class EntitySync(object):
+    """
+    Iterates over the entities modified since a watermark
+
+    Entities are read oldest first with a single cursor, so ties inside the
+    scan are paged by UG. Entities that share the starting watermark and were
+    already seen by the previous sync are passed in as since_uuids and
+    skipped. After iterating, watermark and watermark_uuids hold the values to
+    pass to the next sync.
+    """
+    __slots__ = (
+        '_user_grid',
+        '_endpoint',
+        '_where',
+        '_limit',
+        '_since',
+        '_since_uuids',
+        'watermark',
+        'watermark_uuids',
+        'count'
+    )
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, user_grid, endpoint, since=None, since_uuids=None,
+                 where=None, limit=None):
+        """
+        :param UserGrid user_grid:
+        :param str endpoint: collection to sync
+        :param int since: modified timestamp in milliseconds from the last sync
+        :param iterable since_uuids: uuids modified at since that were synced
+        :param str where: extra ql condition
+        :param int limit: page size
+        """
+        self._user_grid = user_grid
+        self._endpoint = endpoint
+        self._where = where
+        self._limit = limit
+        self._since = since
+        self._since_uuids = frozenset(since_uuids or ())
+        self.watermark = since
+        self.watermark_uuids = set(self._since_uuids)
+        self.count = 0
+
+    @property
+    def ql(self):  # pylint: disable=invalid-name
+        """
+        The query used to find changed entities
+
+        :rtype str:
+        :return:
+        """
+        conditions = []
+        if self._since is not None:
+            conditions.append('modified >= %d' % int(self._since))
+
+        if self._where:
+            conditions.append('(%s)' % self._where)
+
+        ql = 'select *'
+        if conditions:
+            ql += ' where ' + ' and '.join(conditions)
+
+        return ql + ' order by modified asc'
+
+    def __iter__(self):
+        for entity in self._user_grid.collect_entities(
+                self._endpoint,
+                ql=self.ql,
+                limit=self._limit
+        ):
+            modified = entity.get('modified')
+            if modified == self._since and entity.get('uuid') in self._since_uuids:
+                continue
+
+            if self.watermark is None or modified > self.watermark:
+                self.watermark = modified
+                self.watermark_uuids = set()
+
+            if modified == self.watermark:
+                self.watermark_uuids.add(entity.get('uuid'))
+
+            self.count += 1
+            yield entity
+
+
+__all__ = ['EntitySync']
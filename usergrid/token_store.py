@@ -0,0 +1,142 @@
+"""
+Token stores for sharing UG access tokens between processes
+"""
+import contextlib
+import hashlib
+import logging
+import os
+from usergrid import file_store
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # pylint: disable=invalid-name
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class TokenStore(object):
+    """
+    Interface for token stores
+
+    Tokens are dicts with access_token, expires (a unix timestamp) and user
+    for password grants. lock must keep other processes from refreshing the
+    same key until it exits.
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def make_key(endpoint, identity, secret=None):
+        """
+        Builds a store key from the token endpoint, the client id or user
+        name and its secret or password
+
+        The secret is part of the key so a login with the wrong credentials
+        never picks up a token saved by a login with the right ones.
+
+        :param str endpoint:
+        :param str identity:
+        :param str secret:
+        :rtype str:
+        :return:
+        """
+        secret_digest = hashlib.sha256((secret or '').encode('utf-8')).hexdigest()
+        return hashlib.sha256(
+            ('%s|%s|%s' % (endpoint, identity, secret_digest)).encode('utf-8')
+        ).hexdigest()
+
+    def get(self, key):
+        """
+        Reads a token
+
+        :param str key:
+        :rtype dict | None:
+        :return:
+        """
+        raise NotImplementedError()
+
+    def set(self, key, token):
+        """
+        Saves a token
+
+        :param str key:
+        :param dict token:
+        :return:
+        """
+        raise NotImplementedError()
+
+    @contextlib.contextmanager
+    def lock(self, key):  # pylint: disable=unused-argument
+        """
+        Context manager holding an exclusive lock on a key
+
+        :param str key:
+        :return:
+        """
+        yield
+
+
+class FileTokenStore(TokenStore):
+    """
+    Stores tokens as files in a directory, locked with flock
+
+    Every process of the same user pointing at the same directory shares
+    tokens. The directory and files are only usable by their owner, a
+    directory that other users can use is refused.
+    """
+    __slots__ = (
+        '_directory',
+    )
+
+    def __init__(self, directory=None):
+        """
+        :param str directory: defaults to usergrid-tokens-<uid> in the temp dir
+        :raises PermissionError: when the directory is not private
+        """
+        self._directory = file_store.private_directory(
+            directory or file_store.default_directory('usergrid-tokens')
+        )
+
+    def _path(self, key, extension):
+        return os.path.join(self._directory, '%s.%s' % (key, extension))
+
+    def get(self, key):
+        """
+        Reads a token, None if missing or unreadable
+
+        :param str key:
+        :rtype dict | None:
+        :return:
+        """
+        return file_store.read_json(self._path(key, 'json'))
+
+    def set(self, key, token):
+        """
+        Saves a token, replacing the file atomically
+
+        :param str key:
+        :param dict token:
+        :return:
+        """
+        file_store.write_json(self._path(key, 'json'), token)
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """
+        Holds an exclusive flock on the key's lock file
+
+        :param str key:
+        :return:
+        """
+        descriptor = file_store.open_lock_file(self._path(key, 'lock'))
+        try:
+            if fcntl is not None:
+                fcntl.flock(descriptor, fcntl.LOCK_EX)
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(descriptor, fcntl.LOCK_UN)
+            os.close(descriptor)
+
+
+__all__ = ['TokenStore', 'FileTokenStore']
@@ -1,24 +1,97 @@
 """
 User Grid class
 """
+import contextlib
+import functools
 import json
 import logging
+import operator
+import os
+import threading
 import warnings
 import time
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
 from usergrid.exceptions import UserGridException
 from usergrid.decorators import catch_usergrid_not_found_exception
+from usergrid import download
+from usergrid import multipart
+from usergrid import profiling
+from usergrid import streaming
+from usergrid import workers
+from usergrid.cache import EntityCache, NegativeCache
+from usergrid.checkpoint import FileCheckpointStore, new_checkpoint, same_scan
+from usergrid.hooks import RequestInfo, call_hook
+from usergrid.metrics import RequestMetrics
+from usergrid.paths import normalize_path, collection_of, path_template
+from usergrid.sync import EntitySync
+from usergrid.token_store import TokenStore
 
 __version__ = '0.1.14'
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
-# pylint: disable=too-many-public-methods
+def _body_size(data):
+    """
+    Size of a request body, 0 when it is not known
+
+    :param data:
+    :rtype int:
+    :return:
+    """
+    if isinstance(data, bytes):
+        return len(data)
+
+    if isinstance(data, str):
+        return len(data.encode('utf-8'))
+
+    # streamed bodies such as MultipartBody know their length up front
+    return getattr(data, 'len', None) or 0
+
+
+def _response_size(response, stream):
+    """
+    Size of a response body, from Content-Length when it is streamed
+
+    :param requests.Response response:
+    :param boolean stream:
+    :rtype int:
+    :return:
+    """
+    if not stream:
+        return len(response.content)
+
+    length = response.headers.get('Content-Length', '')
+    return int(length) if length.isdigit() else 0
+
+
+def _release_on_close(response, in_flight):
+    """
+    Keeps the rate limiter's in flight slots of a streamed response until
+    the response is closed, as its body is read after the request returns
+
+    :param requests.Response response:
+    :param InFlight in_flight:
+    :return:
+    """
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            in_flight.release()
+
+    response.close = close_and_release
+
+
 # pylint: disable=too-many-instance-attributes
-class UserGrid(object):
+class BaseUserGrid(object):
     """
-    Class wrapping UG calls easier
+    Connection settings, token state and payload handling shared by the
+    blocking and asyncio clients
     """
     __slots__ = (
         '_client_id',
@@ -32,7 +105,13 @@ class UserGrid(object):
         '_last_login_info',
         '_default_timeout',
         '_last_response',
-        '_me'
+        '_me',
+        '_pool_connections',
+        '_pool_maxsize',
+        '_pool_block',
+        '_keep_alive',
+        '_idle_timeout',
+        '_token_refresh_margin'
     )
 
     def __init__(self, **kwargs):
@@ -48,6 +127,13 @@ class UserGrid(object):
         :param boolean use_compression:
         :param boolean use_ssl:
         :param int default_timeout:
+        :param int pool_connections: number of host pools to cache
+        :param int pool_maxsize: max connections kept open per host
+        :param boolean pool_block: block when the pool is exhausted
+        :param boolean keep_alive: reuse connections between requests
+        :param int idle_timeout: seconds before idle connections are closed
+        :param int token_refresh_margin: seconds before the token expires to
+                                         refresh it in the background
         """
         host = kwargs.pop('host', None)
         app = kwargs.pop('app', None)
@@ -81,6 +167,14 @@ class UserGrid(object):
         self._default_timeout = kwargs.pop('default_timeout', 20)
         self._me = None
         self._last_login_info = None
+        self._last_response = None
+
+        self._pool_connections = kwargs.pop('pool_connections', 10)
+        self._pool_maxsize = kwargs.pop('pool_maxsize', 10)
+        self._pool_block = kwargs.pop('pool_block', False)
+        self._keep_alive = kwargs.pop('keep_alive', True)
+        self._idle_timeout = kwargs.pop('idle_timeout', None)
+        self._token_refresh_margin = kwargs.pop('token_refresh_margin', 0)
 
     @property
     def me(self):  # pylint: disable=invalid-name
@@ -115,9 +209,65 @@ class UserGrid(object):
         self._last_login_info = {}
         self._token_expires = None
 
-    def login(self, **kwargs):
+    @staticmethod
+    def get_connections(entity):
         """
-        Login to UG
+        Helps pulls connections from an entity
+
+        :param dict entity:
+        :return:
+        """
+        if 'metadata' in entity and 'connections' in entity['metadata']:
+            return entity['metadata']['connections']
+
+        return None
+
+    @staticmethod
+    def get_actor_from_user(user):
+        """
+        Extracts the actor from a user entity
+
+        :param dict user:
+        :return:
+        """
+        name = ''
+        picture = ''
+        email = ''
+
+        if 'username' in user:
+            name = user['username']
+
+        if 'name' in user:
+            name = user['name']
+
+        if 'picture' in user:
+            picture = user['picture']
+
+        if 'email' in user:
+            email = user['email']
+
+        return {
+            "uuid": user['uuid'],
+            "displayName": name,
+            "username": user['username'],
+            "email": email,
+            "picture": picture
+        }
+
+    @staticmethod
+    def print_user(user):
+        """
+        Deprecated call do not use
+
+        :param user:
+        :return:
+        """
+        warnings.warn(DeprecationWarning)
+        logger.info(user)
+
+    def _prepare_login(self, **kwargs):
+        """
+        Builds the token request for login
 
         :param str superuser: name for the super admin
         :param str username: user name to autheticate with
@@ -125,7 +275,8 @@ class UserGrid(object):
         :param str client_id: id for client_grant
         :param str client_secret: secret for client_grant
         :param int ttl: Time in seconds for the auth token to exist
-        :return:
+        :rtype (str, dict, str):
+        :return: token url, form data and the user name
         """
         client_id = kwargs.pop('client_id', self._client_id)
         client_secret = kwargs.pop('client_secret', self._client_secret)
@@ -171,32 +322,110 @@ class UserGrid(object):
             # request is made with milliseconds
             data['ttl'] = int(ttl) * 1000
 
-        login_response = requests.request(
-            method="POST",
-            url=endpoint + "/token",
-            data=data,
-            timeout=20
-        )
+        return endpoint + "/token", data, user_name
 
-        try:
-            login_json = login_response.json()
-            if login_response.status_code == 200:
-                self._token_expires = time.time() + int(login_json['expires_in'])
-                self._access_token = login_json['access_token']
-                if user_name:  # Only set if we are password grant
-                    self._me = login_json['user']
-
-            if 'error' in login_json and login_json['error'] == 'invalid_grant':
-                raise UserGridException(
-                    title=UserGridException.ERROR_LOGIN,
-                    detail='Failed to login to usergrid'
-                )
-        except Exception as test:
+    def _complete_login(self, status_code, login_json, user_name):
+        """
+        Stores the token from a login response
+
+        :param int status_code:
+        :param dict login_json:
+        :param str user_name:
+        :return:
+        """
+        if status_code == 200:
+            self._token_expires = time.time() + int(login_json['expires_in'])
+            self._access_token = login_json['access_token']
+            if user_name:  # Only set if we are password grant
+                self._me = login_json['user']
+
+        if 'error' in login_json and login_json['error'] == 'invalid_grant':
             raise UserGridException(
-                title=UserGridException.ERROR_GENERAL,
-                detail='Failed to connect to usergrid'
+                title=UserGridException.ERROR_LOGIN,
+                detail='Failed to login to usergrid'
             )
 
+    def _token_needs_login(self):
+        """
+        Checks if the token is expired and a new login is required
+
+        :rtype boolean:
+        :return:
+        """
+        # No expires set because the access_token was manually inputted
+        if self._token_expires is None:
+            return False
+
+        # Still have time on the token
+        if self._token_expires > time.time():
+            return False
+
+        if self._auto_reconnect:
+            return True
+
+        raise UserGridException(
+            title=UserGridException.ERROR_EXPIRED_TOKEN,
+            detail='Access token has expired'
+        )
+
+    def _token_due_refresh(self):
+        """
+        Checks if the token is still valid but inside the refresh margin
+
+        :rtype boolean:
+        :return:
+        """
+        if not self._auto_reconnect or not self._token_refresh_margin:
+            return False
+
+        if self._token_expires is None:
+            return False
+
+        return self._token_expires - self._token_refresh_margin <= time.time()
+
+    def _prepare_request(self, kwargs):
+        """
+        Applies the default timeout and standard headers to request options
+
+        :param dict kwargs:
+        :rtype dict:
+        :return:
+        """
+        if 'timeout' not in kwargs:
+            kwargs['timeout'] = self._default_timeout
+
+        # headers passed in, such as Accept for file downloads, win
+        headers = self.std_headers
+        headers.update(kwargs.get('headers') or {})
+        kwargs['headers'] = headers
+        return kwargs
+
+    @staticmethod
+    def _parse_response(response_json):
+        """
+        Returns the decoded response or raises the error UG reported
+
+        :param dict response_json:
+        :rtype dict:
+        :return:
+        """
+        if 'exception' not in response_json:
+            return response_json
+
+        title = UserGridException.ERROR_GENERAL
+        detail = 'Unknown user grid error'
+
+        if 'error' in response_json:
+            title = response_json['error']
+
+        if 'error_description' in response_json:
+            detail = response_json['error_description']
+
+        raise UserGridException(
+            title=title,
+            detail=detail
+        )
+
     @property
     def std_headers(self):
         """
@@ -230,7 +459,388 @@ class UserGrid(object):
 
         return "{0}/{1}".format(self._app_endpoint, path)
 
-    def collect_entities(self, endpoint, ql=None, limit=None):  # pylint: disable=invalid-name
+    @staticmethod
+    def _query_params(cursor=None, ql=None, limit=None):  # pylint: disable=invalid-name
+        """
+        Builds the query string for reading a collection
+
+        :param str cursor:
+        :param str ql:
+        :param int limit:
+        :rtype dict:
+        :return:
+        """
+        query_params = {}
+
+        if limit:
+            query_params['limit'] = int(limit)
+
+        if ql:
+            query_params['ql'] = ql
+
+        if cursor:
+            query_params['cursor'] = cursor
+
+        return query_params
+
+    def _get_relative_path(self, url):
+        """
+        Strips the app endpoint and query string from a full url
+
+        :param str url:
+        :rtype str:
+        :return:
+        """
+        path = url.split('?', 1)[0]
+        if path.startswith(self._app_endpoint):
+            path = path[len(self._app_endpoint):]
+
+        return normalize_path(path)
+
+
+class _RequestCall(object):
+    """
+    What _request keeps about one request across its attempts
+    """
+    __slots__ = (
+        'method',
+        'url',
+        'kwargs',
+        'template',
+        'request_bytes',
+        'breaker',
+        'page',
+        'page_profile',
+        'attempt'
+    )
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, method, url, kwargs, template, breaker=None, page=None, page_profile=None):
+        """
+        :param str method:
+        :param str url:
+        :param dict kwargs: prepared arguments for session.request
+        :param str template: path template the metrics are keyed by
+        :param CircuitBreaker breaker: breaker of the url's host
+        :param int page: page number within a scan
+        :param PageProfile page_profile: the scan page being profiled
+        """
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.template = template
+        self.request_bytes = _body_size(kwargs.get('data'))
+        self.breaker = breaker
+        self.page = page
+        self.page_profile = page_profile
+        self.attempt = 1
+
+    def info(self, started):
+        """
+        A RequestInfo for the hooks of the current attempt
+
+        :param float started:
+        :rtype RequestInfo:
+        :return:
+        """
+        return RequestInfo(
+            self.method,
+            self.url.split('?', 1)[0],
+            self.template,
+            ql=(self.kwargs.get('params') or {}).get('ql'),
+            page=self.page,
+            attempt=self.attempt,
+            started=started,
+            request_bytes=self.request_bytes
+        )
+
+
+# pylint: disable=too-many-public-methods
+class UserGrid(BaseUserGrid):
+    """
+    Class wrapping UG calls easier
+    """
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    __slots__ = (
+        '_session',
+        '_last_used',
+        '_cache',
+        '_negative_cache',
+        '_login_lock',
+        '_token_store',
+        '_retry_policy',
+        '_circuit_breakers',
+        '_rate_limiter',
+        '_metrics',
+        '_hooks',
+        '_checkpoint_store',
+        '_scan_page'
+    )
+
+    def __init__(self, **kwargs):
+        """
+        See BaseUserGrid for the connection options
+
+        :param int cache_size: cache up to this many entities read by
+                               get_entity, disabled when not set
+        :param float cache_ttl: seconds a cached entity is served for
+        :param float negative_cache_ttl: seconds to remember entities that
+                                         were not found, disabled when not set
+        :param TokenStore token_store: share tokens with other processes
+        :param RetryPolicy retry_policy: retry failed idempotent requests,
+                                         each request is tried once when not set
+        :param CircuitBreakers circuit_breakers: fail fast while a host is unhealthy
+        :param RateLimiter rate_limiter: throttle requests sent by this client
+        :param RequestMetrics metrics: where request metrics are recorded,
+                                       defaults to one per client
+        :param RequestHooks hooks: called around every request
+        :param CheckpointStore checkpoint_store: where checkpointed scans save
+                                                 their progress, defaults to a
+                                                 FileCheckpointStore
+        """
+        self._token_store = kwargs.pop('token_store', None)
+        self._retry_policy = kwargs.pop('retry_policy', None)
+        self._circuit_breakers = kwargs.pop('circuit_breakers', None)
+        self._rate_limiter = kwargs.pop('rate_limiter', None)
+        self._metrics = kwargs.pop('metrics', None) or RequestMetrics()
+        self._hooks = kwargs.pop('hooks', None)
+        self._checkpoint_store = kwargs.pop('checkpoint_store', None)
+        self._scan_page = threading.local()
+        cache_size = kwargs.pop('cache_size', None)
+        cache_ttl = kwargs.pop('cache_ttl', 60)
+        negative_cache_ttl = kwargs.pop('negative_cache_ttl', None)
+        super(UserGrid, self).__init__(**kwargs)
+        self._last_used = None
+        self._session = None
+        self._cache = None
+        self._negative_cache = None
+        self._login_lock = threading.Lock()
+
+        if cache_size:
+            self._cache = EntityCache(max_size=cache_size, ttl=cache_ttl)
+
+        if negative_cache_ttl:
+            self._negative_cache = NegativeCache(ttl=negative_cache_ttl)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Closes the pooled session and all of its connections
+
+        The client can still be used after closing, a new session is
+        created on the next request
+
+        :return:
+        """
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _create_session(self):
+        """
+        Builds a session with a connection pool mounted for http and https
+
+        :rtype requests.Session:
+        :return:
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self._pool_connections,
+            pool_maxsize=self._pool_maxsize,
+            pool_block=self._pool_block
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        if not self._keep_alive:
+            session.headers['Connection'] = 'close'
+
+        return session
+
+    def _drop_connections(self):
+        """
+        Closes every pooled connection of the session's adapters
+
+        :return:
+        """
+        for adapter in self._session.adapters.values():
+            pool_manager = getattr(adapter, 'poolmanager', None)
+            if pool_manager is not None:
+                pool_manager.clear()
+
+            for proxy_manager in getattr(adapter, 'proxy_manager', {}).values():
+                proxy_manager.clear()
+
+    @property
+    def session(self):
+        """
+        The pooled session used for every request
+
+        When the session has not been used for longer than idle_timeout,
+        the connection pools of its adapters are cleared. The session itself
+        is kept, so adapters mounted on it and its headers still apply, and
+        the next request opens a fresh connection.
+
+        :rtype requests.Session:
+        :return:
+        """
+        now = time.time()
+        if (self._session is not None and
+                self._idle_timeout is not None and
+                self._last_used is not None and
+                now - self._last_used > self._idle_timeout):
+            logger.debug('Closing connections idle for %ss', now - self._last_used)
+            self._drop_connections()
+
+        if self._session is None:
+            self._session = self._create_session()
+
+        self._last_used = now
+        return self._session
+
+    @property
+    def cache(self):
+        """
+        The entity cache used by get_entity, None when caching is off
+
+        :rtype EntityCache:
+        :return:
+        """
+        return self._cache
+
+    @property
+    def retry_count(self):
+        """
+        Number of retries made by the retry policy
+
+        :rtype int:
+        :return:
+        """
+        if self._retry_policy is None:
+            return 0
+
+        return self._retry_policy.retries
+
+    @property
+    def metrics(self):
+        """
+        The request metrics recorded by this client
+
+        :rtype RequestMetrics:
+        :return:
+        """
+        return self._metrics
+
+    @property
+    def checkpoint_store(self):
+        """
+        Where checkpointed scans save their progress
+
+        :rtype CheckpointStore:
+        :return:
+        """
+        if self._checkpoint_store is None:
+            self._checkpoint_store = FileCheckpointStore()
+
+        return self._checkpoint_store
+
+    def stats(self):
+        """
+        Snapshot of the request metrics, see RequestMetrics.stats
+
+        :rtype list:
+        :return:
+        """
+        return self._metrics.stats()
+
+    @property
+    def negative_cache(self):
+        """
+        The get_entities calls that were not found, None when off
+
+        :rtype NegativeCache:
+        :return:
+        """
+        return self._negative_cache
+
+    def login(self, **kwargs):
+        """
+        Login to UG
+
+        :param str superuser: name for the super admin
+        :param str username: user name to autheticate with
+        :param str password: password for super/user name
+        :param str client_id: id for client_grant
+        :param str client_secret: secret for client_grant
+        :param int ttl: Time in seconds for the auth token to exist
+        :return:
+        """
+        url, data, user_name = self._prepare_login(**kwargs)
+
+        if self._token_store is None:
+            self._request_token(url, data, user_name)
+            return
+
+        key = TokenStore.make_key(
+            url,
+            data.get('client_id') or data.get('username'),
+            data.get('client_secret') or data.get('password')
+        )
+        with self._token_store.lock(key):
+            token = self._token_store.get(key)
+            if token and token['expires'] - self._token_refresh_margin > time.time():
+                logger.info("Using token from the token store")
+                self._access_token = token['access_token']
+                self._token_expires = token['expires']
+                if user_name:
+                    self._me = token.get('user')
+                return
+
+            self._request_token(url, data, user_name)
+            self._token_store.set(key, {
+                'access_token': self._access_token,
+                'expires': self._token_expires,
+                'user': self._me if user_name else None
+            })
+
+    def _request_token(self, url, data, user_name):
+        """
+        Requests a new token from UG
+
+        :param str url:
+        :param dict data:
+        :param str user_name:
+        :return:
+        """
+        login_response = self.session.request(
+            method="POST",
+            url=url,
+            data=data,
+            timeout=20
+        )
+
+        try:
+            self._complete_login(
+                login_response.status_code,
+                login_response.json(),
+                user_name
+            )
+        except Exception as test:
+            raise UserGridException(
+                title=UserGridException.ERROR_GENERAL,
+                detail='Failed to connect to usergrid'
+            )
+
+    # pylint: disable=too-many-arguments,too-many-locals
+    def collect_entities(self, endpoint, ql=None, limit=None, prefetch=0,  # pylint: disable=invalid-name
+                         stream=False, drop_keys=None, profile=None, checkpoint=None,
+                         checkpoint_store=None):
         """
         A generator to return all entities
 
@@ -239,47 +849,375 @@ class UserGrid(object):
         :param str endpoint:
         :param str ql:
         :param int limit:
+        :param int prefetch: number of pages to fetch in the background
+                             while the current page is consumed
+        :param boolean stream: decode entities as each response is read
+                               instead of loading whole pages
+        :param iterable drop_keys: entity keys to discard, eg metadata
+        :param ScanProfile profile: filled with the time spent in each phase
+                                    per page, logged when the scan ends
+        :param str checkpoint: key to save the scan's progress under after
+                               each page, a scan with a saved checkpoint
+                               continues from it
+        :param CheckpointStore checkpoint_store: defaults to the client's
         :rtype dict:
         :return:
         """
+        pages = self._collect_pages(
+            endpoint,
+            ql=ql,
+            limit=limit,
+            prefetch=prefetch,
+            stream=stream,
+            drop_keys=drop_keys,
+            profile=profile,
+            checkpoint=checkpoint,
+            checkpoint_store=checkpoint_store
+        )
+
+        if profile is None:
+            for page_entities in pages:
+                for entity in page_entities:
+                    yield entity
+            return
+
+        started = time.time()
+        try:
+            for index, page_entities in enumerate(pages):
+                # pages are added to the profile before they are handed over
+                page_profile = profile.pages[index]
+                for entity in page_entities:
+                    page_profile.entities += 1
+                    yielded = time.time()
+                    yield entity
+                    page_profile.callback += time.time() - yielded
+        finally:
+            profile.elapsed = time.time() - started
+            logger.info('Scan of %s:\n%s', endpoint, profile.report())
+
+    # pylint: disable=too-many-arguments,too-many-locals
+    def _collect_pages(self, endpoint, ql=None, limit=None, prefetch=0,  # pylint: disable=invalid-name
+                       stream=False, drop_keys=None, profile=None, checkpoint=None,
+                       checkpoint_store=None):
+        """
+        A generator over the entities of each page, saving a checkpoint
+        once the consumer comes back for the next page
+
+        A page is only recorded after all of its entities have been handed
+        over, so a scan that dies is resumed at the start of the page it was
+        on and no entity is missed, though some may be seen twice. The
+        checkpoint is deleted when the scan completes.
+
+        :param str endpoint:
+        :param str ql:
+        :param int limit:
+        :param int prefetch:
+        :param boolean stream:
+        :param iterable drop_keys:
+        :param ScanProfile profile:
+        :param str checkpoint:
+        :param CheckpointStore checkpoint_store:
+        :rtype list:
+        :return:
+        """
+        store = None
         cursor = None
+        count = 0
+        if checkpoint is not None:
+            store = checkpoint_store or self.checkpoint_store
+            saved = store.get(checkpoint)
+            if saved is not None:
+                if not same_scan(saved, endpoint, ql, limit):
+                    raise UserGridException(
+                        title=UserGridException.ERROR_GENERAL,
+                        detail='Checkpoint %s was saved by a scan of %s' % (
+                            checkpoint,
+                            saved.get('endpoint')
+                        )
+                    )
+
+                cursor = saved.get('cursor')
+                count = saved.get('count', 0)
+                if cursor is None:
+                    # the scan finished before the checkpoint could be deleted
+                    store.delete(checkpoint)
+                    return
+                logger.info(
+                    'Resuming scan of %s from checkpoint %s after %d entities',
+                    endpoint,
+                    checkpoint,
+                    count
+                )
+
+        pages = self._iter_pages(
+            endpoint,
+            ql=ql,
+            limit=limit,
+            stream=stream,
+            drop_keys=drop_keys,
+            profile=profile,
+            cursor=cursor
+        )
+
+        if prefetch:
+            if stream:
+                # the background thread has to read a page before the cursor is known
+                pages = ((list(page_entities), page) for page_entities, page in pages)
+            pages = workers.prefetch(pages, prefetch)
+
+        for page_entities, page in pages:
+            yield page_entities
+
+            if store is not None:
+                count += page.get('count', 0)
+                store.set(
+                    checkpoint,
+                    new_checkpoint(endpoint, ql, limit, page.get('cursor'), count)
+                )
+
+        if store is not None:
+            store.delete(checkpoint)
+
+    # pylint: disable=too-many-arguments
+    def _iter_pages(self, endpoint, ql=None, limit=None,  # pylint: disable=invalid-name
+                    stream=False, drop_keys=None, profile=None, cursor=None):
+        """
+        A generator following the cursor over each page of entities
+
+        Yields the entities of each page with a dict holding the page's
+        number, and once the entities are consumed its cursor and count.
+        Streamed pages must be consumed before the next page is requested
+
+        :param str endpoint:
+        :param str ql:
+        :param int limit:
+        :param boolean stream:
+        :param iterable drop_keys:
+        :param ScanProfile profile:
+        :param str cursor: cursor of the first page
+        :rtype (list, dict):
+        :return:
+        """
+        page_number = 0
 
         if not limit or limit > 1000:
             limit = 1000
 
         while True:
-            page_entities, cursor = self.get_entities(
-                endpoint,
-                ql=ql,
-                limit=limit,
-                cursor=cursor
+            page_number += 1
+            page_profile = profile.new_page() if profile is not None else None
+            if stream:
+                page = {'number': page_number, 'profile': page_profile}
+                yield self._stream_entities(
+                    endpoint,
+                    page,
+                    cursor=cursor,
+                    ql=ql,
+                    limit=limit,
+                    drop_keys=drop_keys
+                ), page
+                cursor = page.get('cursor')
+                count = page.get('count', 0)
+            else:
+                with self._scan_page_scope(page_number, page_profile):
+                    page_entities, cursor = self.get_entities(
+                        endpoint,
+                        ql=ql,
+                        limit=limit,
+                        cursor=cursor
+                    )
+                if drop_keys:
+                    for entity in page_entities:
+                        for drop_key in drop_keys:
+                            entity.pop(drop_key, None)
+
+                count = len(page_entities)
+                yield page_entities, {'number': page_number, 'cursor': cursor, 'count': count}
+
+            if cursor is None or count < limit:
+                break
+
+    @contextlib.contextmanager
+    def _scan_page_scope(self, number, profile=None):
+        """
+        Tells request hooks and the profiler which page of a scan the
+        requests made by this thread belong to
+
+        :param int number:
+        :param PageProfile profile:
+        :return:
+        """
+        self._scan_page.number = number
+        self._scan_page.profile = profile
+        try:
+            yield
+        finally:
+            self._scan_page.number = None
+            self._scan_page.profile = None
+
+    # pylint: disable=too-many-arguments
+    def _stream_entities(self, endpoint, page, cursor=None, ql=None, limit=None,  # pylint: disable=invalid-name
+                         drop_keys=None):
+        """
+        Generator decoding the entities of one page as the response is read
+
+        page holds the page number and profile, once exhausted it also holds
+        the cursor and the number of entities
+
+        :param str endpoint:
+        :param dict page:
+        :param str cursor:
+        :param str ql:
+        :param int limit:
+        :param iterable drop_keys:
+        :rtype dict:
+        :return:
+        """
+        fields = {}
+        count = 0
+        page_profile = page.get('profile')
+        with self._scan_page_scope(page.get('number'), page_profile):
+            response = self._request(
+                'GET',
+                self._get_full_endpoint(endpoint),
+                params=self._query_params(cursor=cursor, ql=ql, limit=limit),
+                stream=True
             )
 
-            for entity in page_entities:
+        chunks = response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE)
+        if page_profile is not None:
+            chunks = profiling.timed_network(chunks, page_profile)
+
+        entities = streaming.iter_entities(chunks, drop_keys=drop_keys, fields=fields)
+        if page_profile is not None:
+            entities = profiling.timed_decode(entities, page_profile)
+
+        try:
+            for entity in entities:
+                count += 1
                 yield entity
 
-            if cursor is None or len(page_entities) < limit:
-                break
+            self._parse_response(fields)
+        except UserGridException as ug_exception:
+            if ug_exception.detail != 'Service resource not found':
+                logger.exception(ug_exception)
+                raise
+        finally:
+            response.close()
+
+        page['cursor'] = fields.get('cursor')
+        page['count'] = count
+
+    # pylint: disable=too-many-arguments
+    def sync_entities(self, endpoint, since=None, since_uuids=None, where=None, limit=None):
+        """
+        Iterates over the entities modified since the last sync
+
+        Pass the watermark and watermark_uuids of the returned EntitySync,
+        read after iterating it, as since and since_uuids to the next sync
 
+        :param str endpoint:
+        :param int since: modified timestamp in milliseconds
+        :param iterable since_uuids: uuids already synced at since
+        :param str where: extra ql condition
+        :param int limit:
+        :rtype EntitySync:
+        :return:
+        """
+        return EntitySync(
+            self,
+            endpoint,
+            since=since,
+            since_uuids=since_uuids,
+            where=where,
+            limit=limit
+        )
 
-    def process_entities(self, endpoint, method, ql=None, limit=None):  # pylint: disable=invalid-name
+    # pylint: disable=too-many-arguments
+    def process_entities(self, endpoint, method, ql=None, limit=None,  # pylint: disable=invalid-name
+                         max_workers=None, ordered=True, prefetch=0, profile=None,
+                         checkpoint=None, checkpoint_store=None):
         """
         Apply a function to each entity
 
         Do not use this for end-user code as it will apply to all entites
         in a collection
 
+        Without max_workers the function runs on the calling thread and the
+        first exception stops the scan. With max_workers the function runs
+        on a thread pool and failures are collected in the summary instead.
+
+        With a checkpoint, a page is recorded once method has run on all of
+        its entities, so with max_workers the pool is drained at the end of
+        each page.
+
         :param str endpoint:
         :param callable method:
         :param str ql:
         :param int limit:
+        :param int max_workers: number of threads to run method on
+        :param boolean ordered: complete entities in the order they are fetched
+        :param int prefetch: number of pages to fetch in the background
+        :param ScanProfile profile: filled with the time spent in each phase
+                                    per page, with max_workers the callback
+                                    phase is time spent waiting on the pool
+        :param str checkpoint: key to save the scan's progress under, see
+                               collect_entities
+        :param CheckpointStore checkpoint_store: defaults to the client's
+        :rtype ProcessSummary:
         :return:
         """
         assert callable(method)
-        for entity in self.collect_entities(endpoint, ql, limit):
-            method(entity)
+        summary = workers.ProcessSummary(profile=profile)
+        started = time.time()
+        scan = {
+            'ql': ql,
+            'limit': limit,
+            'prefetch': prefetch,
+            'profile': profile,
+            'checkpoint': checkpoint,
+            'checkpoint_store': checkpoint_store
+        }
 
-    @catch_usergrid_not_found_exception(return_value_on_exception=([], None))
+        def apply(batch):
+            for entity, _, exception in workers.bounded_map(
+                    method,
+                    batch,
+                    max_workers,
+                    ordered=ordered
+            ):
+                if exception is None:
+                    summary.processed += 1
+                    continue
+
+                logger.warning('Failed to process entity: %s', exception)
+                summary.failed.append((entity, exception))
+
+        if not max_workers:
+            for entity in self.collect_entities(endpoint, **scan):
+                method(entity)
+                summary.processed += 1
+        elif checkpoint is None:
+            apply(self.collect_entities(endpoint, **scan))
+        else:
+            # entities still on the pool must not be counted as done by the
+            # checkpoint, so each page is finished before the next is read
+            for index, page_entities in enumerate(self._collect_pages(endpoint, **scan)):
+                page_entities = list(page_entities)
+                if profile is not None:
+                    profile.pages[index].entities += len(page_entities)
+                apply(page_entities)
+
+            if profile is not None:
+                profile.elapsed = time.time() - started
+
+        summary.elapsed = time.time() - started
+        return summary
+
+    @catch_usergrid_not_found_exception(
+        return_value_on_exception=([], None),
+        negative_cache=operator.attrgetter('negative_cache')
+    )
     def get_entities(self, endpoint, cursor=None, ql=None, limit=None):  # pylint: disable=invalid-name
         """
         Get entities from UG
@@ -291,17 +1229,7 @@ class UserGrid(object):
         :rtype (list, str):
         :return:
         """
-        query_params = {}
-
-        if limit:
-            query_params['limit'] = int(limit)
-
-        if ql:
-            query_params['ql'] = ql
-
-        if cursor:
-            query_params['cursor'] = cursor
-
+        query_params = self._query_params(cursor=cursor, ql=ql, limit=limit)
         entities = None
         cursor = None
 
@@ -339,11 +1267,19 @@ class UserGrid(object):
         :rtype dict | None:
         :return:
         """
+        if self._cache is not None:
+            found, entity = self._cache.get(endpoint, ql)
+            if found:
+                return entity
+
         entities, cursor = self.get_entities(endpoint, ql=ql, limit=1)  # pylint: disable=unused-variable
         entity = None
         if entities:
             entity = entities[0]
 
+        if entity is not None and self._cache is not None:
+            self._cache.set(endpoint, ql, entity)
+
         return entity
 
     def get_entity_by_id(self, entity, entity_id):
@@ -396,6 +1332,66 @@ class UserGrid(object):
 
         return response['entities'][0]
 
+    def post_entities(self, endpoint, entities, batch_size=100, max_workers=None):
+        """
+        Creates entities in batches with one array POST per batch
+
+        A generator that yields the created entities in the order of
+        entities. The input is read lazily so any iterable can be streamed
+        in. With max_workers several batches are posted at once.
+
+        :param str endpoint:
+        :param entities: iterable of dict
+        :param int batch_size: entities sent in each POST
+        :param int max_workers: number of batches to post concurrently
+        :rtype dict:
+        :return:
+        """
+        batches = workers.chunked(entities, batch_size)
+
+        if not max_workers:
+            for batch in batches:
+                for entity in self._post_batch(endpoint, batch):
+                    yield entity
+            return
+
+        for _, created, exception in workers.bounded_map(
+                functools.partial(self._post_batch, endpoint),
+                batches,
+                max_workers
+        ):
+            if exception is not None:
+                raise exception
+
+            for entity in created:
+                yield entity
+
+    def _post_batch(self, endpoint, batch):
+        """
+        Posts a list of entities as a JSON array
+
+        :param str endpoint:
+        :param list batch:
+        :rtype list:
+        :return:
+        """
+        response = self._make_request(
+            'POST',
+            self._get_full_endpoint(endpoint),
+            data=json.dumps(batch)
+        )
+
+        created = response.get('entities', [])
+        if len(created) != len(batch):
+            logger.warning(
+                'Posted %d entities to %s but %d were created',
+                len(batch),
+                endpoint,
+                len(created)
+            )
+
+        return created
+
     def update_entity(self, endpoint, data):
         """
         Runs put on an endpoint
@@ -412,6 +1408,93 @@ class UserGrid(object):
 
         return response['entities'][0]
 
+    def update_entities(self, endpoint, ql, data, limit=1000):  # pylint: disable=invalid-name
+        """
+        Updates every entity matching ql with query scoped PUTs
+
+        Follows the cursor UG returns until every match has been updated
+
+        :param str endpoint:
+        :param str ql:
+        :param dict data:
+        :param int limit: entities updated per request, at most 1000
+        :rtype int:
+        :return: number of entities updated
+        """
+        updated = 0
+        cursor = None
+
+        if not limit or limit > 1000:
+            limit = 1000
+
+        while True:
+            query_params = {'ql': ql, 'limit': int(limit)}
+            if cursor:
+                query_params['cursor'] = cursor
+
+            entities, cursor = self._query_request(
+                'PUT',
+                endpoint,
+                query_params,
+                data=json.dumps(data)
+            )
+            updated += len(entities)
+
+            if cursor is None or not entities:
+                return updated
+
+    def delete_entities(self, endpoint, ql, limit=1000):  # pylint: disable=invalid-name
+        """
+        Deletes every entity matching ql with query scoped DELETEs
+
+        Repeats the query until UG reports nothing left to delete
+
+        :param str endpoint:
+        :param str ql:
+        :param int limit: entities deleted per request, at most 1000
+        :rtype int:
+        :return: number of entities deleted
+        """
+        deleted = 0
+
+        if not limit or limit > 1000:
+            limit = 1000
+
+        while True:
+            entities, _ = self._query_request(
+                'DELETE',
+                endpoint,
+                {'ql': ql, 'limit': int(limit)}
+            )
+            if not entities:
+                return deleted
+
+            deleted += len(entities)
+
+    def _query_request(self, method, endpoint, query_params, **kwargs):
+        """
+        Runs a query scoped request, treating a missing collection as empty
+
+        :param str method:
+        :param str endpoint:
+        :param dict query_params:
+        :rtype (list, str):
+        :return: affected entities and the cursor
+        """
+        try:
+            response = self._make_request(
+                method,
+                self._get_full_endpoint(endpoint),
+                params=query_params,
+                **kwargs
+            )
+        except UserGridException as ug_exception:
+            if ug_exception.detail == 'Service resource not found':
+                return [], None
+            raise
+
+        return response.get('entities') or [], response.get('cursor')
+
     def update_entity_by_id(self, entity, entity_id, data):
         """
         Helper to update an entity by id
@@ -449,19 +1532,6 @@ class UserGrid(object):
             data=json.dumps(post_data),
         )
 
-    @staticmethod
-    def get_connections(entity):
-        """
-        Helps pulls connections from an entity
-
-        :param dict entity:
-        :return:
-        """
-        if 'metadata' in entity and 'connections' in entity['metadata']:
-            return entity['metadata']['connections']
-
-        return None
-
     def post_relationship(self, endpoint):
         """
         Posts a relationship to an entity
@@ -486,28 +1556,58 @@ class UserGrid(object):
             self._get_full_endpoint(endpoint)
         )
 
-    def post_file(self, endpoint, filepath):
+    # pylint: disable=too-many-arguments
+    def post_file(self, endpoint, filepath, filename=None, content_type=None, progress=None,
+                  size=None, timeout=None, min_throughput=multipart.UPLOAD_MIN_THROUGHPUT):
         """
         Saves a file to UserGrid
 
-        :param endpoint:
-        :param filepath:
+        The file is streamed in chunks rather than loaded into memory.
+        Unless timeout is given, the read timeout allows for the file to be
+        sent at min_throughput.
+
+        :param str endpoint:
+        :param filepath: a path, bytes, a binary file-like object or an
+                         iterator of bytes
+        :param str filename: name sent for the file, defaults to the file's name
+        :param str content_type: guessed from filename when not set
+        :param callable progress: called with bytes sent and total bytes as
+                                  the upload goes, total is None when unknown
+        :param int size: bytes in an iterator, for Content-Length and the timeout
+        :param float timeout: read timeout in seconds
+        :param float min_throughput: slowest upload speed to allow for, in
+                                     bytes per second
+        :rtype dict:
         :return:
         """
         file_handler = None
+        source = filepath
+        if isinstance(filepath, str):
+            file_handler = source = open(filepath, 'rb')
+
+        if filename is None:
+            filename = os.path.basename(getattr(source, 'name', None) or 'file')
+
         try:
-            file_handler = open(filepath, 'rb')
+            body = multipart.MultipartBody(
+                [('name', filename)],
+                'file',
+                filename,
+                source,
+                content_type=content_type,
+                size=size,
+                progress=progress
+            )
 
-            files = {
-                'file': file_handler,
-                'name': filepath.split("/")[-1]
-            }
+            if timeout is None:
+                timeout = multipart.upload_timeout(body.len, min_throughput)
 
             response = self._make_request(
                 'POST',
                 self._get_full_endpoint(endpoint),
-                files=files,
-                timeout=300  # 5min to upload
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=(self._default_timeout, timeout)
             )
         finally:
             if file_handler:
@@ -515,121 +1615,566 @@ class UserGrid(object):
 
         return response
 
-    @staticmethod
-    def get_actor_from_user(user):
+    def post_files(self, files, max_workers=4, skip_unchanged=False,
+                   min_throughput=multipart.UPLOAD_MIN_THROUGHPUT):
         """
-        Extracts the actor from a user entity
+        Uploads many files, several at once
+
+        Uploads share the client's connection pool, so max_workers is
+        lowered to pool_maxsize when it is larger. A failed upload is
+        recorded and does not stop the others. With skip_unchanged, a file
+        whose MD5 is the checksum in its entity's file-metadata is not sent
+        again.
+
+        :param files: iterable of (endpoint, path)
+        :param int max_workers: number of files uploaded concurrently
+        :param boolean skip_unchanged: compare MD5s with the entities first
+        :param float min_throughput: passed to post_file
+        :rtype UploadSummary:
+        :return:
+        """
+        summary = multipart.UploadSummary()
+        started = time.time()
+
+        def upload(item):
+            endpoint, path = item
+            if skip_unchanged:
+                entity = self.get_entity(endpoint) or {}
+                metadata = entity.get('file-metadata')
+                if multipart.matches_checksum(metadata, multipart.file_md5(path)):
+                    return None
+
+            self.post_file(endpoint, path, min_throughput=min_throughput)
+            return os.path.getsize(path)
+
+        for item, size, exception in workers.bounded_map(
+                upload,
+                files,
+                max(1, min(max_workers, self._pool_maxsize)),
+                ordered=False
+        ):
+            endpoint, path = item
+            if exception is not None:
+                logger.warning('Failed to upload %s to %s: %s', path, endpoint, exception)
+                summary.failed.append((endpoint, path, exception))
+            elif size is None:
+                summary.skipped.append(item)
+            else:
+                summary.uploaded.append(item)
+                summary.bytes += size
 
-        :param dict user:
+        summary.elapsed = time.time() - started
+        return summary
+
+    # pylint: disable=too-many-arguments,too-many-locals
+    def download_file(self, endpoint, dest, content_type=None, size=None, resume=True,
+                      max_workers=None, part_size=download.PART_SIZE, max_resumes=3,
+                      progress=None):
+        """
+        Downloads the file attached to an entity
+
+        The file is fetched as ranged GETs of part_size, with max_workers of
+        them at once, and a transfer that breaks off is resumed where it
+        stopped up to max_resumes times. Every request after the first sends
+        If-Range with the file's ETag or Last-Modified, so parts of another
+        version of the file are never mixed; when the server answers with the
+        whole file instead the download starts over.
+
+        A path is downloaded to <dest>.partial and renamed to dest once every
+        part is written. The parts written are kept in <dest>.partial.json,
+        which a later call with resume uses to fetch only the parts that are
+        missing. A file already at dest is always replaced.
+
+        :param str endpoint: the entity the file is attached to
+        :param dest: a path or a writable binary file-like object, which
+                     must be seekable to fetch parts in parallel
+        :param str content_type: defaults to the entity's file-metadata
+        :param int size: defaults to the entity's file-metadata
+        :param boolean resume: complete an interrupted download to dest
+                               instead of starting over
+        :param int max_workers: number of parts fetched at once
+        :param int part_size: bytes per ranged GET
+        :param int max_resumes: times a broken transfer is resumed
+        :param callable progress: called with bytes received and total bytes
+        :rtype int:
+        :return: size of the file
+        """
+        version = None
+        if content_type is None or size is None:
+            metadata = (self.get_entity(endpoint) or {}).get('file-metadata')
+            if not metadata:
+                raise UserGridException(
+                    title=UserGridException.ERROR_GENERAL,
+                    detail='No file attached to %s' % endpoint
+                )
+
+            content_type = content_type or metadata.get('content-type')
+            size = size if size is not None else metadata.get('content-length')
+            version = download.file_version(metadata)
+
+        url = self._get_full_endpoint(endpoint)
+        writer, state = download.open_destination(dest, size, version, resume=resume)
+        try:
+            end = None
+            if state is not None:
+                try:
+                    self._download_parts(
+                        url, content_type, writer, state,
+                        max_workers, part_size, max_resumes, progress
+                    )
+                    end = size
+                except download.RestartDownload as restart:
+                    logger.warning('Downloading %s whole: %s', url, restart)
+                    state.reset()
+
+            if end is None:
+                end = self._download_range(
+                    url, content_type, writer, 0, None,
+                    download.Progress(progress, size), max_resumes
+                )
+                if writer.seekable:
+                    writer.truncate(end)
+        finally:
+            writer.close()
+
+        if isinstance(dest, str):
+            os.replace(download.partial_path(dest), dest)
+            if state is not None:
+                state.remove()
+
+        return end
+
+    # pylint: disable=too-many-arguments
+    def _download_parts(self, url, content_type, writer, state, max_workers, part_size,
+                        max_resumes, progress):
+        """
+        Fetches the parts of a file state has not recorded as written
+
+        :param str url:
+        :param str content_type:
+        :param FileWriter writer:
+        :param download.DownloadState state:
+        :param int max_workers:
+        :param int part_size:
+        :param int max_resumes:
+        :param callable progress:
         :return:
         """
-        name = ''
-        picture = ''
-        email = ''
+        parts = state.remaining(part_size)
+        received = download.Progress(progress, state.size, state.received())
 
-        if 'username' in user:
-            name = user['username']
+        def fetch(part):
+            return self._download_range(
+                url, content_type, writer, part[0], part[1], received, max_resumes, state
+            )
 
-        if 'name' in user:
-            name = user['name']
+        if writer.seekable:
+            writer.truncate(state.size)
 
-        if 'picture' in user:
-            picture = user['picture']
+        if max_workers and writer.seekable and len(parts) > 1:
+            for _, _, part_exception in workers.bounded_map(fetch, parts, max_workers):
+                if part_exception is not None:
+                    raise part_exception
+        else:
+            for part in parts:
+                fetch(part)
 
-        if 'email' in user:
-            email = user['email']
+    # pylint: disable=too-many-arguments,too-many-branches
+    def _download_range(self, url, content_type, writer, start, end, received, max_resumes,
+                        state=None):
+        """
+        Streams bytes start to end of a file into writer
+
+        :param str url:
+        :param str content_type:
+        :param FileWriter writer:
+        :param int start:
+        :param int end: excluded, None for the rest of the file
+        :param Progress received:
+        :param int max_resumes:
+        :param download.DownloadState state: records the range once written
+        :rtype int:
+        :return: offset after the last byte written
+        :raises download.RestartDownload: when a range with an end can not
+                                          be completed from the same file
+        """
+        offset = start
+        resumes = 0
+        validator = state.validator if state is not None else None
 
-        return {
-            "uuid": user['uuid'],
-            "displayName": name,
-            "username": user['username'],
-            "email": email,
-            "picture": picture
-        }
+        while True:
+            headers = {'Accept': content_type or '*/*'}
+            if offset or end is not None:
+                headers['Range'] = 'bytes=%d-%s' % (offset, '' if end is None else end - 1)
+                if validator is not None:
+                    headers['If-Range'] = validator
+
+            response = None
+            try:
+                response = self._request('GET', url, headers=headers, stream=True)
+                if response.status_code >= 400:
+                    self._raise_download_error(url, response)
+
+                if 'Range' in headers and response.status_code != 206:
+                    if end is not None:
+                        raise download.RangesNotSupported(
+                            '%s sent the whole file for a range' % url
+                        )
+
+                    if not writer.seekable:
+                        raise UserGridException(
+                            title=UserGridException.ERROR_GENERAL,
+                            detail='%s sent the whole file, cannot resume' % url
+                        )
+
+                    # the whole file came back, write it from the start
+                    received.add(-offset)
+                    offset = 0
+
+                if state is not None:
+                    state.check_validator(download.response_validator(response))
+                if validator is None:
+                    validator = download.response_validator(response)
+
+                for chunk in response.iter_content(chunk_size=download.CHUNK_SIZE):
+                    writer.write_at(offset, chunk)
+                    offset += len(chunk)
+                    received.add(len(chunk))
+
+                if end is None or offset >= end:
+                    if state is not None and end is not None:
+                        writer.flush()
+                        state.finish(start, end)
+                    return offset
+
+                transfer_exception = 'short read'
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as request_exception:
+                transfer_exception = request_exception
+            finally:
+                if response is not None:
+                    response.close()
+
+            resumes += 1
+            if resumes > max_resumes:
+                if state is not None and offset > start:
+                    # a later call continues from here
+                    writer.flush()
+                    state.finish(start, offset)
+                raise UserGridException(
+                    title=UserGridException.ERROR_GENERAL,
+                    detail='Download of %s failed at byte %d: %s' % (
+                        url, offset, transfer_exception
+                    )
+                )
 
-    @staticmethod
-    def print_user(user):
+            logger.warning(
+                'Download of %s broke off at byte %d (%s), resuming',
+                url, offset, transfer_exception
+            )
+
+    def _raise_download_error(self, url, response):
         """
-        Deprecated call do not use
+        Raises the error UG reported for a failed download
 
-        :param user:
+        :param str url:
+        :param requests.Response response:
         :return:
         """
-        warnings.warn(DeprecationWarning)
-        logger.info(user)
+        try:
+            self._parse_response(response.json())
+        except ValueError:
+            pass
+
+        raise UserGridException(
+            title=UserGridException.ERROR_GENERAL,
+            detail='Download of %s failed with status %d' % (url, response.status_code)
+        )
 
     def _check_expired_token(self):
         """
         Called in _make_request to check if the token is expired
+
+        Only one thread logs in at a time, the others wait for it when the
+        token has expired. Inside the refresh margin the token is refreshed
+        on a background thread and the request carries on with the current
+        token.
         :return:
         """
-        # No expires set because the access_token was manually inputted
-        if self._token_expires is None:
+        if self._token_needs_login():
+            with self._login_lock:
+                # Another thread may have logged in while we were waiting
+                if self._token_needs_login():
+                    self.login()
             return
 
-        # Still have time on the token
-        if self._token_expires > time.time():
-            return
+        if self._token_due_refresh() and self._login_lock.acquire(False):
+            refresh = threading.Thread(
+                target=self._refresh_token,
+                name='usergrid-token-refresh'
+            )
+            refresh.daemon = True
+            refresh.start()
 
-        if self._auto_reconnect:
-            self.login()
-            return
+    def _refresh_token(self):
+        """
+        Logs in again from the background refresh thread
 
-        raise UserGridException(
-            title=UserGridException.ERROR_EXPIRED_TOKEN,
-            detail='Access token has expired'
+        Runs holding the login lock and releases it when done
+        :return:
+        """
+        try:
+            if self._token_due_refresh():
+                self.login()
+        except Exception as refresh_exception:  # pylint: disable=broad-except
+            logger.exception(refresh_exception)
+        finally:
+            self._login_lock.release()
+
+    def _invalidate_caches(self, url):
+        """
+        Drops cached entities and cached misses a write to url affects
+
+        :param str url:
+        :return:
+        """
+        if self._cache is not None:
+            self._cache.invalidate(self._get_relative_path(url))
+
+        if self._negative_cache is not None:
+            self._negative_cache.invalidate(self._get_relative_path(url))
+
+    def _throttle(self, method, url):
+        """
+        Waits for the rate limiter before a request is sent
+
+        :param str method:
+        :param str url:
+        :rtype InFlight | None:
+        :return: the slots to release once the response is read, None
+                 without a rate limiter
+        """
+        if self._rate_limiter is None:
+            return None
+
+        return self._rate_limiter.hold(
+            method,
+            collection_of(self._get_relative_path(url))
         )
 
-    def _make_request(self, method, url, **kwargs):
+    def _request(self, method, url, **kwargs):
         """
-        Makes a call to user grid and forces a timeout
+        Sends a request to user grid with the token and standard headers
+
+        Failed idempotent requests are retried by the retry policy
 
         :param method:
         :param url:
         :param kwargs:
-        :rtype dict:
+        :rtype requests.Response:
         :return:
         """
-        try:
+        page_profile = getattr(self._scan_page, 'profile', None)
+        if page_profile is None:
+            self._check_expired_token()
+        else:
+            checked = time.time()
             self._check_expired_token()
-            if 'timeout' not in kwargs:
-                kwargs['timeout'] = self._default_timeout
+            page_profile.token_refresh += time.time() - checked
+
+        kwargs = self._prepare_request(kwargs)
+        if self._retry_policy is not None:
+            self._retry_policy.budget.record_request()
+
+        call = _RequestCall(
+            method,
+            url,
+            kwargs,
+            template=path_template(self._get_relative_path(url)),
+            breaker=(
+                self._circuit_breakers.for_host(urlparse(url).netloc)
+                if self._circuit_breakers is not None else None
+            ),
+            page=getattr(self._scan_page, 'number', None),
+            page_profile=page_profile
+        )
 
-            if 'headers' not in kwargs:
-                kwargs['headers'] = {}
+        while True:
+            response, exception = self._attempt(call)
+            delay = self._retry_delay(call, response, exception)
+            if delay is None:
+                if exception is not None:
+                    raise exception
 
-            kwargs['headers'].update(self.std_headers)
+                self._last_response = response
+                return response
 
-            response = requests.request(
-                method,
-                url,
-                **kwargs
+            if response is not None:
+                response.close()
+
+            self._metrics.record_retry(method, call.template)
+            time.sleep(delay)
+            if page_profile is not None:
+                page_profile.retry_sleep += delay
+            call.attempt += 1
+
+    def _attempt(self, call):
+        """
+        Sends one attempt of a request once the circuit breaker and the rate
+        limiter allow it
+
+        :param _RequestCall call:
+        :rtype (requests.Response, Exception):
+        :return: the response, or the exception the attempt raised
+        """
+        if call.breaker is not None and not call.breaker.allow():
+            raise UserGridException(
+                title=UserGridException.ERROR_CIRCUIT_OPEN,
+                detail='Circuit breaker for %s is open' % call.breaker.name
             )
 
-            logger.debug('%s [%s] %s', method, response.status_code, url)
-            self._last_response = response
-            response_json = response.json()
-            if 'exception' not in response_json:
-                return response_json
+        info = None
+        started = time.time()
+        in_flight = self._throttle(call.method, call.url)
+        try:
+            started = time.time()
+            if self._hooks is not None:
+                info = call.info(started)
+                call_hook(self._hooks.before_request, info)
+
+            response = self.session.request(call.method, call.url, **call.kwargs)
+        except Exception as request_exception:  # pylint: disable=broad-except
+            self._record_attempt(call, time.time() - started, info, exception=request_exception)
+            return None, request_exception
+        finally:
+            if in_flight is not None and not call.kwargs.get('stream'):
+                in_flight.release()
+
+        if in_flight is not None and call.kwargs.get('stream'):
+            _release_on_close(response, in_flight)
 
-            title = UserGridException.ERROR_GENERAL
-            detail = 'Unknown user grid error'
+        self._record_attempt(call, time.time() - started, info, response=response)
+        return response, None
 
-            if 'error' in response_json:
-                title = response_json['error']
+    # pylint: disable=too-many-arguments
+    def _record_attempt(self, call, elapsed, info, response=None, exception=None):
+        """
+        Reports an attempt to the metrics, the scan profile, the request
+        hooks and the circuit breaker
+
+        :param _RequestCall call:
+        :param float elapsed: seconds the attempt took
+        :param RequestInfo info: None without hooks
+        :param requests.Response response:
+        :param Exception exception:
+        :return:
+        """
+        if call.page_profile is not None:
+            call.page_profile.network += elapsed
+
+        if exception is not None:
+            error = type(exception).__name__
+            self._metrics.record(
+                call.method, call.template, elapsed,
+                error=error,
+                request_bytes=call.request_bytes
+            )
+            if info is not None:
+                info.elapsed = elapsed
+                info.error = error
+                call_hook(self._hooks.on_error, info, exception)
+            if call.breaker is not None:
+                call.breaker.record(False, elapsed)
+            return
 
-            if 'error_description' in response_json:
-                detail = response_json['error_description']
+        response_bytes = _response_size(response, call.kwargs.get('stream'))
+        logger.debug('%s [%s] %s', call.method, response.status_code, call.url)
+        self._metrics.record(
+            call.method, call.template, elapsed,
+            status=response.status_code,
+            request_bytes=call.request_bytes,
+            response_bytes=response_bytes
+        )
+        if info is not None:
+            info.elapsed = elapsed
+            info.status = response.status_code
+            info.response_bytes = response_bytes
+            call_hook(self._hooks.after_response, info, response)
+        if call.breaker is not None:
+            call.breaker.record(response.status_code < 500, elapsed)
+
+    def _retry_delay(self, call, response, exception):
+        """
+        Asks the retry policy whether a failed attempt is tried again
 
-            raise UserGridException(
-                title=title,
-                detail=detail
+        :param _RequestCall call:
+        :param requests.Response response:
+        :param Exception exception:
+        :rtype float | None:
+        :return: seconds to wait, None when the attempt is final
+        """
+        if self._retry_policy is None:
+            return None
+
+        delay = self._retry_policy.retry_delay(
+            call.method,
+            call.attempt,
+            response=response,
+            exception=exception
+        )
+        if delay is None:
+            return None
+
+        if exception is not None:
+            logger.warning(
+                '%s %s failed with %r, retrying in %.2fs',
+                call.method, call.url, exception, delay
+            )
+        else:
+            logger.warning(
+                '%s [%s] %s, retrying in %.2fs',
+                call.method, response.status_code, call.url, delay
             )
 
+        return delay
+
+    def _make_request(self, method, url, **kwargs):
+        """
+        Makes a call to user grid and forces a timeout
+
+        Writes drop the cached entities they affect before they are sent, as
+        a write that times out or fails may still have been applied, and
+        again once they end, in case a read cached the old entity meanwhile.
+
+        :param method:
+        :param url:
+        :param kwargs:
+        :rtype dict:
+        :return:
+        """
+        write = method != 'GET'
+        if write:
+            self._invalidate_caches(url)
+
+        try:
+            response = self._request(method, url, **kwargs)
+            decoding = time.time()
+            response_json = self._parse_response(response.json())
+
+            page_profile = getattr(self._scan_page, 'profile', None)
+            if page_profile is not None:
+                page_profile.decode += time.time() - decoding
+
+            return response_json
+
         except Exception as request_exception:
             logger.exception(request_exception)
             raise
 
+        finally:
+            if write:
+                self._invalidate_caches(url)
+
     def archive_entity(self, entity_type, entity_id):
         """
         archives an entity to its corresponding archive table
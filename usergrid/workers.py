@@ -0,0 +1,183 @@
+"""
+Background helpers for overlapping UG requests with the caller
+"""
+import collections
+import logging
+import queue
+import threading
+from concurrent import futures
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+_ITEM = 'item'
+_DONE = 'done'
+_ERROR = 'error'
+
+
+def prefetch(iterable, depth):
+    """
+    Iterates over iterable on a background thread, keeping up to depth items
+    ready ahead of the consumer
+
+    Exceptions raised by the iterable are raised again in the consumer.
+    Closing the generator stops the background thread after the item it is
+    currently producing.
+
+    :param iterable:
+    :param int depth: number of items buffered ahead of the consumer
+    :return:
+    """
+    assert depth > 0
+    buffered = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+
+    def put(message):
+        while not stopped.is_set():
+            try:
+                buffered.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((_ITEM, item)):
+                    return
+
+            put((_DONE, None))
+        except BaseException as produce_exception:  # pylint: disable=broad-except
+            put((_ERROR, produce_exception))
+
+    producer = threading.Thread(target=produce, name='usergrid-prefetch')
+    producer.daemon = True
+    producer.start()
+
+    try:
+        while True:
+            kind, value = buffered.get()
+            if kind == _DONE:
+                return
+
+            if kind == _ERROR:
+                raise value
+
+            yield value
+    finally:
+        stopped.set()
+
+
+def chunked(iterable, size):
+    """
+    Groups an iterable into lists of up to size items
+
+    :param iterable:
+    :param int size:
+    :rtype list:
+    :return:
+    """
+    assert size > 0
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def _call(function, item):
+    """
+    Runs function on item and captures any exception
+
+    :param callable function:
+    :param item:
+    :rtype tuple:
+    :return: item, result and exception
+    """
+    try:
+        return item, function(item), None
+    except Exception as call_exception:  # pylint: disable=broad-except
+        return item, None, call_exception
+
+
+def bounded_map(function, iterable, max_workers, ordered=True, max_pending=None):
+    """
+    Applies function to each item on a thread pool
+
+    No more than max_pending items are taken from iterable ahead of the
+    results that have been yielded, so a lazy source such as
+    collect_entities is only read as fast as the pool can keep up.
+    Exceptions are yielded instead of raised so one bad item does not stop
+    the rest.
+
+    :param callable function:
+    :param iterable:
+    :param int max_workers: number of threads
+    :param boolean ordered: yield results in the order of iterable
+    :param int max_pending: items submitted but not yet yielded,
+                            defaults to twice max_workers
+    :rtype tuple:
+    :return: item, result and exception for each item
+    """
+    assert max_workers > 0
+    max_pending = max_pending or max_workers * 2
+
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque()
+
+        def next_done():
+            if ordered:
+                return pending.popleft().result()
+
+            done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            future = done.pop()
+            pending.remove(future)
+            return future.result()
+
+        for item in iterable:
+            if len(pending) >= max_pending:
+                yield next_done()
+
+            pending.append(executor.submit(_call, function, item))
+
+        while pending:
+            yield next_done()
+
+
+class ProcessSummary(object):
+    """
+    Outcome of applying a callback to many entities
+    """
+    __slots__ = (
+        'processed',
+        'failed',
+        'elapsed',
+        'profile'
+    )
+
+    def __init__(self, processed=0, failed=None, elapsed=0.0, profile=None):
+        """
+        :param int processed: number of entities the callback succeeded on
+        :param list failed: (entity, exception) for each failed entity
+        :param float elapsed: seconds taken
+        :param ScanProfile profile: time breakdown when profiling was on
+        """
+        self.processed = processed
+        self.failed = failed if failed is not None else []
+        self.elapsed = elapsed
+        self.profile = profile
+
+    def __repr__(self):
+        return '<ProcessSummary processed=%d failed=%d elapsed=%.3fs>' % (
+            self.processed,
+            len(self.failed),
+            self.elapsed
+        )
+
+
+__all__ = ['prefetch', 'chunked', 'bounded_map', 'ProcessSummary']